@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from django.contrib.auth.signals import user_logged_out
+        from django.db.models.signals import post_delete, post_save
+
+        from . import user_cache
+        from .models import User
+
+        # ユーザーが更新・削除された場合とログアウトした場合は、キャッシュしたユーザーを破棄する
+        post_save.connect(user_cache.invalidate_user, sender=User, dispatch_uid='user_cache_post_save')
+        post_delete.connect(user_cache.invalidate_user, sender=User, dispatch_uid='user_cache_post_delete')
+        user_logged_out.connect(user_cache.invalidate_logged_out_user, dispatch_uid='user_cache_logged_out')
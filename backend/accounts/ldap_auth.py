@@ -1,21 +1,56 @@
 from ldap3 import Server, Connection, ALL, Tls
+import asyncio
 import ssl
 import os
 import dotenv
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend import metrics
 
 dotenv.load_dotenv()
 logger = logging.getLogger(__name__)
 
+# ldap3は同期APIのため、非同期ビューからは専用のスレッドプールで実行する。
+# Djangoの sync_to_async の共有スレッドを使うと、LDAPの応答待ちの間に他のリクエストまで待たされる。
+LDAP_MAX_WORKERS = int(os.getenv('LDAP_MAX_WORKERS', 8))
+# LDAPサーバーが応答しない場合にスレッドを占有し続けないための上限(秒)
+LDAP_TIMEOUT_SECONDS = int(os.getenv('LDAP_TIMEOUT_SECONDS', 10))
+
+_executor = ThreadPoolExecutor(max_workers=LDAP_MAX_WORKERS, thread_name_prefix='ldap')
+
+
+async def aauthenticate_with_ldap(university_id, password):
+    """
+    authenticate_with_ldap を専用のスレッドプールで実行する (非同期ビュー用)。
+    同時に実行するLDAP認証は LDAP_MAX_WORKERS 件までで、それ以上は空きを待つ。
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, authenticate_with_ldap, university_id, password)
+
 
 def authenticate_with_ldap(university_id, password):
+    """
+    LDAPで認証し、所要時間を結果ごとにメトリクスへ記録する。
+    """
+    started = time.monotonic()
+    authenticated = _authenticate_with_ldap(university_id, password)
+    metrics.LDAP_AUTH_DURATION.observe(
+        time.monotonic() - started,
+        result='success' if authenticated else 'failure',
+    )
+    return authenticated
+
+
+def _authenticate_with_ldap(university_id, password):
     LDAP_SERVER = os.getenv('LDAP_SERVER')
     LDAP_BASE_DN = 'ou=People,dc=dendai,dc=ac,dc=jp'
 
-    server = Server(LDAP_SERVER, get_info=ALL)
+    server = Server(LDAP_SERVER, get_info=ALL, connect_timeout=LDAP_TIMEOUT_SECONDS)
 
     try:
-        with Connection(server) as conn:
+        with Connection(server, receive_timeout=LDAP_TIMEOUT_SECONDS) as conn:
             search_filter = f'(uid={university_id})'
 
             found = conn.search(search_base=LDAP_BASE_DN,
@@ -29,7 +64,7 @@ def authenticate_with_ldap(university_id, password):
             user_dn = conn.entries[0].entry_dn
             logger.info(f"Found user DN: {user_dn}")
 
-        with Connection(server, user=user_dn, password=password) as auth_conn:
+        with Connection(server, user=user_dn, password=password, receive_timeout=LDAP_TIMEOUT_SECONDS) as auth_conn:
             if auth_conn.bound:
                 logger.info('LDAP Authentication successful.')
                 return True
@@ -0,0 +1,44 @@
+"""
+ログイン中のユーザーをRedisのキャッシュから復元する認証ミドルウェア (accounts.user_cache)。
+"""
+from functools import partial
+
+from channels.auth import AuthMiddleware, get_user as channels_get_user
+from channels.sessions import CookieMiddleware, SessionMiddleware
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.utils.functional import SimpleLazyObject
+
+from . import user_cache
+
+
+def get_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = user_cache.get_user(request)
+    return request._cached_user
+
+
+async def auser(request):
+    if not hasattr(request, '_acached_user'):
+        request._acached_user = await user_cache.aload_user(request.session, partial(auth.aget_user, request))
+    return request._acached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware と同じく request.user と request.auser を設定する"""
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
+        request.auser = partial(auser, request)
+
+
+class CachedAuthMiddleware(AuthMiddleware):
+    """WebSocketの接続時に scope['user'] をキャッシュから復元する"""
+
+    async def resolve_scope(self, scope):
+        scope['user']._wrapped = await user_cache.aload_user(scope['session'], partial(channels_get_user, scope))
+
+
+def CachedAuthMiddlewareStack(inner):
+    return CookieMiddleware(SessionMiddleware(CachedAuthMiddleware(inner)))
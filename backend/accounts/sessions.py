@@ -0,0 +1,226 @@
+"""
+Redisに保存するセッションエンジン (SESSION_ENGINE = 'accounts.sessions')。
+
+セッションはJSONのままRedisに保存し、読み込み時にはログイン中のユーザーのキャッシュ
+(accounts.user_cache) も同じLuaスクリプトで取得する。
+認証済みのリクエストは、DBに問い合わせずRedisへの1往復でセッションとユーザーを復元できる。
+
+Redisに接続できない間は、読み書きに失敗してもリクエストは失敗させない。
+セッションは保存されないため未ログインとして扱われるが、ログインやログアウトの応答が500になることはない。
+"""
+import asyncio
+import json
+import logging
+import weakref
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.sessions.backends.base import CreateError, SessionBase, UpdateError
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'session:'
+# ログイン中のユーザーのキャッシュのキー (accounts.user_cache で読み書きする)
+USER_KEY_PREFIX = 'auth:user:'
+
+# セッションを取得し、ログイン中であればユーザーのキャッシュもあわせて返す
+_LOAD_SCRIPT = """
+local data = redis.call('GET', KEYS[1])
+if not data then
+    return {false, false}
+end
+local ok, session = pcall(cjson.decode, data)
+if not ok or type(session) ~= 'table' then
+    return {data, false}
+end
+local user_id = session[ARGV[2]]
+if type(user_id) ~= 'string' then
+    return {data, false}
+end
+return {data, redis.call('GET', ARGV[1] .. user_id)}
+"""
+
+_client = None
+_load_script = None
+# redis.asyncio のクライアントはイベントループごとに作成する
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    global _client, _load_script
+    if _client is None:
+        _client = redis.Redis.from_url(settings.SESSION_REDIS_URL)
+        _load_script = _client.register_script(_LOAD_SCRIPT)
+    return _client
+
+
+def get_async_client():
+    """現在のイベントループ用のクライアントと読み込み用のスクリプトを返す"""
+    loop = asyncio.get_running_loop()
+    if loop not in _async_clients:
+        client = aioredis.Redis.from_url(settings.SESSION_REDIS_URL)
+        _async_clients[loop] = (client, client.register_script(_LOAD_SCRIPT))
+    return _async_clients[loop]
+
+
+def user_key(user_pk):
+    return f'{USER_KEY_PREFIX}{user_pk}'
+
+
+def _dumps(session_dict):
+    return json.dumps(session_dict, separators=(',', ':'))
+
+
+class SessionStore(SessionBase):
+    """
+    Redisに保存するセッション。
+    期限切れのセッションはRedisの有効期限で削除されるため、clearsessions は何もしない。
+    """
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        # load() で一緒に取得したログイン中のユーザーのキャッシュ (JSON, なければNone)
+        self.cached_user = None
+
+    @staticmethod
+    def _key(session_key):
+        return KEY_PREFIX + session_key
+
+    def _loaded(self, result):
+        data, user_data = result
+        if data is not None:
+            try:
+                session = json.loads(data)
+            except ValueError:
+                session = None
+            if isinstance(session, dict):
+                self.cached_user = user_data
+                return session
+        self._session_key = None
+        return {}
+
+    def load(self):
+        result = (None, None)
+        if self.session_key is not None:
+            try:
+                get_client()
+                result = _load_script(keys=[self._key(self.session_key)], args=[USER_KEY_PREFIX, SESSION_KEY])
+            except redis.RedisError as e:
+                logger.warning(f"セッションの取得に失敗しました: {e}")
+        return self._loaded(result)
+
+    async def aload(self):
+        result = (None, None)
+        if self.session_key is not None:
+            try:
+                _, script = get_async_client()
+                result = await script(keys=[self._key(self.session_key)], args=[USER_KEY_PREFIX, SESSION_KEY])
+            except redis.RedisError as e:
+                logger.warning(f"セッションの取得に失敗しました: {e}")
+        return self._loaded(result)
+
+    def create(self):
+        while True:
+            self._session_key = self._get_new_session_key()
+            try:
+                self.save(must_create=True)
+            except CreateError:
+                # キーが衝突した場合は作り直す
+                continue
+            self.modified = True
+            return
+
+    async def acreate(self):
+        while True:
+            self._session_key = await self._aget_new_session_key()
+            try:
+                await self.asave(must_create=True)
+            except CreateError:
+                continue
+            self.modified = True
+            return
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        # 新規作成は存在しない場合のみ、更新は存在する場合のみ書き込む
+        try:
+            saved = get_client().set(
+                self._key(self.session_key),
+                _dumps(self._get_session(no_load=must_create)),
+                ex=max(self.get_expiry_age(), 1),
+                nx=must_create, xx=not must_create,
+            )
+        except redis.RedisError as e:
+            logger.warning(f"セッションの保存に失敗しました: {e}")
+            return
+        if not saved:
+            raise CreateError if must_create else UpdateError
+
+    async def asave(self, must_create=False):
+        if self.session_key is None:
+            return await self.acreate()
+        try:
+            client, _ = get_async_client()
+            saved = await client.set(
+                self._key(self.session_key),
+                _dumps(await self._aget_session(no_load=must_create)),
+                ex=max(await self.aget_expiry_age(), 1),
+                nx=must_create, xx=not must_create,
+            )
+        except redis.RedisError as e:
+            logger.warning(f"セッションの保存に失敗しました: {e}")
+            return
+        if not saved:
+            raise CreateError if must_create else UpdateError
+
+    def exists(self, session_key):
+        if not session_key:
+            return False
+        try:
+            return bool(get_client().exists(self._key(session_key)))
+        except redis.RedisError as e:
+            logger.warning(f"セッションの確認に失敗しました: {e}")
+            return False
+
+    async def aexists(self, session_key):
+        if not session_key:
+            return False
+        try:
+            client, _ = get_async_client()
+            return bool(await client.exists(self._key(session_key)))
+        except redis.RedisError as e:
+            logger.warning(f"セッションの確認に失敗しました: {e}")
+            return False
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        try:
+            get_client().delete(self._key(session_key))
+        except redis.RedisError as e:
+            # 削除できなかったセッションはRedisの有効期限で消える
+            logger.warning(f"セッションの削除に失敗しました: {e}")
+
+    async def adelete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        try:
+            client, _ = get_async_client()
+            await client.delete(self._key(session_key))
+        except redis.RedisError as e:
+            logger.warning(f"セッションの削除に失敗しました: {e}")
+
+    @classmethod
+    def clear_expired(cls):
+        pass
+
+    @classmethod
+    async def aclear_expired(cls):
+        pass
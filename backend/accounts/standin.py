@@ -0,0 +1,178 @@
+"""
+負荷試験用のLDAPスタンドインサーバー。
+
+ldap_auth.authenticate_with_ldap が送る匿名バインド・uid検索・ユーザーバインドだけに応答する
+最小限のLDAPv3サーバー。LDAP_SERVER をこのサーバーに向けると、学内LDAPなしでログインを試験できる。
+"""
+import socketserver
+import threading
+
+from pyasn1.codec.ber import decoder, encoder
+from pyasn1.error import SubstrateUnderrunError
+from ldap3.protocol.rfc4511 import (
+    LDAPMessage, MessageID, ProtocolOp, BindResponse, SearchResultEntry, SearchResultDone,
+    ResultCode, LDAPDN, LDAPString, PartialAttributeList, PartialAttribute, AttributeDescription,
+    AttributeValue,
+)
+
+BASE_DN = 'ou=People,dc=dendai,dc=ac,dc=jp'
+
+
+def _message(message_id, op_name, op):
+    message = LDAPMessage()
+    message['messageID'] = MessageID(message_id)
+    message['protocolOp'] = ProtocolOp().setComponentByName(op_name, op)
+    return encoder.encode(message)
+
+
+def _result(op, code):
+    op['resultCode'] = ResultCode(code)
+    op['matchedDN'] = LDAPDN('')
+    op['diagnosticMessage'] = LDAPString('')
+    return op
+
+
+def _uid_from_dn(dn):
+    rdn = dn.split(',', 1)[0]
+    name, _, value = rdn.partition('=')
+    return value if name.strip().lower() == 'uid' else None
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    @property
+    def ldap(self):
+        return self.server.ldap
+
+    def handle(self):
+        buffer = b''
+        while True:
+            try:
+                message, rest = decoder.decode(buffer, asn1Spec=LDAPMessage())
+            except SubstrateUnderrunError:
+                chunk = self.request.recv(4096)
+                if not chunk:
+                    return
+                buffer += chunk
+                continue
+            except Exception:
+                # 解析できない要求が来た場合は接続を切る
+                return
+            buffer = rest
+
+            message_id = int(message['messageID'])
+            op_name = message['protocolOp'].getName()
+            op = message['protocolOp'].getComponent()
+            if op_name == 'unbindRequest':
+                return
+            if op_name == 'bindRequest':
+                self.request.sendall(self._bind(message_id, op))
+            elif op_name == 'searchRequest':
+                self.request.sendall(self._search(message_id, op))
+            else:
+                # 想定外の操作にはエラーを返さず無視する (ldap_authでは使用しない)
+                continue
+
+    def _bind(self, message_id, op):
+        self.ldap.wait()
+        dn = str(op['name'])
+        authentication = op['authentication']
+        password = bytes(authentication['simple']) if authentication.getName() == 'simple' else b''
+
+        if not dn:
+            code = 'success'
+        else:
+            uid = _uid_from_dn(dn)
+            code = 'success' if uid and self.ldap.check_password(uid, password.decode('utf-8')) else 'invalidCredentials'
+        self.ldap.count('binds' if dn else 'anonymous_binds')
+        return _message(message_id, 'bindResponse', _result(BindResponse(), code))
+
+    def _search(self, message_id, op):
+        self.ldap.wait()
+        self.ldap.count('searches')
+        responses = []
+        search_filter = op['filter']
+        if search_filter.getName() == 'equalityMatch':
+            assertion = search_filter['equalityMatch']
+            if str(assertion['attributeDesc']).lower() == 'uid':
+                uid = bytes(assertion['assertionValue']).decode('utf-8')
+                if self.ldap.user_exists(uid):
+                    responses.append(_message(message_id, 'searchResEntry', self._entry(uid)))
+        responses.append(_message(message_id, 'searchResDone', _result(SearchResultDone(), 'success')))
+        return b''.join(responses)
+
+    def _entry(self, uid):
+        attribute = PartialAttribute()
+        attribute['type'] = AttributeDescription('uid')
+        attribute['vals'].setComponentByPosition(0, AttributeValue(uid))
+        attributes = PartialAttributeList()
+        attributes.setComponentByPosition(0, attribute)
+
+        entry = SearchResultEntry()
+        entry['object'] = LDAPDN(f'uid={uid},{BASE_DN}')
+        entry['attributes'] = attributes
+        return entry
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class StandInLDAP:
+    """
+    全ての学籍番号が存在するものとして応答するLDAPサーバー。
+    password を指定した場合はそのパスワードのみ、省略時は空でない任意のパスワードで認証に成功する。
+
+    Example:
+        with StandInLDAP(port=3890) as ldap:
+            os.environ['LDAP_SERVER'] = ldap.url
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, password=None, latency=0.0, public_host=None):
+        self.password = password
+        # バックエンドから見たホスト名 (待ち受けアドレスと異なるとき)
+        self.public_host = public_host
+        # 応答を返すまでの人工的な遅延 (秒)
+        self.latency = latency
+        self.stats = {'anonymous_binds': 0, 'binds': 0, 'searches': 0}
+        self._stats_lock = threading.Lock()
+        self._server = _Server((host, port), _Handler)
+        self._server.ldap = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'ldap://{self.public_host or host}:{port}'
+
+    def user_exists(self, uid):
+        return bool(uid)
+
+    def check_password(self, uid, password):
+        if self.password is not None:
+            return password == self.password
+        return bool(password)
+
+    def wait(self):
+        if self.latency:
+            threading.Event().wait(self.latency)
+
+    def count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='standin-ldap', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -1,3 +1,166 @@
-from django.test import TestCase
+import json
+import os
+from unittest import mock
 
-# Create your tests here.
+import fakeredis
+import fakeredis.aioredis
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.test import TestCase, override_settings
+
+from accounts import sessions, user_cache
+from accounts.middleware import CachedAuthMiddlewareStack
+from accounts.models import User
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class FakeRedisSessionMixin:
+    """セッションとユーザーのキャッシュの読み書きをfakeredisに向ける"""
+
+    def setUp(self):
+        super().setUp()
+        self.server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeRedis(server=self.server)
+
+        def get_async_client():
+            client = fakeredis.aioredis.FakeRedis(server=self.server)
+            return client, client.register_script(sessions._LOAD_SCRIPT)
+
+        for target, value in (
+            ('accounts.sessions._client', self.redis),
+            ('accounts.sessions._load_script', self.redis.register_script(sessions._LOAD_SCRIPT)),
+            ('accounts.sessions.get_async_client', get_async_client),
+            ('accounts.user_cache.get_async_client', get_async_client),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RedisOutageTests(FakeRedisSessionMixin, TestCase):
+    """Redisに接続できない間も、セッションの読み書きでリクエストを失敗させない"""
+
+    def setUp(self):
+        super().setUp()
+        self.server.connected = False
+
+    def test_session_store_does_not_raise(self):
+        store = sessions.SessionStore()
+        store['key'] = 'value'
+        store.save()
+        self.assertIsNotNone(store.session_key)
+        self.assertFalse(store.exists(store.session_key))
+        store.delete()
+        self.assertEqual(sessions.SessionStore(store.session_key).load(), {})
+
+    def test_async_session_store_does_not_raise(self):
+        async def run():
+            store = sessions.SessionStore()
+            await store.aset('key', 'value')
+            await store.asave()
+            await store.acycle_key()
+            self.assertFalse(await store.aexists(store.session_key))
+            await store.adelete()
+
+        async_to_sync(run)()
+
+    @mock.patch.dict(os.environ, {'DEBUG': 'True'})
+    @mock.patch('api.views.Login._enqueue_scrapes', return_value=({}, {}))
+    def test_login_and_logout_return_normally(self, _):
+        User.objects.create(university_id='AB00001')
+        response = self.client.post(
+            '/api/login/', json.dumps({'university_id': 'AB00001', 'password': 'x'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        # セッションを保存できないため、次のリクエストでは未ログインになる
+        self.assertEqual(self.client.get('/api/auth/status/').json(), {'isAuthenticated': False})
+        self.client.logout()
+
+
+# パスワードのハッシュは検証の対象ではないため、速いハッシュ関数を使う
+@override_settings(CACHES=LOCMEM_CACHES, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CachedAuthenticationTests(FakeRedisSessionMixin, TestCase):
+    """セッションと一緒にキャッシュから復元するログイン中のユーザー (accounts.user_cache)"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create(university_id='AB00001')
+        self.user.set_password('old-password')
+        self.user.save()
+        self.client.force_login(self.user)
+        self.key = sessions.user_key(self.user.pk)
+
+    def auth_status(self):
+        return self.client.get('/api/auth/status/').json()
+
+    def test_session_load_returns_cached_user(self):
+        # 最初のリクエストでDBから読み込んでキャッシュする
+        self.assertTrue(self.auth_status()['isAuthenticated'])
+        self.assertTrue(self.redis.exists(self.key))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.auth_status(), {'isAuthenticated': True, 'user': {'university_id': 'AB00001'}})
+
+    def test_cached_user_with_changed_password_falls_back_to_db(self):
+        # 別の場所でパスワードが変更され、キャッシュだけが新しい状態 (セッションのハッシュと一致しない)
+        self.user.set_password('new-password')
+        User.objects.filter(pk=self.user.pk).update(password=self.user.password)
+        user_cache.store(self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.auth_status(), {'isAuthenticated': False})
+
+    def test_stale_cached_user_is_replaced_from_db(self):
+        inactive = User.objects.get(pk=self.user.pk)
+        inactive.is_active = False
+        user_cache.store(inactive)
+        self.assertTrue(self.auth_status()['isAuthenticated'])
+        self.assertTrue(json.loads(self.redis.get(self.key))['is_active'])
+
+    def test_cached_user_from_unknown_backend_is_ignored(self):
+        self.auth_status()
+        session = sessions.SessionStore(self.client.session.session_key)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.RemoteUserBackend'
+        session.save()
+        self.assertEqual(self.auth_status(), {'isAuthenticated': False})
+
+    def test_user_save_and_delete_invalidate_cache(self):
+        self.auth_status()
+        self.user.save()
+        self.assertFalse(self.redis.exists(self.key))
+
+        self.auth_status()
+        self.user.delete()
+        self.assertFalse(self.redis.exists(self.key))
+
+    def test_logout_invalidates_cache_and_session(self):
+        self.auth_status()
+        session_key = self.client.session.session_key
+        self.assertEqual(self.client.post('/api/logout/').status_code, 200)
+        self.assertFalse(self.redis.exists(self.key))
+        self.assertFalse(self.redis.exists(sessions.KEY_PREFIX + session_key))
+        self.assertEqual(self.auth_status(), {'isAuthenticated': False})
+
+    def test_websocket_scope_user(self):
+        self.auth_status()
+        scopes = []
+
+        async def app(scope, receive, send):
+            scopes.append(scope)
+            await send({'type': 'websocket.accept'})
+
+        async def connect(cookie):
+            scope = {'type': 'websocket', 'path': '/ws/', 'headers': [(b'cookie', cookie.encode())]}
+            communicator = ApplicationCommunicator(CachedAuthMiddlewareStack(app), scope)
+            await communicator.send_input({'type': 'websocket.connect'})
+            return await communicator.receive_output()
+
+        session_cookie = f'{settings.SESSION_COOKIE_NAME}={self.client.session.session_key}'
+        self.assertEqual(async_to_sync(connect)(session_cookie), {'type': 'websocket.accept'})
+        self.assertEqual(scopes[-1]['user'].pk, self.user.pk)
+
+        async_to_sync(connect)(f'{settings.SESSION_COOKIE_NAME}=unknown')
+        self.assertFalse(scopes[-1]['user'].is_authenticated)
@@ -0,0 +1,132 @@
+"""
+ログイン中のユーザーをRedisにキャッシュし、認証済みのリクエストごとのDB問い合わせを省く。
+
+キャッシュはセッションの読み込み時に同時に取得される (accounts.sessions)。
+HTTPの認証 (CachedAuthenticationMiddleware) とWebSocketの認証 (CachedAuthMiddlewareStack) で共有し、
+ユーザーが更新・削除された場合とログアウトした場合は削除して、次のリクエストでDBから読み直す。
+"""
+import json
+import logging
+
+import redis
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.crypto import constant_time_compare
+
+from .sessions import get_async_client, get_client, user_key
+
+logger = logging.getLogger(__name__)
+
+
+def _fields():
+    return get_user_model()._meta.concrete_fields
+
+
+def _dumps(user):
+    return json.dumps({
+        field.attname: None if field.value_from_object(user) is None else field.value_to_string(user)
+        for field in _fields()
+    })
+
+
+def _loads(data):
+    """キャッシュからユーザーを復元する (フィールドが変わっていた場合はNone)"""
+    snapshot = json.loads(data)
+    fields = _fields()
+    if set(snapshot) != {field.attname for field in fields}:
+        return None
+    values = [
+        None if snapshot[field.attname] is None else field.to_python(snapshot[field.attname])
+        for field in fields
+    ]
+    return get_user_model().from_db(DEFAULT_DB_ALIAS, [field.attname for field in fields], values)
+
+
+def _from_cache(session, user_id, backend_path, session_hash):
+    """
+    セッションと一緒に取得したキャッシュからユーザーを返す。
+    キャッシュがない場合や検証に失敗した場合はNoneを返し、DBからの読み込み (auth.get_user) に任せる。
+    """
+    data = getattr(session, 'cached_user', None)
+    if data is None or user_id is None or backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return None
+    try:
+        user = _loads(data)
+    except (ValueError, ValidationError) as e:
+        logger.warning(f"ユーザーのキャッシュを復元できませんでした (user_id={user_id}): {e}")
+        return None
+    if user is None or user._meta.pk.value_to_string(user) != user_id or not user.is_active:
+        return None
+    # パスワードの変更などで無効になったセッションは、auth.get_user に任せてセッションを破棄させる
+    if not session_hash or not constant_time_compare(session_hash, user.get_session_auth_hash()):
+        return None
+    user.backend = backend_path
+    return user
+
+
+def store(user):
+    try:
+        get_client().set(user_key(user.pk), _dumps(user), ex=settings.AUTH_USER_CACHE_TTL)
+    except redis.RedisError as e:
+        logger.warning(f"ユーザーのキャッシュの保存に失敗しました (user_pk={user.pk}): {e}")
+
+
+async def astore(user):
+    try:
+        client, _ = get_async_client()
+        await client.set(user_key(user.pk), _dumps(user), ex=settings.AUTH_USER_CACHE_TTL)
+    except redis.RedisError as e:
+        logger.warning(f"ユーザーのキャッシュの保存に失敗しました (user_pk={user.pk}): {e}")
+
+
+def invalidate(user_pk):
+    try:
+        get_client().delete(user_key(user_pk))
+    except redis.RedisError as e:
+        logger.warning(f"ユーザーのキャッシュの削除に失敗しました (user_pk={user_pk}): {e}")
+
+
+def get_user(request):
+    """auth.get_user と同じく、リクエストのセッションからユーザーを返す"""
+    session = request.session
+    user = _from_cache(
+        session, session.get(SESSION_KEY), session.get(BACKEND_SESSION_KEY), session.get(HASH_SESSION_KEY),
+    )
+    if user is None:
+        user = auth.get_user(request)
+        if user.is_authenticated:
+            store(user)
+    return user
+
+
+async def aload_user(session, fallback):
+    """
+    セッションからユーザーを返す (非同期版)。
+
+    Args:
+        session: SessionStore (Channelsのscopeのセッションでもよい)。
+        fallback: キャッシュを使えない場合にDBからユーザーを読み込むコルーチン関数 (引数なし)。
+    """
+    user = _from_cache(
+        session,
+        await session.aget(SESSION_KEY),
+        await session.aget(BACKEND_SESSION_KEY),
+        await session.aget(HASH_SESSION_KEY),
+    )
+    if user is None:
+        user = await fallback()
+        if user.is_authenticated:
+            await astore(user)
+    return user
+
+
+def invalidate_user(sender, instance, **kwargs):
+    invalidate(instance.pk)
+
+
+def invalidate_logged_out_user(sender, request, user, **kwargs):
+    if user is not None:
+        invalidate(user.pk)
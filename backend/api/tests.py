@@ -1,3 +1,448 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import fakeredis
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from rest_framework.request import Request
+
+from accounts.models import User
+from api.views import AssignmentViewSet
+from backend import metrics
+from backend.middleware import JSONGZipMiddleware
+from scraping import archive, data_version, freshness
+from scraping.models import Assignment, ScrapeRun
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Redisを使わずに認証できるよう、ユーザーのキャッシュを通さないミドルウェアに差し替える
+API_TEST_SETTINGS = {
+    'CACHES': LOCMEM_CACHES,
+    'SESSION_ENGINE': 'django.contrib.sessions.backends.cache',
+    'MIDDLEWARE': [
+        'django.contrib.auth.middleware.AuthenticationMiddleware'
+        if name == 'accounts.middleware.CachedAuthenticationMiddleware' else name
+        for name in settings.MIDDLEWARE
+    ],
+}
+
+
+@override_settings(**API_TEST_SETTINGS)
+class LoginCsrfTests(TestCase):
+    """Login APIのCSRFの検証 (ログイン済みのセッションからのリクエストのみ検証する)"""
+
+    def setUp(self):
+        self.client = self.client_class(enforce_csrf_checks=True)
+        self.user = User.objects.create(university_id='AB00001')
+        patcher = mock.patch('api.views.Login._enqueue_scrapes', return_value=({}, {}))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # DEBUGではLDAP認証を行わない
+        patcher = mock.patch.dict(os.environ, {'DEBUG': 'True'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post_login(self, **extra):
+        return self.client.post(
+            '/api/login/', json.dumps({'university_id': 'ab00001', 'password': 'x'}),
+            content_type='application/json', **extra,
+        )
+
+    def test_anonymous_login_does_not_require_csrf_token(self):
+        self.assertEqual(self.post_login().status_code, 200)
+
+    def test_authenticated_session_requires_csrf_token(self):
+        self.client.force_login(self.user)
+        response = self.post_login()
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(response.json()['detail'].startswith('CSRF Failed'))
+
+    def test_authenticated_session_with_csrf_token(self):
+        self.client.force_login(self.user)
+        self.client.get('/api/csrf/')
+        token = self.client.cookies[settings.CSRF_COOKIE_NAME].value
+        self.assertEqual(self.post_login(HTTP_X_CSRFTOKEN=token).status_code, 200)
+
+
+@override_settings(**API_TEST_SETTINGS)
+class AssignmentBulkUpdateTests(TestCase):
+    """課題の一括更新 (1件でも不正な変更があれば何も更新しない)"""
+
+    def setUp(self):
+        self.user = User.objects.create(university_id='AB00001')
+        other = User.objects.create(university_id='AB00002')
+        self.mine = [
+            Assignment.objects.create(user=self.user, title=f'課題{i}', url=f'https://example.com/{i}')
+            for i in range(2)
+        ]
+        self.foreign = Assignment.objects.create(user=other, title='他人の課題', url='https://example.com/x')
+        self.client.force_login(self.user)
+
+    def post_bulk(self, changes):
+        return self.client.post('/api/assignments/bulk/', {'changes': changes}, content_type='application/json')
+
+    def assert_unchanged(self):
+        self.assertFalse(Assignment.objects.filter(is_submitted=True).exists())
+
+    def test_updates_all_changes(self):
+        response = self.post_bulk([{'id': a.pk, 'is_submitted': True} for a in self.mine])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({a['id'] for a in response.json()['updated']}, {a.pk for a in self.mine})
+        self.assertEqual(Assignment.objects.filter(is_submitted=True).count(), 2)
+
+    def test_foreign_id_is_not_found_and_nothing_is_written(self):
+        response = self.post_bulk([
+            {'id': self.mine[0].pk, 'is_submitted': True},
+            {'id': self.foreign.pk, 'is_submitted': True},
+        ])
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['ids'], [self.foreign.pk])
+        self.assert_unchanged()
+
+    def test_duplicate_id_is_rejected(self):
+        response = self.post_bulk([
+            {'id': self.mine[0].pk, 'is_submitted': True},
+            {'id': self.mine[0].pk, 'title': '別のタイトル'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assert_unchanged()
+        self.assertFalse(Assignment.objects.filter(title='別のタイトル').exists())
+
+    def test_title_and_url_conflict_with_other_assignment_is_rejected(self):
+        response = self.post_bulk([
+            {'id': self.mine[1].pk, 'title': '課題0', 'url': 'https://example.com/0', 'is_submitted': True},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['ids'], [self.mine[1].pk])
+        self.assert_unchanged()
+
+    def test_title_and_url_conflict_within_changes_is_rejected(self):
+        response = self.post_bulk([
+            {'id': a.pk, 'title': '同じ課題', 'url': 'https://example.com/same'} for a in self.mine
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['ids'], sorted(a.pk for a in self.mine))
+        self.assertFalse(Assignment.objects.filter(title='同じ課題').exists())
+
+    def test_title_of_foreign_assignment_can_be_reused(self):
+        response = self.post_bulk([{'id': self.mine[0].pk, 'title': '他人の課題', 'url': 'https://example.com/x'}])
+        self.assertEqual(response.status_code, 200)
+
+    def test_integrity_error_is_reported_as_bad_request(self):
+        with mock.patch.object(Assignment.objects, 'bulk_update', side_effect=IntegrityError):
+            response = self.post_bulk([{'id': self.mine[0].pk, 'title': '別のタイトル'}])
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(**API_TEST_SETTINGS)
+class IncludeArchivedTests(TestCase):
+    """アーカイブした課題は ?include_archived= を指定した場合のみ返す"""
+
+    def setUp(self):
+        self.user = User.objects.create(university_id='AB00001')
+        now = timezone.now()
+        self.old = Assignment.objects.create(
+            user=self.user, title='前期の課題', url='https://example.com/old', due_date=now - timedelta(days=200),
+        )
+        self.current = Assignment.objects.create(
+            user=self.user, title='後期の課題', url='https://example.com/current', due_date=now + timedelta(days=7),
+        )
+        archive.archive(now - timedelta(days=180))
+        self.client.force_login(self.user)
+
+    def ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return {assignment['id'] for assignment in response.json()}
+
+    def test_list(self):
+        self.assertEqual(self.ids(self.client.get('/api/assignments/')), {self.current.pk})
+        self.assertEqual(
+            self.ids(self.client.get('/api/assignments/', {'include_archived': 'true'})),
+            {self.old.pk, self.current.pk},
+        )
+
+    def test_detail(self):
+        url = f'/api/assignments/{self.old.pk}/'
+        self.assertEqual(self.client.get(url).status_code, 404)
+        response = self.client.get(url, {'include_archived': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['title'], '前期の課題')
+
+
+@override_settings(**API_TEST_SETTINGS)
+class AssignmentSearchTests(TestCase):
+    """課題の全文検索API (関連度順, ページ単位)"""
+
+    def setUp(self):
+        self.user = User.objects.create(university_id='AB00001')
+        other = User.objects.create(university_id='AB00002')
+        # タイトルに含む課題を詳細のみに含む課題より上位にする
+        self.in_content = [
+            Assignment.objects.create(
+                user=self.user, title=f'課題{i}', content='期末レポートの補足', url=f'https://example.com/c{i}',
+            )
+            for i in range(2)
+        ]
+        self.in_title = Assignment.objects.create(
+            user=self.user, title='期末レポート', url='https://example.com/t',
+        )
+        Assignment.objects.create(user=other, title='期末レポート', url='https://example.com/o')
+        self.client.force_login(self.user)
+
+    def search(self, **params):
+        response = self.client.get('/api/assignments/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_results_are_ranked_and_paginated(self):
+        first = self.search(q='期末レポート', page_size=2)
+        self.assertEqual((first['count'], first['page'], first['page_size']), (3, 1, 2))
+        self.assertEqual(first['results'][0]['id'], self.in_title.pk)
+
+        second = self.search(q='期末レポート', page_size=2, page=2)
+        ids = [a['id'] for a in first['results'] + second['results']]
+        self.assertEqual(sorted(ids), sorted([self.in_title.pk] + [a.pk for a in self.in_content]))
+
+    def test_short_terms(self):
+        self.assertEqual(self.search(q='補足')['count'], 2)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/assignments/search/').status_code, 400)
+        self.assertEqual(self.client.get('/api/assignments/search/', {'q': 'x', 'page': 'a'}).status_code, 400)
+
+
+@override_settings(**API_TEST_SETTINGS)
+class FieldSelectionTests(TestCase):
+    """?fields= / ?omit= による出力するフィールドの絞り込み"""
+
+    def setUp(self):
+        self.user = User.objects.create(university_id='AB00001')
+        self.assignment = Assignment.objects.create(
+            user=self.user, title='課題', content='詳細', url='https://example.com/1',
+        )
+        self.client.force_login(self.user)
+
+    def test_list_and_detail(self):
+        response = self.client.get('/api/assignments/', {'fields': 'id,title'})
+        self.assertEqual(response.json(), [{'id': self.assignment.pk, 'title': '課題'}])
+        response = self.client.get(f'/api/assignments/{self.assignment.pk}/', {'omit': 'content,user'})
+        self.assertNotIn('content', response.json())
+        self.assertNotIn('user', response.json())
+        self.assertIn('title', response.json())
+
+    def test_unknown_field_is_rejected(self):
+        for url in ('/api/assignments/', f'/api/assignments/{self.assignment.pk}/', '/api/courses/'):
+            for param in ('fields', 'omit'):
+                response = self.client.get(url, {param: 'id,password'})
+                self.assertEqual(response.status_code, 400, (url, param))
+                self.assertEqual(response.json()['detail'], 'Unknown fields: password.')
+
+        response = self.client.patch(
+            f'/api/assignments/{self.assignment.pk}/?fields=secret', {'title': '変更'}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Assignment.objects.filter(title='変更').exists())
+
+    def viewset_queryset(self, method):
+        view = AssignmentViewSet()
+        request = getattr(RequestFactory(), method)('/api/assignments/', {'fields': 'id,title'})
+        request.user = self.user
+        view.request = Request(request)
+        return view.get_queryset()
+
+    def test_drf_queryset_is_narrowed_only_for_reads(self):
+        self.assertEqual(self.viewset_queryset('get').query.deferred_loading, ({'id', 'title'}, False))
+        self.assertEqual(self.viewset_queryset('head').query.deferred_loading, ({'id', 'title'}, False))
+        self.assertEqual(self.viewset_queryset('put').query.deferred_loading, (frozenset(), True))
+
+    def test_update_returns_selected_fields_without_dropping_others(self):
+        response = self.client.patch(
+            f'/api/assignments/{self.assignment.pk}/?fields=id,title', {'title': '変更'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.json(), {'id': self.assignment.pk, 'title': '変更'})
+        self.assignment.refresh_from_db()
+        self.assertEqual((self.assignment.title, self.assignment.content), ('変更', '詳細'))
+
+
+@override_settings(**API_TEST_SETTINGS, RESPONSE_GZIP_MIN_BYTES=200)
+class JSONGZipMiddlewareTests(TestCase):
+    """一定以上の大きさのJSONの応答だけをgzipで圧縮する"""
+
+    def process(self, content, content_type='application/json'):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        middleware = JSONGZipMiddleware(lambda request: HttpResponse(content, content_type=content_type))
+        return middleware(request)
+
+    def test_large_json_is_compressed(self):
+        content = json.dumps([{'title': '課題'}] * 50)
+        response = self.process(content)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content).decode(), content)
+
+    def test_small_json_is_not_compressed(self):
+        response = self.process('{"detail": "x"}')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_other_content_types_are_not_compressed(self):
+        for content_type in ('text/plain; version=0.0.4; charset=utf-8', 'text/html; charset=utf-8'):
+            response = self.process('x' * 1000, content_type)
+            self.assertFalse(response.has_header('Content-Encoding'), content_type)
+
+    def test_api_response(self):
+        user = User.objects.create(university_id='AB00001')
+        for i in range(20):
+            Assignment.objects.create(user=user, title=f'課題{i}', url=f'https://example.com/{i}')
+        self.client.force_login(user)
+        response = self.client.get('/api/assignments/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))), 20)
+        # 絞り込んで閾値より小さくなった応答は圧縮しない
+        response = self.client.get('/api/assignments/', {'fields': 'id'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = self.client.get('/api/assignments/search/', {'q': 'none'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+@override_settings(**API_TEST_SETTINGS)
+class DataFreshnessTests(TestCase):
+    """一覧の応答に付けるデータの鮮度・版数のヘッダーと、ログイン時の max_age"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(university_id='AB00001')
+        self.now = timezone.now()
+        self.client.force_login(self.user)
+
+    def headers(self, **params):
+        response = self.client.get('/api/assignments/', params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_headers(self):
+        freshness.record_started(self.user.pk, 'moodle', self.now - timedelta(minutes=5))
+        freshness.record_success(self.user.pk, 'moodle', self.now - timedelta(minutes=4))
+        freshness.record_started(self.user.pk, 'webclass', self.now - timedelta(hours=3))
+        freshness.record_success(self.user.pk, 'webclass', self.now - timedelta(hours=2))
+
+        response = self.headers()
+        self.assertEqual(json.loads(response['X-Data-Freshness']), {
+            'moodle': {
+                'last_scraped_at': (self.now - timedelta(minutes=5)).isoformat(),
+                'last_success_at': (self.now - timedelta(minutes=4)).isoformat(),
+            },
+            'webclass': {
+                'last_scraped_at': (self.now - timedelta(hours=3)).isoformat(),
+                'last_success_at': (self.now - timedelta(hours=2)).isoformat(),
+            },
+        })
+        # 版数はまだ変更がなければ付けず、max_age を指定しなければ古いかどうかも付けない
+        self.assertFalse(response.has_header('X-Data-Version'))
+        self.assertFalse(response.has_header('X-Data-Stale'))
+
+        version = data_version.bump(self.user.pk)
+        response = self.headers(max_age=3600)
+        self.assertEqual(response['X-Data-Version'], str(version))
+        self.assertEqual(response['X-Data-Stale'], 'webclass')
+        self.assertEqual(self.headers(max_age=3 * 3600)['X-Data-Stale'], '')
+
+    def test_never_scraped_platforms_are_stale(self):
+        response = self.headers(max_age=0)
+        self.assertEqual(json.loads(response['X-Data-Freshness'])['moodle'], {
+            'last_scraped_at': None, 'last_success_at': None,
+        })
+        self.assertEqual(response['X-Data-Stale'], 'moodle,webclass')
+
+    def test_invalid_max_age(self):
+        self.assertEqual(self.client.get('/api/assignments/', {'max_age': '-1'}).status_code, 400)
+
+    def test_cache_miss_is_rebuilt_from_scrape_runs(self):
+        success = ScrapeRun.objects.create(
+            user=self.user, platform='moodle', status='success',
+            started_at=self.now - timedelta(hours=2), finished_at=self.now - timedelta(hours=1),
+        )
+        failure = ScrapeRun.objects.create(
+            user=self.user, platform='moodle', status='failure',
+            started_at=self.now - timedelta(minutes=30), finished_at=self.now - timedelta(minutes=20),
+        )
+
+        data = json.loads(self.headers()['X-Data-Freshness'])
+        self.assertEqual(data['moodle'], {
+            'last_scraped_at': failure.started_at.isoformat(),
+            'last_success_at': success.finished_at.isoformat(),
+        })
+        self.assertEqual(data['webclass'], {'last_scraped_at': None, 'last_success_at': None})
+        # 求めた値 (一度も実行していないNoneを含む) はキャッシュに保存し直す
+        keys = [freshness.freshness_key(self.user.pk, platform, 'last_success_at') for platform in ('moodle', 'webclass')]
+        self.assertEqual(cache.get_many(keys), dict(zip(keys, [success.finished_at, None])))
+
+        ScrapeRun.objects.all().delete()
+        self.assertEqual(json.loads(self.headers()['X-Data-Freshness']), data)
+
+    @mock.patch.dict(os.environ, {'DEBUG': 'True'})
+    @mock.patch('api.views.send_status_update')
+    @mock.patch('api.views.mark_scrape_queued')
+    @mock.patch('api.views.dispatch_scrapes')
+    @mock.patch('api.views.admission.admit')
+    def test_login_skips_fresh_platforms(self, admit, dispatch_scrapes, *_):
+        admit.side_effect = lambda user, priority, platforms: {
+            platform: {'state': 'queued', 'position': 1, 'eta_seconds': 10.0, 'enqueue': True}
+            for platform in platforms
+        }
+        freshness.record_success(self.user.pk, 'moodle', self.now - timedelta(minutes=10))
+        freshness.record_success(self.user.pk, 'webclass', self.now - timedelta(days=1))
+
+        response = self.client.post(
+            '/api/login/', json.dumps({'university_id': 'AB00001', 'password': 'x', 'max_age': 3600}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(admit.call_args.kwargs['platforms'], ['webclass'])
+        self.assertEqual(dispatch_scrapes.call_args.kwargs['platforms'], ['webclass'])
+        self.assertEqual(response.json()['scrape'], {
+            'moodle': {'state': 'skipped', 'position': None, 'eta_seconds': None},
+            'webclass': {'state': 'queued', 'position': 1, 'eta_seconds': 10.0},
+        })
+
+        # max_age を指定しなければすべて取得する
+        self.client.post(
+            '/api/login/', json.dumps({'university_id': 'AB00001', 'password': 'x'}),
+            content_type='application/json',
+        )
+        self.assertEqual(dispatch_scrapes.call_args.kwargs['platforms'], ['moodle', 'webclass'])
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsViewTests(TestCase):
+    """Prometheus形式のメトリクスの出力 (/metrics)"""
+
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        patcher = mock.patch.object(metrics, 'get_client', return_value=fakeredis.FakeRedis(server=self.server))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, token='secret'):
+        return self.client.get('/metrics', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_requires_token(self):
+        self.assertEqual(self.get('wrong').status_code, 401)
+
+    def test_renders_metrics(self):
+        metrics.SCRAPE_OUTCOMES.inc(outcome='success')
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('scrape_outcomes_total{outcome="success"} 1', response.content.decode())
+
+    def test_redis_outage_returns_service_unavailable(self):
+        self.server.connected = False
+        self.assertEqual(self.get().status_code, 503)
@@ -1,6 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import Login, SampleAPIView, LogoutView, AuthStatusView, CsrfTokenView, AssignmentViewSet, CourseViewSet
+from .views import (
+    Login, SampleAPIView, LogoutView, AuthStatusView, CsrfTokenView, AssignmentViewSet, CourseViewSet,
+    assignment_list, assignment_detail, course_list, course_detail, upcoming_assignments,
+    search_assignments,
+)
 
 router = DefaultRouter()
 router.register(r'assignments', AssignmentViewSet, basename='assignment')
@@ -12,5 +16,13 @@ urlpatterns = [
     path('logout/', LogoutView.as_view(), name='logout'),
     path('auth/status/', AuthStatusView.as_view(), name='auth-status'),
     path('csrf/', CsrfTokenView.as_view(), name='csrf-token'),
+    # 取得系は非同期ビューで処理する (ルーターより先に定義する)
+    path('assignments/bulk/', AssignmentViewSet.as_view({'post': 'bulk'}), name='assignment-bulk'),
+    path('assignments/search/', search_assignments, name='assignment-search'),
+    path('assignments/upcoming/', upcoming_assignments, name='assignment-upcoming'),
+    path('assignments/', assignment_list, name='assignment-list'),
+    path('assignments/<pk>/', assignment_detail, name='assignment-detail'),
+    path('courses/', course_list, name='course-list'),
+    path('courses/<pk>/', course_detail, name='course-detail'),
     path('', include(router.urls))
 ]
\ No newline at end of file
@@ -1,8 +1,15 @@
 # django
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.conf import settings
 from django.utils import timezone
-from django.contrib.auth import login, logout as django_logout
+from django.utils.crypto import constant_time_compare
+from django.contrib.auth import alogin, logout as django_logout
 from django.utils.decorators import method_decorator
-from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views import View
+from django.middleware.csrf import CsrfViewMiddleware
+from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
 from django.views.decorators.cache import never_cache
 
 
@@ -10,20 +17,29 @@ from django.views.decorators.cache import never_cache
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, viewsets
-from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.permissions import AllowAny
 
 # local
 from accounts.models import User
-from accounts.ldap_auth import authenticate_with_ldap
-from scraping.serializers import AssignmentSerializer, CourseSerializer
-from scraping.models import Assignment, Course
-from scraping.task import run_all_scrapes_task
+from accounts.ldap_auth import aauthenticate_with_ldap
+from backend import fast_json, metrics
+from scraping.serializers import (
+    AssignmentSerializer, AssignmentBulkUpdateSerializer, CourseSerializer, ValuesReader, selected_fields,
+)
+from scraping.models import ArchivedAssignment, ArchivedCourse, Assignment, Course
+from scraping.task import dispatch_scrapes
+from scraping.notifications import PLATFORMS, mark_scrape_queued, send_status_update
+from scraping import admission, data_version, freshness, search, upcoming
 
+import json
 import logging
 import traceback
 import os
+import time
+import redis
 
 
 logger = logging.getLogger(__name__)
@@ -36,12 +52,55 @@ class SampleAPIView(APIView):
     def get(self, request):
         return Response({"message": f"Hello, authenticated user {request.user.university_id}!"}, status=status.HTTP_200_OK)
 
+def _parse_body(request):
+    """JSONまたはフォームのリクエストボディを辞書として返す (不正なJSONの場合はValueError)"""
+    if request.content_type == 'application/json':
+        data = json.loads(request.body or b'{}')
+        if not isinstance(data, dict):
+            raise ValueError('JSON object expected')
+        return data
+    return request.POST
+
+
+class _CSRFCheck(CsrfViewMiddleware):
+    """CSRFの検証に失敗した理由を返す (DRFのCSRFCheckと同じ)"""
+    def _reject(self, request, reason):
+        return reason
+
+
+def _enforce_csrf(request):
+    """CSRFの検証に失敗した場合はその理由、成功した場合はNoneを返す"""
+    check = _CSRFCheck(lambda request: None)
+    check.process_request(request)
+    return check.process_view(request, None, (), {})
+
+
 # Login API
-class Login(APIView):
-    renderer_classes = [BrowsableAPIRenderer, JSONRenderer]
+# LDAP認証の応答を待つ間にワーカーのスレッドを占有しないよう、非同期ビューで処理する。
+# DRFのSessionAuthenticationと同じく、ログイン済みのセッションからのリクエストのみCSRFを検証する。
+@method_decorator(csrf_exempt, name='dispatch')
+class Login(View):
 
-    def post(self, request):
-        data = request.data
+    async def post(self, request):
+        # ログイン処理全体の所要時間をステータスコードごとに記録する
+        started = time.monotonic()
+        response = await self._login(request)
+        await sync_to_async(metrics.LOGIN_DURATION.observe, thread_sensitive=False)(
+            time.monotonic() - started, status=response.status_code,
+        )
+        return response
+
+    async def _login(self, request):
+        user = await request.auser()
+        if user.is_authenticated:
+            reason = _enforce_csrf(request)
+            if reason:
+                return JsonResponse({'detail': f'CSRF Failed: {reason}'}, status=403)
+
+        try:
+            data = _parse_body(request)
+        except ValueError as e:
+            return JsonResponse({'detail': f'JSON parse error - {e}'}, status=400)
         university_id_from_request = data.get('university_id')
         password = data.get('password')
 
@@ -49,30 +108,39 @@ class Login(APIView):
         university_id = university_id_from_request.upper() if university_id_from_request else None
 
         if not university_id or not password:
-            return Response({
+            return JsonResponse({
                 'success': False,
                 'message': '学籍番号とパスワードが必要です'
-            }, status=status.HTTP_400_BAD_REQUEST)
+            }, status=400)
+
+        # 最後の成功からこの秒数以内のプラットフォームはスクレイピングしない
+        try:
+            max_age = _max_age(data.get('max_age'))
+        except (TypeError, ValueError):
+            return JsonResponse({'detail': 'max_age must be a non-negative integer.'}, status=400)
 
-        # LDAP認証
+        # LDAP認証 (専用のスレッドプールで実行する)
         if not os.getenv('DEBUG', 'False') == 'True':
-            ldap_authenticated = authenticate_with_ldap(university_id, password)
+            ldap_authenticated = await aauthenticate_with_ldap(university_id, password)
         else:
             ldap_authenticated = True
 
         if ldap_authenticated:
             try:
-                user, created = User.objects.get_or_create(university_id=university_id)
-                
+                user, created = await User.objects.aget_or_create(university_id=university_id)
+
+                # 前回のログイン日時で優先度を決めるため、更新前に求めておく
+                priority = admission.priority_for(user)
+
                 user.logined_at = timezone.now()
-                user.save(update_fields=['logined_at'])
+                await user.asave(update_fields=['logined_at'])
 
                 # Djangoの認証システムにログインさせる
-                login(request, user)
+                await alogin(request, user)
 
-                run_all_scrapes_task.delay(user.university_id, password)
+                scrape, data_freshness = await sync_to_async(self._enqueue_scrapes)(user, password, priority, max_age)
 
-                return Response({
+                return JsonResponse({
                     'success': True,
                     'user': {
                         'university_id': user.university_id,
@@ -80,33 +148,76 @@ class Login(APIView):
                         'created': created,
                     },
                     'sessionid': request.session.session_key,
+                    'scrape': scrape,
+                    'freshness': freshness.to_representation(data_freshness),
                     'message': 'ログインに成功しました'
-                }, status=status.HTTP_200_OK)
+                }, status=200)
 
             except Exception as e:
                 logger.error("Login APIで予期せぬエラーが発生しました。")
                 logger.error(traceback.format_exc())
 
-                return Response({
+                return JsonResponse({
                     'success': False,
                     'message': f'サーバーエラーが発生しました。'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                }, status=500)
         else:
-            return Response({
+            return JsonResponse({
                 'success': False,
                 'message': '学籍番号またはパスワードが正しくありません。'
-            }, status=status.HTTP_401_UNAUTHORIZED)
-        
-    def get(self, request):
+            }, status=401)
+
+    def _enqueue_scrapes(self, user, password, priority, max_age=None):
+        """
+        受付制御を通してスクレイピングを登録し、プラットフォームごとの状態・順番・目安時間と、データの鮮度を返す。
+        max_age 秒以内に取得に成功したプラットフォームと、混雑時にデータが新しいプラットフォームは取得を省略する。
+        """
+        data_freshness = freshness.get(user.pk)
+        fresh = [] if max_age is None else [
+            platform for platform in PLATFORMS if freshness.is_fresh(data_freshness, platform, max_age)
+        ]
+        decisions = admission.admit(user, priority, platforms=[p for p in PLATFORMS if p not in fresh])
+        for platform in fresh:
+            decisions[platform] = {'state': 'skipped', 'position': None, 'eta_seconds': None, 'enqueue': False}
+            send_status_update(
+                user.pk, '課題情報が新しいため、前回取得した課題情報を表示しています。',
+                platform=platform, state='skipped',
+            )
+        enqueue = [platform for platform, d in decisions.items() if d['enqueue']]
+        queued = [platform for platform, d in decisions.items() if d['state'] == 'queued']
+
+        mark_scrape_queued(user.pk, queued, queue_info=decisions)
+        for platform, d in decisions.items():
+            if d['state'] == 'skipped' and platform not in fresh:
+                send_status_update(
+                    user.pk, '混雑しているため、前回取得した課題情報を表示しています。',
+                    platform=platform, state='skipped',
+                )
+
+        if enqueue:
+            try:
+                # 中間の親タスクを挟まず、プラットフォームごとのタスクを直接登録する
+                dispatch_scrapes(user.university_id, password, platforms=enqueue, priority=priority)
+            except Exception:
+                admission.cancel(user.pk, enqueue)
+                raise
+
+        return {
+            platform: {key: d[key] for key in ('state', 'position', 'eta_seconds')}
+            for platform, d in decisions.items()
+        }, data_freshness
+
+    async def get(self, request):
         content = {
             'message': 'Login endpoint. Please POST university_id and password.'
         }
-        if request.user.is_authenticated:
-            # Userモデルにuniversity_id属性があることを前提としています。なければ request.user.pk などを使用。
-            content['status'] = f"You are already logged in as {request.user.university_id if hasattr(request.user, 'university_id') else request.user.pk}."
+        user = await request.auser()
+        if user.is_authenticated:
+            # Userモデルにuniversity_id属性があることを前提としています。なければ user.pk などを使用。
+            content['status'] = f"You are already logged in as {user.university_id if hasattr(user, 'university_id') else user.pk}."
         else:
             content['status'] = "You are not logged in."
-        return Response(content)
+        return JsonResponse(content)
 
 # Logout API
 class LogoutView(APIView):
@@ -117,18 +228,19 @@ class LogoutView(APIView):
         return Response({"message": "ログアウトしました。"}, status=status.HTTP_200_OK)
 
 # AuthStatus API
-class AuthStatusView(APIView):
-    def get(self, request):
-        if request.user.is_authenticated:
-            return Response({
+class AuthStatusView(View):
+    async def get(self, request):
+        user = await request.auser()
+        if user.is_authenticated:
+            return JsonResponse({
                 "isAuthenticated": True,
                 "user": {
-                    "university_id": request.user.university_id,
+                    "university_id": user.university_id,
                 }
-            }, status=status.HTTP_200_OK)
+            }, status=200)
         else:
-            return Response({"isAuthenticated": False}, status=status.HTTP_200_OK)
-        
+            return JsonResponse({"isAuthenticated": False}, status=200)
+
 
 # CSRF Cookie API
 @method_decorator(never_cache, name='get')
@@ -140,21 +252,361 @@ class CsrfTokenView(APIView):
         return Response({"detail": "CSRF cookie set."})
     
 
-class AssignmentViewSet(viewsets.ModelViewSet):
+class FieldSelectionMixin:
+    """
+    ?fields= / ?omit= で応答に含めるフィールドを選べるようにする。
+    取得時はクエリセットも .only() で必要な列に絞る。
+    """
+
+    def get_selected_fields(self):
+        if not hasattr(self, '_selected_fields'):
+            try:
+                self._selected_fields = selected_fields(self.get_serializer_class(), self.request.query_params)
+            except ValueError as e:
+                raise ValidationError({'detail': str(e)})
+        return self._selected_fields
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_selected_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_selected_fields()
+        # 更新時は保存するフィールドを減らさないよう、読み取りのときだけ絞る
+        if fields is not None and self.request.method in ('GET', 'HEAD'):
+            queryset = queryset.only(*fields)
+        return queryset
+
+
+class AssignmentViewSet(FieldSelectionMixin, viewsets.ModelViewSet):
     queryset = Assignment.objects.all()
     serializer_class = AssignmentSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user)
+        return super().get_queryset().filter(user=self.request.user)
+
+    # 一括更新で一度に変更できる課題の上限
+    BULK_MAX_CHANGES = 500
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+        self._assignments_changed()
+
+    def perform_update(self, serializer):
+        serializer.save()
+        self._assignments_changed()
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        self._assignments_changed()
+
+    def _assignments_changed(self):
+        """締切が近い課題の索引を破棄し、データの版数を増やして返す"""
+        upcoming.invalidate(self.request.user.pk)
+        return data_version.bump(self.request.user.pk)
+
+    def _title_url_conflicts(self, assignments):
+        """更新後のタイトルとURLが、同じユーザーの他の課題 (更新の対象同士を含む) と重複する課題のIDを返す"""
+        owners = {}
+        for assignment in assignments:
+            owners.setdefault((assignment.title, assignment.url), []).append(assignment.pk)
+        conflicts = {pk for pks in owners.values() if len(pks) > 1 for pk in pks}
+
+        # 更新の対象の現在の値は更新後に残らないため、対象外の課題とのみ比較する
+        existing = (
+            self.get_queryset()
+            .filter(title__in={title for title, _ in owners}, url__in={url for _, url in owners})
+            .exclude(pk__in=[assignment.pk for assignment in assignments])
+            .values_list('title', 'url')
+        )
+        for key in existing:
+            conflicts.update(owners.get(key, ()))
+        return sorted(conflicts)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        複数の課題をまとめて更新する。
+        {"changes": [{"id": 1, "is_submitted": true}, ...]} を1つのトランザクションで反映し、
+        更新後の課題と新しいデータの版数を返す。1件でも不正な変更があれば何も更新しない。
+        """
+        changes = request.data.get('changes') if isinstance(request.data, dict) else None
+        if not isinstance(changes, list) or not changes:
+            return Response({"detail": "changes must be a non-empty list."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(changes) > self.BULK_MAX_CHANGES:
+            return Response(
+                {"detail": f"changes must not contain more than {self.BULK_MAX_CHANGES} items."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        serializer = AssignmentBulkUpdateSerializer(data=changes, many=True)
+        serializer.is_valid(raise_exception=True)
+        updates = {}
+        for change in serializer.validated_data:
+            pk = change.pop('id')
+            if pk in updates:
+                return Response({"detail": f"Duplicate id: {pk}."}, status=status.HTTP_400_BAD_REQUEST)
+            updates[pk] = change
+
+        with transaction.atomic():
+            # 所有者の確認と対象の取得を1回のクエリで行う
+            assignments = list(self.get_queryset().select_for_update().filter(pk__in=updates))
+            missing = set(updates) - {assignment.pk for assignment in assignments}
+            if missing:
+                return Response(
+                    {"detail": "No Assignment matches the given query.", "ids": sorted(missing)},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+
+            # bulk_update では auto_now が働かないため、更新日時も明示的に設定する
+            now = timezone.now()
+            fields = {'updated_at'}
+            for assignment in assignments:
+                for field, value in updates[assignment.pk].items():
+                    setattr(assignment, field, value)
+                    fields.add(field)
+                assignment.updated_at = now
 
-class CourseViewSet(viewsets.ModelViewSet):
+            # 課題は ('user', 'title', 'url') で一意のため、重複する変更はIntegrityErrorの前に400で返す
+            conflicts = self._title_url_conflicts(assignments) if fields & {'title', 'url'} else []
+            if conflicts:
+                return Response(
+                    {"detail": "title and url must be unique for each assignment.", "ids": conflicts},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            try:
+                # 確認後に同時に作成された課題との衝突もトランザクションを壊さずに400にする
+                with transaction.atomic():
+                    Assignment.objects.bulk_update(assignments, sorted(fields))
+            except IntegrityError:
+                return Response(
+                    {"detail": "title and url must be unique for each assignment."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        version = self._assignments_changed()
+        return Response({
+            'updated': AssignmentSerializer(assignments, many=True, fields=self.get_selected_fields()).data,
+            'version': version,
+        }, status=status.HTTP_200_OK)
+
+class CourseViewSet(FieldSelectionMixin, viewsets.ModelViewSet):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user)
\ No newline at end of file
+        return super().get_queryset().filter(user=self.request.user)
+
+
+# 一覧・詳細の取得 (GET) は非同期ビューで処理し、ORMには非同期APIを使う。
+# 作成・更新・削除はこれまでどおりDRFのビューセットで処理する。
+NOT_AUTHENTICATED = {"detail": "Authentication credentials were not provided."}
+
+
+def _read_queryset(request, model, serializer_class, user):
+    """
+    ?fields= / ?omit= に応じて、読み取り用のクエリセット (.values()) と行を出力に変換するReaderを返す。
+    不正な指定はValueErrorを送出する。
+    """
+    reader = ValuesReader(serializer_class, selected_fields(serializer_class, request.GET))
+    return model.objects.filter(user=user), reader
+
+
+def _json_response(data, status=200):
+    """DRFのJSONRendererと同じ形式の応答を返す (orjsonがあれば使う)"""
+    return HttpResponse(fast_json.dumps(data), status=status, content_type='application/json')
+
+
+def _max_age(value):
+    """max_age (秒) を整数に変換する (指定がなければNone, 不正な値はValueError)"""
+    if value in (None, ''):
+        return None
+    max_age = int(value)
+    if max_age < 0:
+        raise ValueError
+    return max_age
+
+
+def _parse_max_age(request):
+    try:
+        return _max_age(request.GET.get('max_age')), None
+    except ValueError:
+        return None, JsonResponse({"detail": "max_age must be a non-negative integer."}, status=400)
+
+
+async def _with_freshness(response, user, max_age=None):
+    """
+    一覧の応答にデータの鮮度と版数をヘッダーで付ける。
+      X-Data-Freshness: プラットフォームごとの最終取得・最終成功日時 (JSON)
+      X-Data-Version: データの版数 (まだ変更がない場合は付けない)
+      X-Data-Stale: max_age が指定された場合、最後の成功から max_age 秒を超えたプラットフォーム (カンマ区切り)
+    スクレイピングにはログイン時のパスワードが必要なため、ここでは再取得せずに古いことだけを知らせる。
+    """
+    data = await freshness.aget(user.pk)
+    response['X-Data-Freshness'] = fast_json.dumps(freshness.to_representation(data)).decode()
+    version = await data_version.aget(user.pk)
+    if version is not None:
+        response['X-Data-Version'] = str(version)
+    if max_age is not None:
+        response['X-Data-Stale'] = ','.join(freshness.stale_platforms(data, max_age))
+    return response
+
+
+def _include_archived(request):
+    """?include_archived= が指定された場合は過去の学期 (scraping.archive) の行も返す"""
+    return request.GET.get('include_archived', '').lower() in ('1', 'true', 'yes')
+
+
+async def _list(request, model, serializer_class, archived_model=None):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse(NOT_AUTHENTICATED, status=403)
+    max_age, error = _parse_max_age(request)
+    if error:
+        return error
+    try:
+        queryset, reader = _read_queryset(request, model, serializer_class, user)
+    except ValueError as e:
+        return JsonResponse({"detail": str(e)}, status=400)
+    rows = [row async for row in reader.values(queryset)]
+    # アーカイブ済みの行は列名が同じため、同じReaderで出力できる。現在の学期の行の後に続ける
+    if archived_model is not None and _include_archived(request):
+        rows += [row async for row in reader.values(archived_model.objects.filter(user=user))]
+    return await _with_freshness(_json_response(reader.to_representation_many(rows)), user, max_age)
+
+
+async def _retrieve(request, model, serializer_class, pk, archived_model=None):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse(NOT_AUTHENTICATED, status=403)
+    try:
+        queryset, reader = _read_queryset(request, model, serializer_class, user)
+    except ValueError as e:
+        return JsonResponse({"detail": str(e)}, status=400)
+    querysets = [queryset]
+    if archived_model is not None and _include_archived(request):
+        querysets.append(archived_model.objects.filter(user=user))
+    for queryset in querysets:
+        try:
+            row = await reader.values(queryset).aget(pk=pk)
+        except (queryset.model.DoesNotExist, ValueError, TypeError):
+            continue
+        return _json_response(reader.to_representation(row))
+    return JsonResponse({"detail": f"No {model._meta.object_name} matches the given query."}, status=404)
+
+
+def _read_async(viewset, model, serializer_class, detail=False, archived_model=None):
+    """
+    GET/HEADを非同期ビューで処理し、それ以外のメソッドはビューセットに渡すビューを返す。
+    CSRFの検証はビューセット側 (DRFのSessionAuthentication) で行う。
+    アーカイブ済みの行は読み取り専用で、archived_model を指定した場合に ?include_archived= で返す。
+    """
+    actions = {'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'} if detail else {'post': 'create'}
+    fallback = sync_to_async(viewset.as_view(actions))
+
+    async def view(request, pk=None):
+        if request.method in ('GET', 'HEAD'):
+            if detail:
+                return await _retrieve(request, model, serializer_class, pk, archived_model)
+            return await _list(request, model, serializer_class, archived_model)
+        kwargs = {'pk': pk} if detail else {}
+        return await fallback(request, **kwargs)
+
+    return csrf_exempt(view)
+
+
+# 締切が近い未提出の課題 (ホーム画面用)。Redisの索引から返す
+UPCOMING_DEFAULT_LIMIT = 10
+UPCOMING_MAX_LIMIT = 100
+
+
+async def upcoming_assignments(request):
+    if request.method not in ('GET', 'HEAD'):
+        return JsonResponse({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse(NOT_AUTHENTICATED, status=403)
+    try:
+        limit = int(request.GET.get('limit', UPCOMING_DEFAULT_LIMIT))
+    except ValueError:
+        return JsonResponse({"detail": "limit must be an integer."}, status=400)
+    limit = min(max(limit, 1), UPCOMING_MAX_LIMIT)
+    max_age, error = _parse_max_age(request)
+    if error:
+        return error
+    members = await upcoming.aget_upcoming(user.pk, limit)
+    response = HttpResponse(b'[' + b','.join(members) + b']', content_type='application/json')
+    return await _with_freshness(response, user, max_age)
+
+
+# 課題のタイトルと詳細の全文検索 (関連度順, ページ単位)
+SEARCH_DEFAULT_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+
+async def search_assignments(request):
+    if request.method not in ('GET', 'HEAD'):
+        return JsonResponse({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse(NOT_AUTHENTICATED, status=403)
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({"detail": "q is required."}, status=400)
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+        page_size = min(max(int(request.GET.get('page_size', SEARCH_DEFAULT_PAGE_SIZE)), 1), SEARCH_MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({"detail": "page and page_size must be integers."}, status=400)
+    max_age, error = _parse_max_age(request)
+    if error:
+        return error
+    try:
+        queryset, reader = _read_queryset(request, Assignment, AssignmentSerializer, user)
+    except ValueError as e:
+        return JsonResponse({"detail": str(e)}, status=400)
+
+    queryset, _ = search.search_queryset(queryset, query)
+    offset = (page - 1) * page_size
+    count = await queryset.acount()
+    rows = [row async for row in reader.values(queryset)[offset:offset + page_size]]
+    response = _json_response({
+        'count': count,
+        'page': page,
+        'page_size': page_size,
+        'results': reader.to_representation_many(rows),
+    })
+    return await _with_freshness(response, user, max_age)
+
+
+assignment_list = _read_async(AssignmentViewSet, Assignment, AssignmentSerializer, archived_model=ArchivedAssignment)
+assignment_detail = _read_async(
+    AssignmentViewSet, Assignment, AssignmentSerializer, detail=True, archived_model=ArchivedAssignment,
+)
+course_list = _read_async(CourseViewSet, Course, CourseSerializer, archived_model=ArchivedCourse)
+course_detail = _read_async(CourseViewSet, Course, CourseSerializer, detail=True, archived_model=ArchivedCourse)
+
+
+# Prometheus形式のメトリクス
+# バックエンドのポートは外部からも届くため、METRICS_TOKEN のBearerトークンで認証する (未設定なら公開しない)
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if not token:
+        return HttpResponse(status=404)
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not constant_time_compare(credentials, token):
+        response = HttpResponse(status=401)
+        response['WWW-Authenticate'] = 'Bearer'
+        return response
+    try:
+        body = metrics.render()
+    except redis.RedisError as e:
+        # 値が欠けた応答を0として記録させないよう、取得の失敗として返す
+        logger.warning(f"メトリクスの取得に失敗しました: {e}")
+        return HttpResponse('metrics store is unavailable\n', status=503, content_type='text/plain; charset=utf-8')
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,3 +1,4 @@
+# Djangoの起動時にCeleryアプリを読み込み、shared_taskやシグナルがこのアプリを使うようにする
 from .celery import app as celery_app
 
-__all__ = ('celery_app',)
\ No newline at end of file
+__all__ = ('celery_app',)
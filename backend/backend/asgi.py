@@ -2,16 +2,18 @@ import os
 import django
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
 import scraping.routing
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 django.setup()
 
+# セッションとユーザーはRedisから読み込む (accounts.sessions, accounts.user_cache)
+from accounts.middleware import CachedAuthMiddlewareStack  # noqa: E402
+
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+    "websocket": CachedAuthMiddlewareStack(
         URLRouter(
             scraping.routing.websocket_urlpatterns
         )
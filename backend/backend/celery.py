@@ -1,9 +1,17 @@
 import os
+import time
+from datetime import datetime
 from celery import Celery
-from celery.signals import after_setup_logger, after_setup_task_logger
+from celery.signals import (
+    after_setup_logger, after_setup_task_logger,
+    before_task_publish, task_prerun, task_postrun, task_retry,
+)
 from logging.config import dictConfig
 from django.conf import settings
 
+from backend import metrics
+from backend.worker_memory import tracker as memory_tracker
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 app = Celery('backend')
@@ -25,4 +33,60 @@ def setup_task_loggers(logger, **kwargs):
     """
     Celeryの各タスクロガーにDjangoのLOGGING設定を適用する
     """
-    dictConfig(settings.LOGGING)
\ No newline at end of file
+    dictConfig(settings.LOGGING)
+
+
+# --- メトリクス ---
+# タスクIDごとの開始時刻 (task_prerun から task_postrun までの計測用)
+_task_started_at = {}
+
+
+@before_task_publish.connect
+def stamp_enqueued_at(headers=None, **kwargs):
+    """
+    キュー待ち時間を計測するため、発行時刻をメッセージヘッダーに記録する
+    """
+    if headers is not None:
+        headers['enqueued_at'] = time.time()
+
+
+@task_prerun.connect
+def record_task_start(task_id=None, task=None, **kwargs):
+    """
+    タスク開始時にキュー待ち時間を記録する
+    """
+    now = time.time()
+    _task_started_at[task_id] = time.monotonic()
+    memory_tracker.task_started(task_id)
+
+    request = task.request
+    enqueued_at = getattr(request, 'enqueued_at', None) or (request.headers or {}).get('enqueued_at')
+    if enqueued_at is None:
+        return
+    # countdown/eta 付きのタスクは予定時刻からの待ち時間とする
+    ready_at = float(enqueued_at)
+    if request.eta:
+        try:
+            ready_at = max(ready_at, datetime.fromisoformat(str(request.eta)).timestamp())
+        except ValueError:
+            pass
+    metrics.CELERY_QUEUE_WAIT.observe(max(now - ready_at, 0), task=task.name)
+
+
+@task_postrun.connect
+def record_task_duration(task_id=None, task=None, state=None, **kwargs):
+    """
+    タスクの実行時間を終了状態ごとに記録し、タスク中のメモリ使用量の増加を確認する
+    """
+    started = _task_started_at.pop(task_id, None)
+    if started is not None:
+        metrics.CELERY_TASK_DURATION.observe(time.monotonic() - started, task=task.name, state=state or 'UNKNOWN')
+    memory_tracker.task_finished(task_id, task.name)
+
+
+@task_retry.connect
+def record_task_retry(sender=None, **kwargs):
+    """
+    タスクの再試行回数を記録する
+    """
+    metrics.CELERY_TASK_RETRIES.inc(task=sender.name)
@@ -0,0 +1,32 @@
+"""
+APIの応答用のJSONエンコード。
+
+orjsonがインストールされていれば使い、なければ標準ライブラリで同じ出力を作る。
+出力はDRFの JSONRenderer (UNICODE_JSON=True, COMPACT_JSON=True) と同じバイト列になる。
+日時などは呼び出し側で文字列に変換しておくこと (dict, list, str, int, float, bool, None のみ扱う)。
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjsonは任意
+    orjson = None
+
+# DRFはJavaScriptで文字列中に書けない U+2028/U+2029 をエスケープする
+_LINE_SEPARATORS = (('\u2028'.encode(), b'\\u2028'), ('\u2029'.encode(), b'\\u2029'))
+
+
+def _escape_line_separators(data):
+    for raw, escaped in _LINE_SEPARATORS:
+        if raw in data:
+            data = data.replace(raw, escaped)
+    return data
+
+
+def dumps(obj):
+    """objをJSONのバイト列に変換する"""
+    if orjson is not None:
+        data = orjson.dumps(obj)
+    else:
+        data = json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return _escape_line_separators(data)
@@ -0,0 +1,221 @@
+"""
+Prometheus形式のメトリクスをRedisに集計するモジュール。
+
+uvicorn と Celery の prefork ワーカーは別プロセス(別コンテナ)で動くため、
+値はプロセス内ではなくRedisのハッシュに加算し、/metrics で読み出して出力する。
+各ハッシュのフィールドは `<サフィックス>{<ラベル>}` 形式で、出力行をそのまま表す。
+"""
+import logging
+import math
+import time
+from contextlib import contextmanager
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'metrics:'
+
+# 秒単位のレイテンシ用バケット
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_registry = []
+_client = None
+
+
+def get_client():
+    """メトリクス用のRedisクライアントを返す (接続プールはフォーク後に自動で作り直される)"""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.METRICS_REDIS_URL)
+    return _client
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    inner = ','.join(f'{name}="{_escape(value)}"' for name, value in labels)
+    return '{' + inner + '}'
+
+
+def percentile(values, q):
+    """
+    最近傍法でパーセンタイル値を求める (値がない場合はNone)。
+    SQLiteにはパーセンタイル関数がないため、管理画面・クロールの統計・負荷試験で共通に使う。
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.key = KEY_PREFIX + name
+        _registry.append(self)
+
+    def _labels(self, labels):
+        missing = set(self.labelnames) - set(labels)
+        if missing:
+            raise ValueError(f"{self.name} のラベルが不足しています: {sorted(missing)}")
+        return [(name, labels[name]) for name in self.labelnames]
+
+    def _write(self, fn, pipe=None):
+        """パイプラインが渡されればそこに積み、なければ単独で送信する。失敗しても例外は出さない。"""
+        try:
+            if pipe is not None:
+                fn(pipe)
+                return
+            p = get_client().pipeline(transaction=False)
+            fn(p)
+            p.execute()
+        except Exception as e:
+            logger.warning(f"メトリクス {self.name} の記録に失敗しました: {e}")
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, pipe=None, **labels):
+        field = '_total' + _format_labels(self._labels(labels))
+        self._write(lambda p: p.hincrbyfloat(self.key, field, amount), pipe)
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, pipe=None, **labels):
+        self.observe_many([value], pipe=pipe, **labels)
+
+    def observe_many(self, values, pipe=None, **labels):
+        """同じラベルの観測値をまとめて1回の書き込みで記録する"""
+        values = [v for v in values if v is not None]
+        if not values:
+            return
+        base = self._labels(labels)
+        counts = [sum(1 for v in values if v <= le) for le in self.buckets]
+
+        def write(p):
+            for le, count in zip(self.buckets, counts):
+                if count:
+                    field = '_bucket' + _format_labels(base + [('le', _format_value(le))])
+                    p.hincrbyfloat(self.key, field, count)
+            p.hincrbyfloat(self.key, '_sum' + _format_labels(base), sum(values))
+            p.hincrbyfloat(self.key, '_count' + _format_labels(base), len(values))
+
+        self._write(write, pipe)
+
+    @contextmanager
+    def time(self, **labels):
+        """with ブロックの実行時間を記録する"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+
+@contextmanager
+def pipeline():
+    """複数のメトリクスを1回の往復でまとめて書き込むためのパイプライン"""
+    p = get_client().pipeline(transaction=False)
+    yield p
+    try:
+        p.execute()
+    except Exception as e:
+        logger.warning(f"メトリクスの記録に失敗しました: {e}")
+
+
+def render():
+    """登録済みの全メトリクスをPrometheusのテキスト形式で返す (Redisに接続できない場合はredis.RedisErrorを送出する)"""
+    client = get_client()
+    p = client.pipeline(transaction=False)
+    for metric in _registry:
+        p.hgetall(metric.key)
+    results = p.execute()
+
+    lines = []
+    for metric, samples in zip(_registry, results):
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for field, value in sorted(samples.items()):
+            lines.append(f'{metric.name}{field.decode()} {_format_value(float(value))}')
+    return '\n'.join(lines) + '\n'
+
+
+# --- Scrapy ---
+SCRAPY_CRAWLS = Counter('scrapy_crawls', 'Number of finished crawls by close reason.', ['platform', 'reason'])
+SCRAPY_REQUESTS = Counter('scrapy_requests', 'Number of requests sent by the downloader.', ['platform'])
+SCRAPY_RESPONSES = Counter('scrapy_responses', 'Number of responses by HTTP status code.', ['platform', 'status'])
+SCRAPY_ITEMS = Counter('scrapy_items', 'Number of scraped items.', ['platform'])
+SCRAPY_RESPONSE_BYTES = Counter('scrapy_response_bytes', 'Bytes downloaded by the downloader.', ['platform'])
+SCRAPY_CRAWL_DURATION = Histogram('scrapy_crawl_duration_seconds', 'Wall time of a single crawl.', ['platform'])
+SCRAPY_DOWNLOAD_LATENCY = Histogram(
+    'scrapy_download_latency_seconds', 'Download latency of individual requests.', ['platform'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+SCRAPE_OUTCOMES = Counter('scrape_outcomes', 'Number of finished login scrapes by combined outcome.', ['outcome'])
+
+# --- Celery ---
+CELERY_TASK_DURATION = Histogram('celery_task_duration_seconds', 'Runtime of Celery tasks.', ['task', 'state'])
+CELERY_QUEUE_WAIT = Histogram('celery_task_queue_wait_seconds', 'Time between publish and start of a task.', ['task'])
+CELERY_TASK_RETRIES = Counter('celery_task_retries', 'Number of task retries.', ['task'])
+CELERY_WORKER_RSS = Histogram(
+    'celery_worker_rss_bytes', 'Resident memory of a worker process after each task.', ['task'],
+    buckets=tuple(mb * 1024 * 1024 for mb in (100, 200, 300, 500, 750, 1000, 1500, 2000)),
+)
+CELERY_TASK_RSS_GROWTH = Histogram(
+    'celery_task_rss_growth_bytes', 'Growth of resident memory during a single task.', ['task'],
+    buckets=tuple(mb * 1024 * 1024 for mb in (1, 5, 10, 30, 50, 100, 200)),
+)
+CELERY_TASK_MEMORY_LEAKS = Counter('celery_task_memory_leaks', 'Number of tasks flagged for memory growth.', ['task'])
+
+# --- Login ---
+LOGIN_DURATION = Histogram(
+    'login_duration_seconds', 'Latency of POST /api/login/.', ['status'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+LDAP_AUTH_DURATION = Histogram(
+    'ldap_auth_duration_seconds', 'Latency of LDAP authentication.', ['result'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+
+# --- Reminders ---
+REMINDERS_SENT = Counter('reminders_sent', 'Number of deadline reminders sent.', ['offset_minutes'])
+
+
+def record_crawl(platform, stats, latencies):
+    """Scrapyの統計情報とレスポンスごとのレイテンシを記録する"""
+    with pipeline() as p:
+        SCRAPY_CRAWLS.inc(pipe=p, platform=platform, reason=stats.get('finish_reason', 'unknown'))
+        SCRAPY_REQUESTS.inc(stats.get('downloader/request_count', 0), pipe=p, platform=platform)
+        SCRAPY_ITEMS.inc(stats.get('item_scraped_count', 0), pipe=p, platform=platform)
+        SCRAPY_RESPONSE_BYTES.inc(stats.get('downloader/response_bytes', 0), pipe=p, platform=platform)
+        for key, value in stats.items():
+            if key.startswith('downloader/response_status_count/'):
+                status = key.rsplit('/', 1)[-1]
+                SCRAPY_RESPONSES.inc(value, pipe=p, platform=platform, status=status)
+        if stats.get('elapsed_time_seconds') is not None:
+            SCRAPY_CRAWL_DURATION.observe(stats['elapsed_time_seconds'], pipe=p, platform=platform)
+        SCRAPY_DOWNLOAD_LATENCY.observe_many(latencies, pipe=p, platform=platform)
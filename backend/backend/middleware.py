@@ -0,0 +1,19 @@
+"""
+プロジェクト共通のミドルウェア。
+"""
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+
+
+class JSONGZipMiddleware(GZipMiddleware):
+    """
+    一定以上の大きさのJSONの応答だけをgzipで圧縮する。
+    小さい応答は圧縮しても効果が薄く、JSON以外 (メトリクスや管理画面) はこれまでどおり返す。
+    """
+
+    def process_response(self, request, response):
+        if not response.get('Content-Type', '').startswith('application/json'):
+            return response
+        if not response.streaming and len(response.content) < settings.RESPONSE_GZIP_MIN_BYTES:
+            return response
+        return super().process_response(request, response)
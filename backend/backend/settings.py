@@ -1,6 +1,7 @@
 from pathlib import Path
 from dotenv import load_dotenv
 import os
+from celery.schedules import crontab
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -27,6 +28,26 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Asia/Tokyo'
+# ブラウザを使うWebClassとHTTPのみのMoodleは負荷の性質が違うため、キューを分けて別のワーカーで処理する
+# (ワーカーごとの並列数・プリフェッチ数・メモリ上限は docker-compose.yml を参照)
+CELERY_TASK_DEFAULT_QUEUE = 'celery'
+CELERY_TASK_ROUTES = {
+    'scraping.task.scrape_moodle_task': {'queue': 'moodle'},
+    'scraping.task.scrape_webclass_task': {'queue': 'webclass'},
+}
+# 定期実行するタスク (docker-compose.yml の beat で実行する)
+CELERY_BEAT_SCHEDULE = {
+    'send-deadline-reminders': {
+        'task': 'scraping.task.send_reminders_task',
+        'schedule': int(os.getenv('REMINDER_TICK_SECONDS', 60)),
+    },
+}
+# 優先度付きのキュー (Redisでは数値が小さいほど優先。scraping.admission を参照)
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'priority_steps': [0, 3, 6, 9],
+    'sep': ':',
+    'queue_order_strategy': 'priority',
+}
 
 # Application definition
 
@@ -47,15 +68,21 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    # 大きいJSONの応答はgzipで圧縮する (応答の本文を扱う他のミドルウェアより前に置く)
+    'backend.middleware.JSONGZipMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # ログイン中のユーザーはRedisのキャッシュから復元する (accounts.user_cache)
+    'accounts.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# この大きさ(バイト)以上のJSONの応答をgzipで圧縮する
+RESPONSE_GZIP_MIN_BYTES = int(os.getenv('RESPONSE_GZIP_MIN_BYTES', 1024))
+
 CORS_ALLOWED_ORIGINS = [
     'http://127.0.0.1:5174',
     'http://localhost:5174',
@@ -83,6 +110,13 @@ CORS_ALLOW_HEADERS = [
     'x-requested-with',
 ]
 
+# 一覧のAPIが返すデータの鮮度と版数 (api.views) をフロントエンドから読めるようにする
+CORS_EXPOSE_HEADERS = [
+    'x-data-freshness',
+    'x-data-stale',
+    'x-data-version',
+]
+
 CORS_ALLOW_METHODS = [
     'DELETE',
     'GET',
@@ -190,6 +224,96 @@ CHANNEL_LAYERS = {
     },
 }
 
+# キャッシュの設定 (スクレイピング進捗の最新状態などを保持)
+REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f'{REDIS_URL}/1',
+    }
+}
+
+# セッションの保存先 (accounts.sessions)
+# 認証済みのリクエストはセッションとログイン中のユーザーをRedisから1往復で読み込む
+SESSION_ENGINE = 'accounts.sessions'
+SESSION_REDIS_URL = os.getenv('SESSION_REDIS_URL', f'{REDIS_URL}/4')
+# ログイン中のユーザーのキャッシュの有効期限(秒)。更新・削除・ログアウト時には即座に破棄する
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', 10 * 60))
+
+# メトリクスの集計先 (uvicornとCeleryワーカーの全プロセスで共有する)
+METRICS_REDIS_URL = os.getenv('METRICS_REDIS_URL', f'{REDIS_URL}/2')
+# /metrics の収集に必要なBearerトークン (未設定の場合は /metrics を公開しない)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# ユーザーごとの締切が近い課題の索引 (scraping.upcoming)
+UPCOMING_REDIS_URL = os.getenv('UPCOMING_REDIS_URL', f'{REDIS_URL}/5')
+# 索引の有効期限(秒)。期限切れ後は次の読み込みでDBから作り直す
+UPCOMING_INDEX_TTL = int(os.getenv('UPCOMING_INDEX_TTL', 24 * 60 * 60))
+
+# スクレイピングの受付制御 (scraping.admission)
+SCRAPE_QUEUE_REDIS_URL = os.getenv('SCRAPE_QUEUE_REDIS_URL', f'{REDIS_URL}/3')
+# 完了までの目安時間の計算に使うワーカーの並列数 (docker-compose.yml の設定と合わせる)
+SCRAPE_WORKER_CONCURRENCY = {
+    'moodle': int(os.getenv('MOODLE_WORKER_CONCURRENCY', 8)),
+    'webclass': int(os.getenv('WEBCLASS_WORKER_CONCURRENCY', 2)),
+}
+# 実績がないときに使う1回あたりの所要時間(秒)
+SCRAPE_DEFAULT_DURATION_SECONDS = {'moodle': 30, 'webclass': 120}
+# 新しいジョブの完了目安がこの秒数を超える場合は混雑とみなす
+SCRAPE_ADMISSION_MAX_WAIT_SECONDS = int(os.getenv('SCRAPE_ADMISSION_MAX_WAIT_SECONDS', 5 * 60))
+# 混雑時に、直近の成功からこの秒数以内のユーザーはスクレイピングを省略する
+SCRAPE_FRESH_SECONDS = int(os.getenv('SCRAPE_FRESH_SECONDS', 3 * 60 * 60))
+# プラットフォームごとのタスクの時間制限(秒)
+# soft を超えるとクロールを停止して取得済みの課題を反映し、hard を超えるとワーカーが子プロセスを強制終了する
+SCRAPE_TIME_LIMITS = {
+    'moodle': {
+        'soft': int(os.getenv('MOODLE_SOFT_TIME_LIMIT', 5 * 60)),
+        'hard': int(os.getenv('MOODLE_HARD_TIME_LIMIT', 6 * 60)),
+    },
+    'webclass': {
+        'soft': int(os.getenv('WEBCLASS_SOFT_TIME_LIMIT', 10 * 60)),
+        'hard': int(os.getenv('WEBCLASS_HARD_TIME_LIMIT', 11 * 60)),
+    },
+}
+
+# 締切のリマインダー (scraping.reminders)
+# 締切の何分前に通知するか (カンマ区切り)
+REMINDER_OFFSETS_MINUTES = sorted(
+    {int(minutes) for minutes in os.getenv('REMINDER_OFFSETS_MINUTES', '1440,60').split(',') if minutes.strip()},
+    reverse=True,
+)
+# 台帳への記録と送信をまとめて行う件数
+REMINDER_BATCH_SIZE = int(os.getenv('REMINDER_BATCH_SIZE', 1000))
+# 設定した場合はリマインダーをまとめてJSONでPOSTする
+REMINDER_WEBHOOK_URL = os.getenv('REMINDER_WEBHOOK_URL', '')
+REMINDER_WEBHOOK_TIMEOUT_SECONDS = int(os.getenv('REMINDER_WEBHOOK_TIMEOUT_SECONDS', 10))
+# 設定した場合は「学籍番号@ドメイン」へメールでも送信する
+REMINDER_EMAIL_DOMAIN = os.getenv('REMINDER_EMAIL_DOMAIN', '')
+
+# 過去の学期のアーカイブ (scraping.archive)
+# 提出期限からこの日数が過ぎた課題をアーカイブ用のテーブルへ移動する
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 180))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 1000))
+# 有効にした場合はCelery beatから毎日実行する (無効の場合は manage.py archive_semesters で実行する)
+if os.getenv('ARCHIVE_BEAT_ENABLED', 'False') == 'True':
+    CELERY_BEAT_SCHEDULE['archive-semesters'] = {
+        'task': 'scraping.task.archive_semesters_task',
+        'schedule': crontab(hour=4, minute=0),
+    }
+
+# ワーカーのメモリ監視 (backend.worker_memory)
+# 子プロセスの入れ替えは docker-compose.yml の --max-tasks-per-child と --max-memory-per-child で行う
+# 1タスクでRSSがこの値(MB)以上増えた場合にリークの疑いとしてログに出力する
+WORKER_LEAK_THRESHOLD_MB = int(os.getenv('WORKER_LEAK_THRESHOLD_MB', 30))
+# 起動直後の数タスクはインポートやキャッシュで増えるため判定しない
+WORKER_LEAK_WARMUP_TASKS = int(os.getenv('WORKER_LEAK_WARMUP_TASKS', 2))
+# 常にtracemallocで割り当て箇所を記録する (通常は manage.py trace_worker_memory で一時的に有効にする)
+WORKER_TRACEMALLOC = os.getenv('WORKER_TRACEMALLOC', 'False') == 'True'
+WORKER_TRACEMALLOC_FRAMES = int(os.getenv('WORKER_TRACEMALLOC_FRAMES', 10))
+# リークの疑いがある場合に出力する割り当て箇所の数
+WORKER_TRACEMALLOC_TOP = int(os.getenv('WORKER_TRACEMALLOC_TOP', 10))
+
 # ログ設定
 LOGGING = {
     'version': 1,
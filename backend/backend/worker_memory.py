@@ -0,0 +1,140 @@
+"""
+Celeryワーカーの子プロセスのメモリ使用量をタスクごとに記録するモジュール。
+
+子プロセスは複数のタスクで使い回すため、タスクの前後でRSSを測り、
+1タスクで大きく増えた場合はリークの疑いとしてログに出力する。
+tracemallocが有効な場合は、増加の大きい割り当て箇所もあわせて出力する。
+tracemallocは常時有効にすると遅くなるため、manage.py trace_worker_memory で一時的に有効にできる。
+"""
+import logging
+import os
+import resource
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.cache import cache
+
+from backend import metrics
+
+logger = logging.getLogger(__name__)
+
+# 有効期限(UNIX時刻)を保存し、期限まで全ワーカーでtracemallocを有効にする
+TRACE_UNTIL_KEY = 'worker_memory:trace_until'
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss_bytes():
+    """現在のRSS(バイト)を返す。/proc が使えない環境では最大RSSで代用する。"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        # Linuxでは ru_maxrss はKB単位
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def request_trace(seconds):
+    """全ワーカーで指定秒数のあいだtracemallocを有効にする (0以下で解除)"""
+    if seconds > 0:
+        cache.set(TRACE_UNTIL_KEY, time.time() + seconds, seconds)
+    else:
+        cache.delete(TRACE_UNTIL_KEY)
+
+
+def _trace_requested():
+    if settings.WORKER_TRACEMALLOC:
+        return True
+    try:
+        until = cache.get(TRACE_UNTIL_KEY)
+    except Exception as e:
+        logger.warning(f"tracemallocの設定の取得に失敗しました: {e}")
+        return False
+    return until is not None and until > time.time()
+
+
+def _format_mb(value):
+    return f'{value / 1024 / 1024:.1f}MB'
+
+
+class TaskMemoryTracker:
+    """子プロセス内のタスクごとのメモリ使用量を記録する"""
+
+    def __init__(self):
+        self._started = {}
+        self._pid = None
+        self.completed = 0
+        self.first_rss = None
+
+    def _reset_after_fork(self):
+        # prefork でフォークされた子プロセスでは親の記録を引き継がない
+        pid = os.getpid()
+        if self._pid != pid:
+            self._pid = pid
+            self._started.clear()
+            self.completed = 0
+            self.first_rss = None
+
+    def task_started(self, task_id):
+        self._reset_after_fork()
+
+        if _trace_requested():
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(settings.WORKER_TRACEMALLOC_FRAMES)
+                logger.info(f"tracemallocを開始しました (pid={self._pid})")
+        elif tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info(f"tracemallocを停止しました (pid={self._pid})")
+
+        snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        self._started[task_id] = (current_rss_bytes(), snapshot)
+
+    def task_finished(self, task_id, task_name):
+        started = self._started.pop(task_id, None)
+        if started is None:
+            return
+        rss_before, snapshot_before = started
+        rss_after = current_rss_bytes()
+        growth = rss_after - rss_before
+        self.completed += 1
+        if self.first_rss is None:
+            self.first_rss = rss_after
+
+        with metrics.pipeline() as p:
+            metrics.CELERY_WORKER_RSS.observe(rss_after, pipe=p, task=task_name)
+            metrics.CELERY_TASK_RSS_GROWTH.observe(max(growth, 0), pipe=p, task=task_name)
+
+        logger.info(
+            f"タスク {task_name} のメモリ使用量: {_format_mb(rss_after)} "
+            f"(タスク中 {growth / 1024 / 1024:+.1f}MB, {self.completed}タスク目, pid={self._pid})"
+        )
+
+        leaking = (
+            self.completed > settings.WORKER_LEAK_WARMUP_TASKS
+            and growth >= settings.WORKER_LEAK_THRESHOLD_MB * 1024 * 1024
+        )
+        if leaking:
+            metrics.CELERY_TASK_MEMORY_LEAKS.inc(task=task_name)
+            logger.warning(
+                f"タスク {task_name} でメモリリークの疑いがあります: タスク中に {_format_mb(growth)} 増加 "
+                f"(現在 {_format_mb(rss_after)}, 1タスク目の終了時から "
+                f"{_format_mb(rss_after - self.first_rss)} 増加, {self.completed}タスク目, pid={self._pid})"
+            )
+
+        # tracemallocが有効な間は、リークの疑いがなくても割り当て箇所を出力する
+        if snapshot_before is not None and tracemalloc.is_tracing():
+            level = logging.WARNING if leaking else logging.INFO
+            self._log_top_allocations(task_name, snapshot_before, tracemalloc.take_snapshot(), level)
+
+    def _log_top_allocations(self, task_name, before, after, level):
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        stats = after.filter_traces(filters).compare_to(before.filter_traces(filters), 'lineno')
+        lines = [
+            f"  {stat.size_diff / 1024:+.1f}KB ({stat.count_diff:+d}) {stat.traceback[0]}"
+            for stat in stats[:settings.WORKER_TRACEMALLOC_TOP]
+        ]
+        logger.log(level, f"タスク {task_name} で増加した割り当て箇所 (pid={self._pid}):\n" + "\n".join(lines))
+
+
+tracker = TaskMemoryTracker()
@@ -1,12 +1,32 @@
+from collections import defaultdict
+from datetime import timedelta
+
 from django.contrib import admin
-from .models import Assignment, Course
+from django.db.models import Q
+from django.db.models.functions import TruncDate
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+
+from backend.metrics import percentile
+from . import search
+from .models import Assignment, Course, ScrapeRun
+
 
 class AssignmentAdmin(admin.ModelAdmin):
     list_display = ('title', 'course', 'user', 'due_date', 'is_submitted')
     list_filter = ('user', 'platform', 'course')
-    search_fields = ('title', 'course__title')
+    search_fields = ('title', 'content', 'course__title')
     ordering = ('user', 'course', 'due_date')
 
+    def get_search_results(self, request, queryset, search_term):
+        # タイトルと詳細はAPIの検索と同じ全文検索の索引で絞り込み、授業名は部分一致で検索する
+        if not search_term.strip():
+            return queryset, False
+        matched, _ = search.search_queryset(queryset.model.objects.all(), search_term)
+        course_matched = Q(course__title__icontains=search_term.strip())
+        return queryset.filter(Q(pk__in=matched.values('pk')) | course_matched), False
+
 
 class CourseAdmin(admin.ModelAdmin):
     list_display = ('title', 'user', 'day_of_week', 'period')
@@ -15,5 +35,78 @@ class CourseAdmin(admin.ModelAdmin):
     ordering = ('user', 'title')
 
 
+class ScrapeRunAdmin(admin.ModelAdmin):
+    list_display = ('started_at', 'platform', 'user', 'status', 'duration', 'request_count', 'item_count', 'retries', 'bytes_downloaded')
+    list_filter = ('platform', 'status', 'started_at')
+    search_fields = ('user__university_id', 'failure_reason')
+    ordering = ('-started_at',)
+    readonly_fields = [field.name for field in ScrapeRun._meta.fields]
+    change_list_template = 'admin/scraping/scraperun/change_list.html'
+
+    # 集計対象とする日数
+    PERFORMANCE_DAYS = 30
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_urls(self):
+        urls = [
+            path(
+                'performance/',
+                self.admin_site.admin_view(self.performance_view),
+                name='scraping_scraperun_performance',
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def performance_view(self, request):
+        """
+        日付・プラットフォームごとの所要時間のパーセンタイルを表示する。
+        """
+        since = timezone.now() - timedelta(days=self.PERFORMANCE_DAYS)
+        rows = (
+            ScrapeRun.objects
+            .filter(started_at__gte=since, duration__isnull=False)
+            .annotate(day=TruncDate('started_at'))
+            .values_list('day', 'platform', 'status', 'duration', 'request_count', 'item_count', 'retries')
+        )
+
+        groups = defaultdict(lambda: {'durations': [], 'runs': 0, 'failures': 0, 'requests': 0, 'items': 0, 'retries': 0})
+        for day, platform, status, duration, request_count, item_count, retries in rows:
+            group = groups[(day, platform)]
+            group['durations'].append(duration)
+            group['runs'] += 1
+            group['failures'] += status == 'failure'
+            group['requests'] += request_count
+            group['items'] += item_count
+            group['retries'] += retries
+
+        summary = []
+        for (day, platform), group in sorted(groups.items(), key=lambda kv: (kv[0][0], kv[0][1]), reverse=True):
+            durations = group['durations']
+            summary.append({
+                'day': day,
+                'platform': platform,
+                'runs': group['runs'],
+                'failures': group['failures'],
+                'retries': group['retries'],
+                'avg_requests': group['requests'] / group['runs'],
+                'avg_items': group['items'] / group['runs'],
+                'p50': percentile(durations, 50),
+                'p90': percentile(durations, 90),
+                'p95': percentile(durations, 95),
+                'max': max(durations),
+            })
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': f'スクレイピング性能 (直近{self.PERFORMANCE_DAYS}日)',
+            'summary': summary,
+        }
+        return TemplateResponse(request, 'admin/scraping/scraperun/performance.html', context)
+
+
 admin.site.register(Assignment, AssignmentAdmin)
-admin.site.register(Course, CourseAdmin)
\ No newline at end of file
+admin.site.register(Course, CourseAdmin)
+admin.site.register(ScrapeRun, ScrapeRunAdmin)
\ No newline at end of file
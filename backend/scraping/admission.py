@@ -0,0 +1,215 @@
+"""
+ログイン時に登録するスクレイピングの受付制御。
+
+プラットフォームごとに待機中のジョブをRedisのソート済みセットで管理し、
+キューの長さ・順番・完了までの目安時間を求める。混雑時はデータが新しいユーザーのジョブを受け付けない。
+
+Celery(Redisブローカー)の優先度は数値が小さいほど先に処理されるため、
+ソート済みセットのスコアも同じ順序 (優先度 → 登録時刻) になるようにしている。
+"""
+import logging
+import math
+import time
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+from django.utils import timezone
+
+from . import freshness
+from .notifications import PLATFORMS
+
+logger = logging.getLogger(__name__)
+
+# 本日最初のログイン (前回から日が変わった) は再ログインより優先する
+PRIORITY_FIRST_LOGIN = 0
+PRIORITY_RELOGIN = 6
+PRIORITIES = (PRIORITY_FIRST_LOGIN, PRIORITY_RELOGIN)
+
+# 優先度ごとにスコアをずらし、同じ優先度の中では登録順になるようにする
+# 登録時刻はUNIX時刻(秒)のため、どの時刻よりも大きい値にして優先度の範囲が重ならないようにする
+_PRIORITY_OFFSET = 10 ** 10
+
+# 開始されないまま残ったジョブ (ワーカーの異常終了など) を順番の計算から外すまでの時間(秒)
+STALE_SECONDS = 2 * 60 * 60
+
+# 所要時間の移動平均の重み
+_DURATION_SMOOTHING = 0.2
+
+AVG_DURATION_KEY = 'admission:avg_duration'
+
+_client = None
+_async_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.SCRAPE_QUEUE_REDIS_URL)
+    return _client
+
+
+def get_async_client():
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.Redis.from_url(settings.SCRAPE_QUEUE_REDIS_URL)
+    return _async_client
+
+
+def pending_key(platform):
+    return f'admission:pending:{platform}'
+
+
+def _score(priority, enqueued_at):
+    return priority * _PRIORITY_OFFSET + enqueued_at
+
+
+def _prune(p, platform, now):
+    for priority in PRIORITIES:
+        p.zremrangebyscore(pending_key(platform), _score(priority, 0), _score(priority, now - STALE_SECONDS))
+
+
+def _avg_duration(platform, value):
+    if value is not None:
+        return float(value)
+    return settings.SCRAPE_DEFAULT_DURATION_SECONDS[platform]
+
+
+def estimate_eta(platform, position, avg_duration):
+    """
+    順番 (0始まり) からスクレイピング完了までの目安時間(秒)を求める。
+    ワーカーの並列数ごとにまとめて処理されるものとして見積もる。
+    """
+    concurrency = max(settings.SCRAPE_WORKER_CONCURRENCY[platform], 1)
+    return math.ceil((position + 1) / concurrency) * avg_duration
+
+
+def priority_for(user):
+    """前回のログインが今日より前 (または初回) なら優先する"""
+    if user.logined_at is None or timezone.localdate(user.logined_at) < timezone.localdate():
+        return PRIORITY_FIRST_LOGIN
+    return PRIORITY_RELOGIN
+
+
+def is_fresh(user, platform):
+    """直近のスクレイピングが成功しており、まだ新しいデータかどうか"""
+    return freshness.is_fresh(freshness.get(user.pk), platform, settings.SCRAPE_FRESH_SECONDS)
+
+
+def admit(user, priority, platforms=PLATFORMS):
+    """
+    プラットフォームごとにスクレイピングを受け付けるか判断し、待機中のジョブとして登録する。
+
+    Returns:
+        dict: {platform: {'state': 'queued' | 'skipped', 'position': int | None,
+                          'eta_seconds': float | None, 'enqueue': bool}}
+              enqueue がTrueのプラットフォームのみタスクを登録すること。
+              Redisに接続できない場合は受付制御を行わず、すべて登録する。
+    """
+    if not platforms:
+        return {}
+    try:
+        return _admit(user, priority, platforms)
+    except redis.RedisError as e:
+        logger.warning(f"受付制御に失敗したため、すべてのスクレイピングを登録します (user_pk={user.pk}): {e}")
+        return {
+            platform: {'state': 'queued', 'position': None, 'eta_seconds': None, 'enqueue': True}
+            for platform in platforms
+        }
+
+
+def _admit(user, priority, platforms):
+    client = get_client()
+    now = time.time()
+    member = str(user.pk)
+
+    p = client.pipeline(transaction=False)
+    for platform in platforms:
+        _prune(p, platform, now)
+    for platform in platforms:
+        p.zcard(pending_key(platform))
+        p.zrank(pending_key(platform), member)
+    p.hmget(AVG_DURATION_KEY, list(platforms))
+    results = p.execute()[len(platforms) * len(PRIORITIES):]
+    avg_durations = dict(zip(platforms, results[-1]))
+
+    decisions = {}
+    for i, platform in enumerate(platforms):
+        depth, rank = results[i * 2], results[i * 2 + 1]
+        avg = _avg_duration(platform, avg_durations[platform])
+
+        if rank is not None:
+            # 再ログインなどで既に待機中のジョブがある場合は二重に登録しない
+            decisions[platform] = {
+                'state': 'queued', 'position': rank,
+                'eta_seconds': estimate_eta(platform, rank, avg), 'enqueue': False,
+            }
+            continue
+
+        overloaded = estimate_eta(platform, depth, avg) > settings.SCRAPE_ADMISSION_MAX_WAIT_SECONDS
+        if overloaded and is_fresh(user, platform):
+            decisions[platform] = {'state': 'skipped', 'position': None, 'eta_seconds': None, 'enqueue': False}
+            continue
+
+        # 同じユーザーのログインが同時に届いた場合に二重に登録しないよう、存在しない場合のみ追加する
+        p = client.pipeline(transaction=True)
+        p.zadd(pending_key(platform), {member: _score(priority, now)}, nx=True)
+        p.zrank(pending_key(platform), member)
+        added, position = p.execute()
+        position = position or 0
+        decisions[platform] = {
+            'state': 'queued', 'position': position,
+            'eta_seconds': estimate_eta(platform, position, avg), 'enqueue': bool(added),
+        }
+
+    return decisions
+
+
+def cancel(user_pk, platforms):
+    """タスクの登録に失敗した場合に待機中のジョブから外す"""
+    try:
+        p = get_client().pipeline(transaction=False)
+        for platform in platforms:
+            p.zrem(pending_key(platform), str(user_pk))
+        p.execute()
+    except redis.RedisError as e:
+        logger.warning(f"待機中のジョブの削除に失敗しました (user_pk={user_pk}): {e}")
+
+
+def mark_started(user_pk, platform):
+    """ワーカーがジョブを開始したら待機中のジョブから外す"""
+    try:
+        get_client().zrem(pending_key(platform), str(user_pk))
+    except redis.RedisError as e:
+        logger.warning(f"待機中のジョブの削除に失敗しました (user_pk={user_pk}, platform={platform}): {e}")
+
+
+def record_duration(platform, seconds):
+    """完了までの目安時間の計算に使う所要時間の移動平均を更新する"""
+    try:
+        client = get_client()
+        current = client.hget(AVG_DURATION_KEY, platform)
+        avg = seconds if current is None else float(current) * (1 - _DURATION_SMOOTHING) + seconds * _DURATION_SMOOTHING
+        client.hset(AVG_DURATION_KEY, platform, avg)
+    except redis.RedisError as e:
+        logger.warning(f"所要時間の記録に失敗しました (platform={platform}): {e}")
+
+
+async def aget_positions(user_pk):
+    """待機中のプラットフォームごとの現在の順番と目安時間を返す (WebSocketでの通知用)"""
+    client = get_async_client()
+    p = client.pipeline(transaction=False)
+    for platform in PLATFORMS:
+        p.zrank(pending_key(platform), str(user_pk))
+    p.hmget(AVG_DURATION_KEY, list(PLATFORMS))
+    results = await p.execute()
+    avg_durations = dict(zip(PLATFORMS, results[-1]))
+
+    positions = {}
+    for platform, rank in zip(PLATFORMS, results[:-1]):
+        if rank is None:
+            continue
+        avg = _avg_duration(platform, avg_durations[platform])
+        positions[platform] = {'position': rank, 'eta_seconds': estimate_eta(platform, rank, avg)}
+    return positions
+
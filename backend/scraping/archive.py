@@ -0,0 +1,95 @@
+"""
+過去の学期の課題と授業のアーカイブ。
+
+提出期限が ARCHIVE_AFTER_DAYS 日より前の課題と、課題が残っていない古い授業を、
+アーカイブ用のテーブル (ArchivedAssignment, ArchivedCourse) へまとめて移動する。
+一覧のAPIやスクレイピングの保存処理は現在の学期の行だけを扱い、
+過去の学期のデータは ?include_archived= を指定した場合のみ読み込む。
+
+manage.py archive_semesters で実行し、ARCHIVE_BEAT_ENABLED を有効にした場合はCelery beatから定期的に実行する。
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from . import data_version
+from .models import ArchivedAssignment, ArchivedCourse, Assignment, Course
+
+logger = logging.getLogger(__name__)
+
+_ASSIGNMENT_COLUMNS = (
+    'id', 'user_id', 'course_id', 'title', 'content', 'url', 'start_date', 'due_date',
+    'is_submitted', 'platform', 'created_at', 'updated_at',
+)
+_COURSE_COLUMNS = ('id', 'user_id', 'title', 'day_of_week', 'period', 'created_at', 'updated_at')
+
+
+def cutoff(now=None):
+    """この日時より前の提出期限の課題をアーカイブの対象とする"""
+    return (now or timezone.now()) - timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+
+
+def expired_assignments(before):
+    """
+    アーカイブの対象の課題。
+    提出期限がない課題は、before 以降にスクレイピングで更新されていないものを対象とする。
+    """
+    return Assignment.objects.filter(
+        Q(due_date__lt=before) | Q(due_date__isnull=True, updated_at__lt=before)
+    )
+
+
+def expired_courses(before):
+    """before より前に作成され、アーカイブされていない課題が残っていない授業"""
+    return Course.objects.filter(created_at__lt=before).filter(
+        ~Exists(Assignment.objects.filter(course=OuterRef('pk')))
+    )
+
+
+def _move(queryset, archive_model, columns, batch_size):
+    """
+    queryset の行を batch_size 件ずつ archive_model へ移動し、移動した件数と対象のユーザーを返す。
+    バッチごとに1つのトランザクションでコピーと削除を行い、主キーの順に続きから読む。
+    """
+    moved = 0
+    user_pks = set()
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                queryset.filter(pk__gt=last_pk).order_by('pk').values(*columns)[:batch_size]
+            )
+            if not rows:
+                break
+            archive_model.objects.bulk_create([archive_model(**row) for row in rows])
+            queryset.model.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+        last_pk = rows[-1]['id']
+        moved += len(rows)
+        user_pks.update(row['user_id'] for row in rows)
+    return moved, user_pks
+
+
+def archive(before=None, batch_size=None):
+    """
+    before (省略時は cutoff()) より前の課題と授業をアーカイブし、移動した件数を返す。
+
+    Returns:
+        dict: {'assignments': int, 'courses': int}
+    """
+    before = before or cutoff()
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+
+    assignments, user_pks = _move(expired_assignments(before), ArchivedAssignment, _ASSIGNMENT_COLUMNS, batch_size)
+    # 課題を移動した後に、課題が残っていない授業を移動する
+    courses, course_user_pks = _move(expired_courses(before), ArchivedCourse, _COURSE_COLUMNS, batch_size)
+
+    # 手元の一覧からアーカイブした行を除けるよう、データの版数を増やす
+    for user_pk in user_pks | course_user_pks:
+        data_version.bump(user_pk)
+
+    logger.info(f"{before:%Y-%m-%d}より前の課題{assignments}件と授業{courses}件をアーカイブしました。")
+    return {'assignments': assignments, 'courses': courses}
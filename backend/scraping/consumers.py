@@ -1,6 +1,16 @@
+import asyncio
 import json
+import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
 
+from . import admission
+from .notifications import group_name, aget_last_statuses
+
+logger = logging.getLogger(__name__)
+
+# 待機中のジョブの順番を通知する間隔(秒)
+QUEUE_POLL_INTERVAL_SECONDS = 5
+
 class ScrapingStatusConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.user = self.scope["user"]
@@ -9,14 +19,51 @@ class ScrapingStatusConsumer(AsyncWebsocketConsumer):
             return
 
         # ユーザーごとに一意なグループ名を作成し、そのグループに参加
-        self.group_name = f'scraping_status_user_{self.user.pk}'
+        self.group_name = group_name(self.user.pk)
         await self.channel_layer.group_add(
             self.group_name,
             self.channel_name
         )
         await self.accept()
 
+        # 接続前に送信済みの最新状態を再送する (再接続・遅れて接続した場合の取りこぼし対策)
+        try:
+            statuses = await aget_last_statuses(self.user.pk)
+        except Exception as e:
+            logger.warning(f"最新の進捗状態の取得に失敗しました (user_pk={self.user.pk}): {e}")
+            statuses = {}
+        if statuses:
+            await self.send(text_data=json.dumps({
+                'type': 'snapshot',
+                'statuses': statuses,
+            }))
+
+        # 待機中のプラットフォームがあれば、開始されるまで順番と目安時間を通知する
+        self.queue_task = None
+        if any(status.get('state') == 'queued' for status in statuses.values()):
+            self.queue_task = asyncio.create_task(self._send_queue_positions())
+
+    async def _send_queue_positions(self):
+        while True:
+            try:
+                positions = await admission.aget_positions(self.user.pk)
+            except Exception as e:
+                logger.warning(f"待機中のジョブの順番の取得に失敗しました (user_pk={self.user.pk}): {e}")
+                return
+            if not positions:
+                return
+            for platform, info in positions.items():
+                await self.send(text_data=json.dumps({
+                    'type': 'queue',
+                    'platform': platform,
+                    'position': info['position'],
+                    'eta_seconds': info['eta_seconds'],
+                }))
+            await asyncio.sleep(QUEUE_POLL_INTERVAL_SECONDS)
+
     async def disconnect(self, close_code):
+        if getattr(self, 'queue_task', None):
+            self.queue_task.cancel()
         # グループから退出
         if hasattr(self, 'group_name'):
             await self.channel_layer.group_discard(
@@ -26,8 +73,37 @@ class ScrapingStatusConsumer(AsyncWebsocketConsumer):
 
     # Celeryタスクから呼び出されるメソッド
     async def scraping_update(self, event):
-        message = event['message']
         # WebSocket経由でクライアントにメッセージを送信
         await self.send(text_data=json.dumps({
-            'message': message
-        }))
\ No newline at end of file
+            'type': 'status',
+            'message': event['message'],
+            'platform': event.get('platform'),
+            'state': event.get('state'),
+            'updated_at': event.get('updated_at'),
+        }))
+
+    # 全プラットフォームの完了後に、全体の結果を受け取るメソッド
+    async def scraping_summary(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'summary',
+            'outcome': event.get('outcome'),
+            'platforms': event.get('platforms', {}),
+            'finished_at': event.get('finished_at'),
+        }))
+
+    # スクレイピング後に課題の差分を受け取るメソッド
+    async def assignments_delta(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'assignments.delta',
+            'platform': event.get('platform'),
+            'created': event.get('created', []),
+            'updated': event.get('updated', []),
+            'removed': event.get('removed', []),
+        }))
+
+    # 締切が近い課題のリマインダーを受け取るメソッド
+    async def assignments_reminder(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'assignments.reminder',
+            'reminders': event.get('reminders', []),
+        }))
@@ -0,0 +1,47 @@
+"""
+WebClassのクロールの進捗をコース単位で保存するチェックポイント。
+
+WebClassはクロールの途中で強制的にログアウトされることがあり、その場合はタスクを再試行する。
+取得済みのコースをRedisに記録しておき、再試行では残りのコースだけを取得する。
+"""
+import logging
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlCheckpoint:
+    """
+    ユーザーごとに取得済みのコースのURLを保存する。
+    読み書きに失敗してもクロールは止めず、全コースを取得し直す。
+    """
+
+    def __init__(self, platform, user_pk, ttl):
+        self.key = f'{platform}:checkpoint:{user_pk}'
+        # 有効期限(秒)。再試行が続く間だけ保持できればよい
+        self.ttl = ttl
+        self.done = set()
+
+    def load(self):
+        """取得済みのコースのURLを読み込んで返す"""
+        try:
+            self.done = set(cache.get(self.key) or ())
+        except Exception as e:
+            logger.warning(f"チェックポイントの取得に失敗しました ({self.key}): {e}")
+            self.done = set()
+        return self.done
+
+    def mark_done(self, course_url):
+        self.done.add(course_url)
+        try:
+            cache.set(self.key, sorted(self.done), self.ttl)
+        except Exception as e:
+            logger.warning(f"チェックポイントの保存に失敗しました ({self.key}): {e}")
+
+    def clear(self):
+        self.done = set()
+        try:
+            cache.delete(self.key)
+        except Exception as e:
+            logger.warning(f"チェックポイントの削除に失敗しました ({self.key}): {e}")
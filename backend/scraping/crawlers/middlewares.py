@@ -3,11 +3,20 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import asyncio
+import heapq
+import time
+from collections import defaultdict
+
+import scrapy
 from scrapy import signals
+from scrapy.utils.defer import maybe_deferred_to_future
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
 
+from backend.metrics import percentile
+
 
 class CrawlersSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -53,48 +62,240 @@ class CrawlersSpiderMiddleware:
         spider.logger.info("Spider opened: %s" % spider.name)
 
 
-class CrawlersDownloaderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
+def classify_page(request):
+    """
+    リクエストをページ種別 (login, home, course, tab, assign, quiz, dashboard) に分類する。
+    Spiderが meta['page_type'] を指定していればそれを優先する。
+    """
+    page_type = request.meta.get('page_type')
+    if page_type:
+        return page_type
+    url = request.url
+    if '/login' in url:
+        return 'login'
+    if '/mod/assign/' in url:
+        return 'assign'
+    if '/mod/quiz/' in url:
+        return 'quiz'
+    if 'dashboard' in url:
+        return 'dashboard'
+    if '/course/view.php' in url:
+        return 'tab' if 'section=' in url else 'course'
+    return 'other'
+
+
+class CrawlTracer:
+    """
+    1回のクロール中のリクエストごとの待ち時間・ダウンロード時間・コールバック時間を集計する。
+    ダウンローダーミドルウェアとスパイダーミドルウェアの両方から共有される。
+    """
+    SLOWEST_PAGES = 5
+
+    def __init__(self, crawler):
+        self.stats = crawler.stats
+        self.samples = defaultdict(lambda: defaultdict(list))
+        self.page_totals = {}
+        crawler.signals.connect(self.request_scheduled, signal=signals.request_scheduled)
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+
+    @classmethod
+    def for_crawler(cls, crawler):
+        tracer = getattr(crawler, 'crawl_tracer', None)
+        if tracer is None:
+            tracer = cls(crawler)
+            crawler.crawl_tracer = tracer
+        return tracer
+
+    def record(self, request, phase, seconds):
+        page_type = classify_page(request)
+        self.samples[page_type][phase].append(seconds)
+        self.stats.inc_value(f'trace/{page_type}/{phase}_time_total', seconds)
+        if phase == 'download':
+            self.stats.inc_value(f'trace/{page_type}/count')
+        key = (page_type, request.url)
+        self.page_totals[key] = self.page_totals.get(key, 0) + seconds
+
+    def request_scheduled(self, request, spider):
+        request.meta['trace_scheduled_at'] = time.monotonic()
+
+    def spider_closed(self, spider, reason):
+        for page_type, phases in sorted(self.samples.items()):
+            parts = []
+            for phase in ('queue', 'download', 'callback'):
+                values = phases.get(phase)
+                if not values:
+                    continue
+                p50, p95 = percentile(values, 50), percentile(values, 95)
+                self.stats.set_value(f'trace/{page_type}/{phase}_p50', p50)
+                self.stats.set_value(f'trace/{page_type}/{phase}_p95', p95)
+                parts.append(f"{phase} p50={p50:.3f}s p95={p95:.3f}s")
+            spider.logger.info(f"[trace] {page_type} ({len(phases.get('download', []))}件): " + ", ".join(parts))
+
+        slowest = heapq.nlargest(self.SLOWEST_PAGES, self.page_totals.items(), key=lambda kv: kv[1])
+        self.stats.set_value('trace/slowest_pages', [
+            {'page_type': page_type, 'url': url, 'seconds': round(seconds, 3)}
+            for (page_type, url), seconds in slowest
+        ])
+        for (page_type, url), seconds in slowest:
+            spider.logger.info(f"[trace] slowest {page_type} {seconds:.3f}s {url}")
+
+
+class TracingDownloaderMiddleware:
+    """
+    リクエストごとのキュー待ち時間とダウンロード時間をページ種別ごとに記録する。
+    ダウンロード時間はScrapyが計測する download_latency を使い、
+    スケジューラー登録からレスポンス到着までの残り (スロット待ちを含む) をキュー待ち時間とする。
+    """
+
+    def __init__(self, tracer):
+        self.tracer = tracer
 
     @classmethod
     def from_crawler(cls, crawler):
-        # This method is used by Scrapy to create your spiders.
-        s = cls()
-        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
-        return s
+        return cls(CrawlTracer.for_crawler(crawler))
 
     def process_request(self, request, spider):
-        # Called for each request that goes through the downloader
-        # middleware.
-
-        # Must either:
-        # - return None: continue processing this request
-        # - or return a Response object
-        # - or return a Request object
-        # - or raise IgnoreRequest: process_exception() methods of
-        #   installed downloader middleware will be called
+        request.meta.setdefault('trace_scheduled_at', time.monotonic())
         return None
 
     def process_response(self, request, response, spider):
-        # Called with the response returned from the downloader.
-
-        # Must either;
-        # - return a Response object
-        # - return a Request object
-        # - or raise IgnoreRequest
+        self._record(request)
         return response
 
     def process_exception(self, request, exception, spider):
-        # Called when a download handler or a process_request()
-        # (from other downloader middleware) raises an exception.
+        self._record(request)
+        return None
 
-        # Must either:
-        # - return None: continue processing this exception
-        # - return a Response object: stops process_exception() chain
-        # - return a Request object: stops process_exception() chain
-        pass
+    def _record(self, request):
+        scheduled_at = request.meta.pop('trace_scheduled_at', None)
+        if scheduled_at is None:
+            return
+        elapsed = time.monotonic() - scheduled_at
+        download = min(request.meta.get('download_latency', elapsed), elapsed)
+        self.tracer.record(request, 'queue', elapsed - download)
+        self.tracer.record(request, 'download', download)
 
-    def spider_opened(self, spider):
-        spider.logger.info("Spider opened: %s" % spider.name)
+
+class TracingSpiderMiddleware:
+    """
+    レスポンスを処理するコールバックの実行時間をページ種別ごとに記録する。
+    ジェネレーターのコールバックは出力を消費し終えるまでを実行時間とする。
+    """
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(CrawlTracer.for_crawler(crawler))
+
+    def process_spider_output(self, response, result, spider):
+        started = time.monotonic()
+        try:
+            for item_or_request in result:
+                yield item_or_request
+        finally:
+            self.tracer.record(response.request, 'callback', time.monotonic() - started)
+
+    async def process_spider_output_async(self, response, result, spider):
+        started = time.monotonic()
+        try:
+            async for item_or_request in result:
+                yield item_or_request
+        finally:
+            self.tracer.record(response.request, 'callback', time.monotonic() - started)
+
+
+class ReloginMiddleware:
+    """
+    セッションが切れたレスポンスを検知し、クロールを止めずに再ログインして元のリクエストをやり直す。
+
+    Spiderが is_logged_out(response) と login(page) を持つ場合のみ動作する (WebClass)。
+    再ログインの間はスケジューラーからの取り出しを止め、同じブラウザのコンテキストで1回だけログインし直す。
+    再ログイン前に送信されたリクエストは、ログインし直さずにそのままやり直す。
+    上限 (WEBCLASS_MAX_RELOGINS) を超えた場合はレスポンスをそのまま渡し、Spider側でクロールを中断させる。
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.max_relogins = crawler.settings.getint('WEBCLASS_MAX_RELOGINS', 2)
+        self.relogins = 0
+        # ログインし直すたびに進める。リクエストが送信時点のどのセッションに属するかの判定に使う
+        self.generation = 0
+        self._relogin = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_request(self, request, spider):
+        if hasattr(spider, 'is_logged_out'):
+            request.meta.setdefault('session_generation', self.generation)
+        return None
+
+    async def process_response(self, request, response, spider):
+        if not hasattr(spider, 'is_logged_out') or request.meta.get('relogin'):
+            return response
+        if not spider.is_logged_out(response):
+            return response
+
+        # 既に別のリクエストで再ログイン済みなら、ログインし直さずにやり直す
+        if request.meta.get('session_generation', self.generation) == self.generation:
+            if not await self._ensure_relogin(spider):
+                return response
+
+        # ダウンローダーミドルウェアの時点では response.meta を使えないため request.meta から取得する
+        page = request.meta.get('playwright_page')
+        if page is not None and not page.is_closed():
+            await page.close()
+        self.stats.inc_value('relogin/replayed_requests')
+        # 閉じたページを使い回さないよう playwright_page を除き、新しいセッションで送信し直す
+        meta = {k: v for k, v in request.meta.items() if k not in ('playwright_page', 'session_generation')}
+        headers = request.headers.copy()
+        headers.pop('Cookie', None)
+        return request.replace(meta=meta, headers=headers, dont_filter=True)
+
+    async def _ensure_relogin(self, spider):
+        """再ログインを1回だけ実行し、同時に検知した他のリクエストはその完了を待つ"""
+        if self._relogin is None:
+            if self.relogins >= self.max_relogins:
+                self.stats.inc_value('relogin/limit_reached')
+                return False
+            self._relogin = asyncio.ensure_future(self._relogin_once(spider))
+        relogin = self._relogin
+        try:
+            return await relogin
+        finally:
+            if self._relogin is relogin:
+                self._relogin = None
+
+    async def _relogin_once(self, spider):
+        self.relogins += 1
+        engine = self.crawler.engine
+        engine.pause()
+        spider.logger.warning(f"Session expired. Logging in again ({self.relogins}/{self.max_relogins})...")
+        try:
+            request = scrapy.Request(
+                spider.login_url,
+                meta={'playwright': True, 'playwright_include_page': True, 'page_type': 'login', 'relogin': True},
+                dont_filter=True,
+            )
+            await maybe_deferred_to_future(engine.download(request))
+            page = request.meta.get('playwright_page')
+            try:
+                await spider.login(page)
+            finally:
+                if page is not None:
+                    await page.close()
+        except Exception as e:
+            spider.logger.error(f"Re-login failed: {e}")
+            self.stats.inc_value('relogin/failed')
+            return False
+        finally:
+            engine.unpause()
+
+        self.generation += 1
+        self.stats.inc_value('relogin/count')
+        spider.logger.info("Re-login successful. Replaying requests.")
+        return True
@@ -1,15 +1,28 @@
+import time
+
 from itemadapter import ItemAdapter
+from scraping import archive
 from scraping.models import Assignment, Course
 from accounts.models import User
 
 class DjangoPipeline:
 
+    def open_spider(self, spider):
+        # アーカイブの対象となる古い課題は保存しない (アーカイブ済みの課題を作り直さないため)
+        self.archive_before = archive.cutoff()
+
     async def process_item(self, item, spider):
         """
         Spiderから渡されたItemを、一件ずつ非同期でDBに保存する。
         """
         adapter = ItemAdapter(item)
-        
+        due_date = adapter.get('due_date')
+        if due_date is not None and due_date < self.archive_before:
+            spider.crawler.stats.inc_value('pipeline/archived_skipped')
+            return item
+
+        started = time.monotonic()
+
         try:
             # Djangoの非同期ORMメソッドを使用してDB操作を行う
             user = await User.objects.aget(pk=adapter.get('user_pk'))
@@ -40,5 +53,8 @@ class DjangoPipeline:
             spider.logger.error(f"Pipeline Error: User with pk={adapter.get('user_pk')} not found.")
         except Exception as e:
             spider.logger.error(f"Pipeline Error for item '{adapter.get('title')}': {e}", exc_info=True)
-            
+        finally:
+            # DB保存にかかった時間 (ベンチマークや性能調査で使用)
+            spider.crawler.stats.inc_value('pipeline/db_time_seconds', time.monotonic() - started)
+
         return item
\ No newline at end of file
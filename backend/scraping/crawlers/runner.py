@@ -0,0 +1,126 @@
+"""
+Celeryワーカー内でクロールを繰り返し実行するためのランナー。
+
+Twistedのreactorは1プロセスで一度しか起動できないため、CrawlerProcess を使うと
+ワーカーの子プロセスを1タスクごとに作り直す (--max-tasks-per-child=1) 必要があった。
+ここではプロセスごとにreactorを専用スレッドで動かし続け、CrawlerRunner で
+クロールを登録して完了を待つことで、インポート済みの子プロセスを複数のタスクで使い回す。
+"""
+import logging
+import os
+import threading
+from concurrent.futures import Future
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from scrapy.crawler import CrawlerRunner
+from scrapy.utils.defer import deferred_from_coro
+from scrapy.utils.reactor import install_reactor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REACTOR = 'twisted.internet.asyncioreactor.AsyncioSelectorReactor'
+
+# タスクが中断された場合に、クロールを停止して保存済みの結果を確定させるまで待つ時間(秒)
+STOP_GRACE_SECONDS = 15
+
+
+class _ReactorThread:
+    """
+    プロセスごとにreactorを1つだけ専用スレッドで動かし、クロール間で使い回す。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._reactor = None
+
+    def _ensure_started(self, reactor_path):
+        # prefork でフォークされた子プロセスでは親のスレッドが存在しないため作り直す
+        pid = os.getpid()
+        if self._pid == pid:
+            return self._reactor
+        with self._lock:
+            if self._pid == pid:
+                return self._reactor
+            started = Future()
+
+            def run():
+                try:
+                    # asyncioのイベントループはこのスレッドで作成される
+                    install_reactor(reactor_path)
+                    from twisted.internet import reactor
+                except Exception as e:
+                    started.set_exception(e)
+                    return
+                reactor.callWhenRunning(started.set_result, reactor)
+                # シグナルはCeleryが処理するため、reactorには登録させない
+                reactor.run(installSignalHandlers=False)
+
+            threading.Thread(target=run, name='scrapy-reactor', daemon=True).start()
+            self._reactor = started.result(timeout=30)
+            self._pid = pid
+        return self._reactor
+
+    def crawl(self, settings, spider_cls, setup=None, **kwargs):
+        """
+        reactorスレッドでクロールを実行し、完了までブロックする。
+
+        Args:
+            settings: Scrapyの設定。
+            spider_cls: 実行するSpiderクラス。
+            setup: 作成したCrawlerを受け取り、シグナルの接続などを行う関数 (reactorスレッドで呼ばれる)。
+            **kwargs: Spiderに渡す引数。
+
+        Returns:
+            Crawler: 完了したクロールのCrawler (統計情報の取得用)。
+
+        タスクの時間制限 (SoftTimeLimitExceeded) などで待機が中断された場合は、
+        クロールを停止してパイプラインの処理が終わるのを待ってから例外を送出し直す。
+        """
+        reactor = self._ensure_started(settings.get('TWISTED_REACTOR') or DEFAULT_REACTOR)
+        done = Future()
+        crawlers = []
+
+        def start():
+            try:
+                runner = CrawlerRunner(settings)
+                crawler = runner.create_crawler(spider_cls)
+                crawlers.append(crawler)
+                if setup:
+                    setup(crawler)
+                d = runner.crawl(crawler, **kwargs)
+            except Exception as e:
+                done.set_exception(e)
+                return
+            # 非同期ORMが使ったDB接続はクロールごとに閉じ、次のタスクに持ち越さない
+            d.addBoth(lambda result: deferred_from_coro(_close_db_connections()).addBoth(lambda _: result))
+            d.addCallbacks(lambda _: done.set_result(crawler), lambda failure: done.set_exception(failure.value))
+
+        reactor.callFromThread(start)
+        try:
+            return done.result()
+        except BaseException:
+            if crawlers and not done.done():
+                logger.warning(f"{spider_cls.name} のクロールが中断されたため停止します。")
+                reactor.callFromThread(crawlers[0].stop)
+                try:
+                    done.result(timeout=STOP_GRACE_SECONDS)
+                except Exception:
+                    pass
+            raise
+
+
+async def _close_db_connections():
+    try:
+        await sync_to_async(close_old_connections)()
+    except Exception as e:
+        logger.warning(f"DB接続の解放に失敗しました: {e}")
+
+
+_reactor_thread = _ReactorThread()
+
+
+def run_crawl(settings, spider_cls, setup=None, **kwargs):
+    """プロセス内で動き続けるreactorでクロールを1回実行し、Crawlerを返す"""
+    return _reactor_thread.crawl(settings, spider_cls, setup=setup, **kwargs)
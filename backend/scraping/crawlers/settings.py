@@ -24,8 +24,25 @@ ROBOTSTXT_OBEY = True
 # Set settings whose default value is deprecated to a future-proof value
 FEED_EXPORT_ENCODING = "utf-8"
 
+# リクエストごとの待ち時間・ダウンロード時間・コールバック時間を計測する
+# ReloginMiddleware はセッションが切れた場合に再ログインしてやり直す (WebClassのみ)
+DOWNLOADER_MIDDLEWARES = {
+   "scraping.crawlers.middlewares.ReloginMiddleware": 900,
+   "scraping.crawlers.middlewares.TracingDownloaderMiddleware": 950,
+}
+
+SPIDER_MIDDLEWARES = {
+   "scraping.crawlers.middlewares.TracingSpiderMiddleware": 50,
+}
+
 ITEM_PIPELINES = {
    "scraping.crawlers.pipelines.DjangoPipeline": 300,
 }
 
-TELNETCONSOLE_ENABLED = False
\ No newline at end of file
+TELNETCONSOLE_ENABLED = False
+# Moodleで提出済みの課題ページの取得を省略する時間(秒)。この時間が過ぎると提出状況を確認し直す。0で毎回取得する
+MOODLE_SUBMITTED_RECHECK_SECONDS = int(os.getenv('MOODLE_SUBMITTED_RECHECK_SECONDS', 30 * 60))
+# WebClassのクロールの途中経過 (取得済みのコース) を保持する時間(秒)。ログアウト後の再試行で使用する
+WEBCLASS_CHECKPOINT_TTL = int(os.getenv('WEBCLASS_CHECKPOINT_TTL', 60 * 60))
+# WebClassでセッションが切れた際に、クロール中に再ログインする回数の上限 (超えるとタスクごと再試行する)
+WEBCLASS_MAX_RELOGINS = int(os.getenv('WEBCLASS_MAX_RELOGINS', 2))
@@ -1,11 +1,11 @@
 import re
-import logging
-from datetime import datetime
-from zoneinfo import ZoneInfo
-from typing import Tuple, Optional, Dict, Any
+from datetime import timedelta
 
 import scrapy
+from django.utils import timezone
+from scraping import date_parser
 from scraping.crawlers.items import AssignmentItem
+from scraping.models import Assignment
 
 class MoodleSpider(scrapy.Spider):
     """
@@ -14,69 +14,6 @@ class MoodleSpider(scrapy.Spider):
     """
     name = 'moodle'
 
-    _MONTH_MAP_EN: Dict[str, int] = {
-        'january': 1, 'february': 2, 'march': 3, 'april': 4, 'may': 5, 'june': 6,
-        'july': 7, 'august': 8, 'september': 9, 'october': 10, 'november': 11, 'december': 12
-    }
-    _DATE_CONFIG: Dict[str, Dict[str, Any]] = {
-        'en': { # English
-            'pattern': re.compile(
-                r'(?:\w+,\s+)?(\d{1,2})\s+(January|February|March|April|May|June|July|August|September|October|November|December)\s+(\d{4}),\s+(\d{1,2}):(\d{2})\s+(AM|PM)',
-                re.IGNORECASE
-            ),
-            'group_order': ['day', 'month_str', 'year', 'hour', 'minute', 'ampm'],
-            'month_map': _MONTH_MAP_EN,
-            'start_keywords': ['Open'],
-            'end_keywords': ['Due', 'Close']
-        },
-        'en_us': { # English(United States)
-            'pattern': re.compile(
-                r'(?:\w+,\s+)?(January|February|March|April|May|June|July|August|September|October|November|December)\s+(\d{1,2}),\s+(\d{4}),\s+(\d{1,2}):(\d{2})\s+(AM|PM)',
-                re.IGNORECASE
-            ),
-            'group_order': ['month_str', 'day', 'year', 'hour', 'minute', 'ampm'],
-            'month_map': _MONTH_MAP_EN,
-            'start_keywords': ['Open'],
-            'end_keywords': ['Due', 'Close']
-        },
-        'vi': { # Vietnamese
-            'pattern': re.compile(
-                r'Thứ\s+\w+,\s*(\d{1,2})\s+tháng\s+(\d{1,2})\s+(\d{4}),\s*(\d{1,2}):(\d{2})\s*(AM|PM)',
-                re.IGNORECASE
-            ),
-            'group_order': ['day', 'month', 'year', 'hour', 'minute', 'ampm'],
-            'start_keywords': ['Open'],
-            'end_keywords': ['Due', 'Close']
-        },
-        'zh_tw': { # 正體中文
-            'pattern': re.compile(r'(\d{4})年\s*(\d{1,2})月\s*(\d{1,2})日.*?(\d{1,2}):(\d{2})'),
-            'group_order': ['year', 'month', 'day', 'hour', 'minute'],
-            'start_keywords': ['開始', '開啟'],
-            'end_keywords': ['到期', '關閉', '結束']
-        },
-        'ja': { # 日本語
-            'pattern': re.compile(r'(\d{4})年\s*(\d{1,2})月\s*(\d{1,2})日.*?(\d{1,2}):(\d{2})'),
-            'group_order': ['year', 'month', 'day', 'hour', 'minute'],
-            'start_keywords': ['開始'],
-            'end_keywords': ['期限', '終了']
-        },
-        'zh_cn': { # 简体中文
-            'pattern': re.compile(r'(\d{4})年\s*(\d{1,2})月\s*(\d{1,2})日.*?(\d{1,2}):(\d{2})'),
-            'group_order': ['year', 'month', 'day', 'hour', 'minute'],
-            'start_keywords': ['打开', '已打开'],
-            'end_keywords': ['到期日', '关闭', '已关闭']
-        },
-        'ko': { # 한국어
-            'pattern': re.compile(
-                r'(?:\w+,\s+)?(\d{1,2})\s+(\d{1,2})월\s+(\d{4}),\s+(\d{1,2}):(\d{2})\s+(AM|PM)',
-                re.IGNORECASE
-            ),
-            'group_order': ['day', 'month', 'year', 'hour', 'minute', 'ampm'],
-            'start_keywords': ['Opened','열기', '열림'],
-            'end_keywords': ['Due','닫기', '닫힘']
-        }
-    }
-
     def __init__(self, user_pk, password, login_url, *args, **kwargs):
         """
         Spider実行時に引数を受け取るコンストラクタ。
@@ -88,16 +25,32 @@ class MoodleSpider(scrapy.Spider):
         self.password = password
         self.login_url = login_url
         self.home_url = None
-        self.lang_code = 'ja'
+        # 本人の課題のうち、最近のクロールで提出済みだったもののURL (課題ページの取得を省略する)
+        self.submitted_urls = set()
+        self.seen_modules = set()
+        # ユーザーメニューから特定できない場合はNoneとし、課題ページの本文から推定する
+        self.lang_code = None
     
     async def start(self):
         """
         クロールの起点となるメソッド。
         まずログインページにアクセスし、コールバックとして `parse_login_token` を指定。
         """
+        recheck_seconds = self.settings.getint('MOODLE_SUBMITTED_RECHECK_SECONDS', 0)
+        if recheck_seconds > 0:
+            # 提出の取り消しや期限の変更を反映するため、一定時間が過ぎた課題は取得し直す
+            # (保存のたびに updated_at が更新されるため、省略が続くのはこの時間内に限られる)
+            self.submitted_urls = {
+                url async for url in Assignment.objects.filter(
+                    user_id=self.user_pk, platform=self.name, is_submitted=True,
+                    updated_at__gte=timezone.now() - timedelta(seconds=recheck_seconds),
+                ).values_list('url', flat=True)
+            }
+
         yield scrapy.Request(
             url=self.login_url,
             callback=self.parse_login_token,
+            meta={'page_type': 'login'},
         )
 
     def parse_login_token(self, response):
@@ -117,7 +70,8 @@ class MoodleSpider(scrapy.Spider):
                 'password': self.password,
                 'logintoken': logintoken,
             },
-            callback=self.parse_home
+            callback=self.parse_home,
+            meta={'page_type': 'home'},
         )
     
     def parse_home(self, response):
@@ -139,6 +93,7 @@ class MoodleSpider(scrapy.Spider):
         course_links = response.css('section[data-block="course_list"] ul.unlist a')
         self.logger.info(f"{len(course_links)} 件のコース要素が見つかりました。")
 
+        # コースページは閲覧できる課題がユーザーごとに異なり得るため、共有せず本人の権限で取得する
         for link in course_links:
             course_name = link.css('::text').get('').strip()
             course_url = response.urljoin(link.css('::attr(href)').get())
@@ -147,6 +102,7 @@ class MoodleSpider(scrapy.Spider):
                     url=course_url,
                     callback=self.parse_course,
                     cb_kwargs={'course_name': course_name},
+                    meta={'page_type': 'course'},
                 )
 
     def parse_course(self, response, course_name):
@@ -160,20 +116,41 @@ class MoodleSpider(scrapy.Spider):
             self.logger.info(f"授業「{course_name}」を処理中")
 
         # 課題(assign)と小テスト(quiz)のリンクを抽出
-        for link in response.css("li.modtype_assign a.aalink, li.modtype_quiz a.aalink"):
-            yield response.follow(
-                link,
-                callback=self.parse_assignment_details,
-                cb_kwargs={'course_name': course_name},
-            )
-        
+        module_urls = [
+            response.urljoin(href)
+            for href in response.css("li.modtype_assign a.aalink::attr(href), li.modtype_quiz a.aalink::attr(href)").getall()
+        ]
+        yield from self._follow_modules(module_urls, course_name)
+
         # タブ形式のページの場合、各タブのリンクもたどる
-        # response.followは重複するURLへのリクエストを自動的にフィルタリングしてくれる
-        for link in response.css("div.tabs-wrapper a.nav-link"):
-            yield response.follow(
-                link,
+        # 重複するURLへのリクエストはScrapyが自動的にフィルタリングしてくれる
+        for href in response.css("div.tabs-wrapper a.nav-link::attr(href)").getall():
+            yield scrapy.Request(
+                response.urljoin(href),
                 callback=self.parse_course,
                 cb_kwargs={'course_name': course_name},
+                meta={'page_type': 'tab'},
+            )
+
+    def _follow_modules(self, module_urls, course_name):
+        """
+        課題ページへのリクエストを生成する。
+        最近のクロールで提出済みだった課題は取得せず、本人の保存済みの行をそのまま残す。
+        日時や提出状況はユーザーごとに異なるため、他のユーザーのクロール結果は使わない。
+        """
+        for url in module_urls:
+            if url in self.seen_modules:
+                continue
+            self.seen_modules.add(url)
+
+            if url in self.submitted_urls:
+                self.crawler.stats.inc_value('submitted/skipped_modules')
+                continue
+
+            yield scrapy.Request(
+                url,
+                callback=self.parse_assignment_details,
+                cb_kwargs={'course_name': course_name},
             )
 
     def parse_assignment_details(self, response, course_name):
@@ -188,11 +165,7 @@ class MoodleSpider(scrapy.Spider):
         item['url'] = response.url
         
         # 課題詳細
-        content_html = response.css("div.activity-description").get()
-        if content_html:
-            item['content'] = "".join(scrapy.Selector(text=content_html).css('::text').getall()).strip()
-        else:
-            item['content'] = ""
+        item['content'] = "".join(response.css("div.activity-description ::text").getall()).strip()
 
         # 提出状況
         if 'assign' in response.url:
@@ -202,9 +175,14 @@ class MoodleSpider(scrapy.Spider):
         else:
             item['is_submitted'] = False
 
-        # 日付情報
-        date_text = response.css("div.activity-dates").get()
-        start_date, due_date = self._parse_start_end_datetimes(date_text, self.lang_code)
+        # 日付情報 (HTML断片を再解析せず、取得済みの要素のテキストノードから直接読む)
+        date_el = response.css("div.activity-dates")
+        if date_el:
+            start_date, due_date = date_parser.parse_start_end_datetimes(
+                date_parser.element_lines(date_el[0].root), self.lang_code
+            )
+        else:
+            start_date, due_date = None, None
         item['start_date'] = start_date
         item['due_date'] = due_date
 
@@ -216,46 +194,8 @@ class MoodleSpider(scrapy.Spider):
         lang_text = response.css("div.container-fluid a.dropdown-toggle.nav-link::text").get('')
         matches = re.findall(r'\(([a-zA-Z\-_]+)\)', lang_text)
         if matches:
-            self.lang_code = matches[-1]
+            self.lang_code = date_parser.normalize_lang_code(matches[-1])
             self.logger.info(f"特定された言語コードは {self.lang_code} です。")
         else:
-            self.lang_code = 'ja'
-            self.logger.warning("言語コードが見つかりませんでした。デフォルトの 'ja' を適用します。")
-
-    def _parse_start_end_datetimes(self, text: str, lang_code: Optional[str], tz_str: str = "Asia/Tokyo") -> Tuple[Optional[datetime], Optional[datetime]]:
-        """日付情報を含むHTMLテキストを解析し、開始・終了日時を返す"""
-        if not text:
-            return None, None
-            
-        start_dt, end_dt = None, None
-        config = self._DATE_CONFIG.get(lang_code, self._DATE_CONFIG['ja'])
-        pattern = config['pattern']
-        tz = ZoneInfo(tz_str)
-
-        clean_text = "".join(scrapy.Selector(text=text).css('::text').getall())
-        for line in clean_text.splitlines():
-            match = pattern.search(line)
-            if not match:
-                continue
-            try:
-                # 日付と時刻の解析ロジック（従来通り）
-                parts = dict(zip(config['group_order'], match.groups()))
-                time_parts: Dict[str, int] = {k: int(v) for k, v in parts.items() if v and k in ['year', 'month', 'day', 'hour', 'minute']}
-                if 'month_str' in parts and 'month_map' in config and parts['month_str']:
-                    time_parts['month'] = self._MONTH_MAP_EN[parts['month_str'].lower()]
-                if 'ampm' in parts and parts['ampm']:
-                    hour = time_parts.get('hour', 0)
-                    if parts['ampm'].lower() == 'pm' and hour != 12: hour += 12
-                    elif parts['ampm'].lower() == 'am' and hour == 12: hour = 0
-                    time_parts['hour'] = hour
-                naive_dt = datetime(**time_parts)
-                aware_dt = naive_dt.replace(tzinfo=tz)
-
-                if any(keyword in line for keyword in config['start_keywords']):
-                    start_dt = aware_dt
-                elif any(keyword in line for keyword in config['end_keywords']):
-                    end_dt = aware_dt
-            except (ValueError, KeyError, TypeError) as e:
-                self.logger.warning(f"日付の解析に失敗しました: {line.strip()}, lang: {lang_code}, error: {e}")
-                continue
-        return start_dt, end_dt
\ No newline at end of file
+            self.lang_code = None
+            self.logger.warning("言語コードが見つかりませんでした。課題ページの本文から推定します。")
@@ -4,9 +4,11 @@ from datetime import datetime
 from zoneinfo import ZoneInfo
 
 import scrapy
+from scrapy.exceptions import CloseSpider
 from scrapy.http import Response
 from playwright.async_api import Page
 
+from scraping.crawlers.checkpoint import CrawlCheckpoint
 from scraping.crawlers.items import AssignmentItem
 
 
@@ -15,11 +17,17 @@ class LogoutException(Exception):
     pass
 
 
+# ログアウトを検知してクロールを中断した場合の終了理由
+LOGOUT_CLOSE_REASON = 'logout'
+
+
 class WebclassSpider(scrapy.Spider):
     """
     WebClassから課題情報をスクレイピングするSpider。
     強制的にログアウトされる場合があり、処理が不安定。
-    ログアウトした場合はLogoutExceptionを送出し、やり直しを求める。
+    セッションが切れた場合は ReloginMiddleware がクロール中に再ログインしてリクエストをやり直す。
+    再ログインの上限を超えた場合はクロールを中断し、やり直しを求める。
+    取得済みのコースはチェックポイントに記録し、やり直し (resume=True) では残りのコースだけを取得する。
     """
     name = "webclass"
     
@@ -45,7 +53,7 @@ class WebclassSpider(scrapy.Spider):
         'LOG_LEVEL': 'INFO',
     }
 
-    def __init__(self, user_pk=None, password=None, login_url=None, *args, **kwargs):
+    def __init__(self, user_pk=None, password=None, login_url=None, resume=False, *args, **kwargs):
         super().__init__(*args, **kwargs)
         if not all([user_pk, password, login_url]):
             raise ValueError("user_pk, password, and login_url must be provided")
@@ -54,22 +62,56 @@ class WebclassSpider(scrapy.Spider):
         self.username = str(user_pk)
         self.password = password
         self.login_url = login_url
+        self.resume = resume
         self.log(f"{self.name} spider initialized for user_pk: {self.user_pk}", level=logging.INFO)
 
     async def start(self):
         """
         スパイダーの開始点。ログインページにアクセスする。
         """
+        self.checkpoint = CrawlCheckpoint(self.name, self.user_pk, self.settings.getint('WEBCLASS_CHECKPOINT_TTL', 60 * 60))
+        if self.resume:
+            done = self.checkpoint.load()
+            self.log(f"Resuming crawl: {len(done)} courses already scraped.", level=logging.INFO)
+        else:
+            # 新しいクロールでは前回の途中経過を使わない
+            self.checkpoint.clear()
+
         yield scrapy.Request(
             self.login_url,
             meta={
                 "playwright": True,
                 "playwright_include_page": True,
+                "page_type": "login",
             },
             callback=self.login_and_parse_home,
             errback=self.errback_general,
         )
 
+    async def login(self, page: Page):
+        """
+        ログインページでログインする。ReloginMiddleware がセッション切れの際の再ログインにも使用する。
+        """
+        self.log("Attempting to log in...", level=logging.INFO)
+        await page.fill("#username", self.username)
+        await page.fill("#password", self.password)
+        await page.click("#LoginBtn")
+        await page.wait_for_selector("a[href*='logout']", timeout=20000)
+        self.log("Login successful.", level=logging.INFO)
+
+    def is_logged_out(self, response: Response) -> bool:
+        """
+        ログアウトされた (セッションが切れた) ページかどうか。ReloginMiddleware が使用する。
+        """
+        if response.status == 401:
+            return True
+        if not hasattr(response, 'css'):
+            return False
+        return bool(
+            response.css("p.logout-screen-bottom-message")
+            or response.xpath("//div[contains(@class, 'alert')][contains(., '別のコースへのアクセス')]")
+        )
+
     async def login_and_parse_home(self, response: Response):
         """
         ログイン処理からホームページのパースをする。
@@ -78,12 +120,7 @@ class WebclassSpider(scrapy.Spider):
         
         try:
             # --- ログイン処理 ---
-            self.log("Attempting to log in...", level=logging.INFO)
-            await page.fill("#username", self.username)
-            await page.fill("#password", self.password)
-            await page.click("#LoginBtn")
-            await page.wait_for_selector("a[href*='logout']", timeout=20000)
-            self.log("Login successful.", level=logging.INFO)
+            await self.login(page)
 
             # await page.pause()
 
@@ -121,6 +158,7 @@ class WebclassSpider(scrapy.Spider):
                 meta={
                     "playwright": True,
                     "playwright_include_page": True,
+                    "page_type": "dashboard",
                 },
                 callback=self.parse_dashboard_frame,
                 errback=self.errback_general,
@@ -166,6 +204,11 @@ class WebclassSpider(scrapy.Spider):
                     "assignments": []
                 }
 
+                if course_data["url"] in self.checkpoint.done:
+                    # 前回の試行で取得済みのコース
+                    self.crawler.stats.inc_value('checkpoint/skipped_courses')
+                    continue
+
                 # 課題概要テーブルを検索・解析
                 course_locator = course_link_locator.locator('../..')
                 table_locator = course_locator.locator("table")
@@ -190,6 +233,7 @@ class WebclassSpider(scrapy.Spider):
                     meta={
                         "playwright": True,
                         "playwright_include_page": True,
+                        "page_type": "course",
                     },
                     callback=self.parse_course_page,
                     errback=self.errback_general,
@@ -270,10 +314,14 @@ class WebclassSpider(scrapy.Spider):
                 # 課題の保存
                 self.log(f"Created item: {item['title']} for course {item['course_name']}", level=logging.INFO)
                 yield item
+
+            # コース内の課題をすべて渡し終えたら取得済みとして記録する
+            self.checkpoint.mark_done(course_data["url"])
         
         except LogoutException as e:
             self.log(f"Error parsing course page '{course_data['name']}': {e}", level=logging.ERROR)
-            raise
+            # 例外を送出するだけではSpiderが続行するため、終了理由を付けてクロールを中断する
+            raise CloseSpider(LOGOUT_CLOSE_REASON) from e
         except Exception as e:
             self.log(f"Error parsing course page '{course_data['name']}': {e}", level=logging.WARNING)
         finally:
@@ -297,6 +345,11 @@ class WebclassSpider(scrapy.Spider):
         except ValueError:
             return None, None
 
+    def closed(self, reason):
+        # 最後まで取得できた場合は、次回のクロールに途中経過を持ち越さない
+        if reason == 'finished' and hasattr(self, 'checkpoint'):
+            self.checkpoint.clear()
+
     async def errback_general(self, failure):
         """
         エラー発生時にPlaywrightのページを閉じる汎用エラーバック。
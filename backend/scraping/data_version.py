@@ -0,0 +1,50 @@
+"""
+ユーザーごとの課題データの版数。
+
+課題が変更されるたび (スクレイピング・APIでの変更) に増やし、クライアントは手元のデータが
+最新かどうかを版数で判断する。Redisのデータが失われても版数が戻らないよう、初期値は現在時刻(ミリ秒)とする。
+"""
+import logging
+import time
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+def version_key(user_pk):
+    return f'scraping:data_version:{user_pk}'
+
+
+def get(user_pk):
+    """現在の版数を返す (まだ変更がない、または取得に失敗した場合はNone)"""
+    try:
+        return cache.get(version_key(user_pk))
+    except Exception as e:
+        logger.warning(f"データの版数の取得に失敗しました (user_pk={user_pk}): {e}")
+        return None
+
+
+async def aget(user_pk):
+    try:
+        return await cache.aget(version_key(user_pk))
+    except Exception as e:
+        logger.warning(f"データの版数の取得に失敗しました (user_pk={user_pk}): {e}")
+        return None
+
+
+def bump(user_pk):
+    """版数を1つ増やして新しい版数を返す (失敗した場合はNone)"""
+    key = version_key(user_pk)
+    try:
+        try:
+            return cache.incr(key)
+        except ValueError:
+            initial = int(time.time() * 1000)
+            if cache.add(key, initial, timeout=None):
+                return initial
+            # 同時に初期化された場合は、そちらの値から増やす
+            return cache.incr(key)
+    except Exception as e:
+        logger.warning(f"データの版数の更新に失敗しました (user_pk={user_pk}): {e}")
+        return None
@@ -0,0 +1,236 @@
+"""
+Moodleの課題ページ (div.activity-dates) の開始・終了日時を解析するモジュール。
+
+MoodleScraper と MoodleSpider で共有する。正規表現とタイムゾーンはプロセス内で使い回し、
+言語コードが不明な場合は本文のキーワードと日付形式から言語を推定する。
+"""
+import logging
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEZONE = 'Asia/Tokyo'
+
+# 英語の月名を数値に変換するためのマッピング
+_MONTH_MAP_EN: Dict[str, int] = {
+    'january': 1, 'february': 2, 'march': 3, 'april': 4, 'may': 5, 'june': 6,
+    'july': 7, 'august': 8, 'september': 9, 'october': 10, 'november': 11, 'december': 12
+}
+
+# 言語ごとの設定
+# group_orderで正規表現のキャプチャグループの順序を指定することで、様々な日付形式に対応
+# 言語の推定で同点になった場合は、この定義順で先の言語を優先する
+DATE_CONFIG: Dict[str, Dict[str, Any]] = {
+    'ja': { # 日本語
+        'pattern': re.compile(r'(\d{4})年\s*(\d{1,2})月\s*(\d{1,2})日.*?(\d{1,2}):(\d{2})'),
+        'group_order': ['year', 'month', 'day', 'hour', 'minute'],
+        'start_keywords': ['開始'],
+        'end_keywords': ['期限', '終了']
+    },
+    'en': { # English
+        'pattern': re.compile(
+            r'(?:\w+,\s+)?(\d{1,2})\s+(January|February|March|April|May|June|July|August|September|October|November|December)\s+(\d{4}),\s+(\d{1,2}):(\d{2})\s+(AM|PM)',
+            re.IGNORECASE
+        ),
+        'group_order': ['day', 'month_str', 'year', 'hour', 'minute', 'ampm'],
+        'month_map': _MONTH_MAP_EN,
+        'start_keywords': ['Open'],
+        'end_keywords': ['Due', 'Close']
+    },
+    'en_us': { # English(United States)
+        'pattern': re.compile(
+            r'(?:\w+,\s+)?(January|February|March|April|May|June|July|August|September|October|November|December)\s+(\d{1,2}),\s+(\d{4}),\s+(\d{1,2}):(\d{2})\s+(AM|PM)',
+            re.IGNORECASE
+        ),
+        'group_order': ['month_str', 'day', 'year', 'hour', 'minute', 'ampm'],
+        'month_map': _MONTH_MAP_EN,
+        'start_keywords': ['Open'],
+        'end_keywords': ['Due', 'Close']
+    },
+    'vi': { # Vietnamese
+        'pattern': re.compile(
+            r'Thứ\s+\w+,\s*(\d{1,2})\s+tháng\s+(\d{1,2})\s+(\d{4}),\s*(\d{1,2}):(\d{2})\s*(AM|PM)',
+            re.IGNORECASE
+        ),
+        'group_order': ['day', 'month', 'year', 'hour', 'minute', 'ampm'],
+        'start_keywords': ['Open'],
+        'end_keywords': ['Due', 'Close']
+    },
+    'zh_tw': { # 正體中文
+        'pattern': re.compile(r'(\d{4})年\s*(\d{1,2})月\s*(\d{1,2})日.*?(\d{1,2}):(\d{2})'),
+        'group_order': ['year', 'month', 'day', 'hour', 'minute'],
+        'start_keywords': ['開始', '開啟'],
+        'end_keywords': ['到期', '關閉', '結束']
+    },
+    'zh_cn': { # 简体中文
+        'pattern': re.compile(r'(\d{4})年\s*(\d{1,2})月\s*(\d{1,2})日.*?(\d{1,2}):(\d{2})'),
+        'group_order': ['year', 'month', 'day', 'hour', 'minute'],
+        'start_keywords': ['打开', '已打开'],
+        'end_keywords': ['到期日', '关闭', '已关闭']
+    },
+    'ko': { # 한국어
+        'pattern': re.compile(
+            r'(?:\w+,\s+)?(\d{1,2})\s+(\d{1,2})월\s+(\d{4}),\s+(\d{1,2}):(\d{2})\s+(AM|PM)',
+            re.IGNORECASE
+        ),
+        'group_order': ['day', 'month', 'year', 'hour', 'minute', 'ampm'],
+        'start_keywords': ['Opened','열기', '열림'],
+        'end_keywords': ['Due','닫기', '닫힘']
+    }
+}
+
+_INT_FIELDS = ('year', 'month', 'day', 'hour', 'minute')
+
+# 言語コードの表記揺れ (例: "zh-TW") を吸収するための正規化
+_LANG_SEPARATOR = re.compile(r'[-\s]+')
+
+
+@lru_cache(maxsize=None)
+def get_timezone(tz_str: str) -> ZoneInfo:
+    """タイムゾーンを返す。ZoneInfoの生成は重いため名前ごとにキャッシュする。"""
+    try:
+        return ZoneInfo(tz_str)
+    except Exception:
+        logger.warning(f"タイムゾーン {tz_str} が見つかりませんでした。UTCを使用します。")
+        return ZoneInfo('UTC')
+
+
+def normalize_lang_code(lang_code: Optional[str]) -> Optional[str]:
+    """言語コードを DATE_CONFIG のキーの形式 (小文字・アンダースコア区切り) にそろえる"""
+    if not lang_code:
+        return None
+    return _LANG_SEPARATOR.sub('_', lang_code.strip()).lower()
+
+
+def element_lines(element: Any) -> List[str]:
+    """
+    日付要素のテキストを子要素ごとに1行として返す。
+
+    Moodleは「<strong>開始:</strong> 2025年4月1日 0:00」のように見出しと日付を別のテキストノードに
+    出力するため、子要素単位で連結してからキーワードと日付を同じ行として扱う。
+    Scrapyの Selector.root (lxml) と BeautifulSoup のタグのどちらも受け付ける。
+    """
+    chunks: List[str] = []
+    if hasattr(element, 'get_text'):
+        # BeautifulSoup
+        for child in element.children:
+            chunks.append(child.get_text() if hasattr(child, 'get_text') else str(child))
+    else:
+        # lxml: テキストノードを1回走査するだけで済むよう itertext を使う
+        chunks.append(element.text or '')
+        for child in element:
+            if isinstance(child.tag, str):
+                chunks.append(''.join(child.itertext()))
+            chunks.append(child.tail or '')
+
+    lines: List[str] = []
+    for chunk in chunks:
+        lines.extend(line for line in chunk.splitlines() if line.strip())
+    return lines
+
+
+def _parse_line(config: Dict[str, Any], line: str, tz: ZoneInfo) -> Optional[Tuple[str, datetime]]:
+    """1行を解析し、('start' または 'end', 日時) を返す。対象外の行はNone。"""
+    # 正規表現より安価なキーワード判定を先に行い、見出しのない行は読み飛ばす
+    if any(keyword in line for keyword in config['start_keywords']):
+        kind = 'start'
+    elif any(keyword in line for keyword in config['end_keywords']):
+        kind = 'end'
+    else:
+        return None
+
+    match = config['pattern'].search(line)
+    if not match:
+        return None
+
+    parts = dict(zip(config['group_order'], match.groups()))
+    time_parts: Dict[str, int] = {k: int(v) for k, v in parts.items() if v and k in _INT_FIELDS}
+
+    if parts.get('month_str') and 'month_map' in config:
+        time_parts['month'] = config['month_map'][parts['month_str'].lower()]
+
+    if parts.get('ampm'):
+        hour = time_parts.get('hour', 0)
+        if parts['ampm'].lower() == 'pm' and hour != 12:
+            hour += 12
+        elif parts['ampm'].lower() == 'am' and hour == 12:
+            hour = 0
+        time_parts['hour'] = hour
+
+    return kind, datetime(**time_parts, tzinfo=tz)
+
+
+def detect_lang_code(lines: Iterable[str]) -> Optional[str]:
+    """
+    本文から言語を推定する。キーワードを含み日付として読める行が最も多い言語を返す。
+    どの言語にも当てはまらない場合はNone。
+    """
+    lines = list(lines)
+    best_code, best_score = None, 0
+    for code, config in DATE_CONFIG.items():
+        score = 0
+        for line in lines:
+            if not any(k in line for k in config['start_keywords']) and not any(k in line for k in config['end_keywords']):
+                continue
+            if config['pattern'].search(line):
+                score += 1
+        if score > best_score:
+            best_code, best_score = code, score
+    return best_code
+
+
+def parse_start_end_datetimes(
+    text: Union[str, Iterable[str], None],
+    lang_code: Optional[str] = None,
+    tz_str: str = DEFAULT_TIMEZONE,
+) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """日付情報を含むテキストを解析し、開始日時と終了日時のタプルを返します。
+
+    Args:
+        text (str | Iterable[str] | None): 解析対象のテキスト、または element_lines で得た行のリスト。
+        lang_code (Optional[str]): 言語コード ('en', 'ja'など)。不明な場合や、その言語で読めなかった場合は本文から推定する。
+        tz_str (str, optional): タイムゾーン文字列。デフォルトは "Asia/Tokyo"。
+
+    Returns:
+        Tuple[Optional[datetime], Optional[datetime]]: (開始日時, 終了日時) のタプル。
+            見つからない場合はNone。
+    """
+    if not text:
+        return None, None
+    lines = text.splitlines() if isinstance(text, str) else list(text)
+
+    tz = get_timezone(tz_str)
+    lang_code = normalize_lang_code(lang_code)
+    if lang_code in DATE_CONFIG:
+        start_dt, end_dt = _parse_lines(lines, lang_code, tz)
+        if start_dt or end_dt:
+            return start_dt, end_dt
+
+    # 言語コードが不明、または指定された言語で1件も読めなかった場合は本文から推定する
+    detected = detect_lang_code(lines)
+    if detected is None or detected == lang_code:
+        return None, None
+    return _parse_lines(lines, detected, tz)
+
+
+def _parse_lines(lines: List[str], lang_code: str, tz: ZoneInfo) -> Tuple[Optional[datetime], Optional[datetime]]:
+    config = DATE_CONFIG[lang_code]
+    start_dt, end_dt = None, None
+    for line in lines:
+        try:
+            parsed = _parse_line(config, line, tz)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"日付の解析に失敗しました: {line.strip()}, lang: {lang_code}, error: {e}")
+            continue
+        if parsed is None:
+            continue
+        kind, dt = parsed
+        if kind == 'start':
+            start_dt = dt
+        else:
+            end_dt = dt
+    return start_dt, end_dt
@@ -0,0 +1,132 @@
+"""
+ユーザー・プラットフォームごとの課題データの鮮度。
+
+スクレイピングのタスクが開始日時 (last_scraped_at) と最後に成功した日時 (last_success_at) を
+キャッシュに記録し、一覧のAPIはこれを応答に付けて返す。
+キャッシュにない場合 (Redisのデータが失われた場合など) はScrapeRunから求めて保存し直す。
+"""
+import logging
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import ScrapeRun
+from .notifications import PLATFORMS
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('last_scraped_at', 'last_success_at')
+
+
+def freshness_key(user_pk, platform, field):
+    return f'scraping:freshness:{user_pk}:{platform}:{field}'
+
+
+def _set(user_pk, platform, field, value):
+    try:
+        cache.set(freshness_key(user_pk, platform, field), value, timeout=None)
+    except Exception as e:
+        logger.warning(f"データの鮮度の記録に失敗しました (user_pk={user_pk}, platform={platform}): {e}")
+
+
+def record_started(user_pk, platform, started_at):
+    """スクレイピングを開始した日時を記録する"""
+    _set(user_pk, platform, 'last_scraped_at', started_at)
+
+
+def record_success(user_pk, platform, finished_at):
+    """スクレイピングが成功した日時を記録する"""
+    _set(user_pk, platform, 'last_success_at', finished_at)
+
+
+def _keys(user_pk):
+    return {
+        freshness_key(user_pk, platform, field): (platform, field)
+        for platform in PLATFORMS for field in FIELDS
+    }
+
+
+def _from_runs(user_pk):
+    """ScrapeRunからプラットフォームごとの日時を求めるクエリ"""
+    return (
+        ScrapeRun.objects.filter(user_id=user_pk)
+        .values('platform')
+        .annotate(
+            last_scraped_at=Max('started_at'),
+            last_success_at=Max('finished_at', filter=Q(status='success')),
+        )
+    )
+
+
+def _result(keys, cached, runs):
+    """
+    キャッシュの値とScrapeRunの集計から {platform: {field: datetime | None}} を組み立てる。
+    キャッシュになかった値 (まだ一度も実行していない場合のNoneを含む) は保存し直す。
+    """
+    runs = {row['platform']: row for row in runs}
+    result = {platform: {} for platform in PLATFORMS}
+    missing = {}
+    for key, (platform, field) in keys.items():
+        if key in cached:
+            result[platform][field] = cached[key]
+        else:
+            value = runs.get(platform, {}).get(field)
+            result[platform][field] = missing[key] = value
+    return result, missing
+
+
+def get(user_pk):
+    """プラットフォームごとの {'last_scraped_at': datetime | None, 'last_success_at': datetime | None}"""
+    keys = _keys(user_pk)
+    try:
+        cached = cache.get_many(list(keys))
+    except Exception as e:
+        logger.warning(f"データの鮮度の取得に失敗しました (user_pk={user_pk}): {e}")
+        cached = {}
+    runs = list(_from_runs(user_pk)) if len(cached) < len(keys) else []
+    result, missing = _result(keys, cached, runs)
+    if missing:
+        try:
+            cache.set_many(missing, timeout=None)
+        except Exception as e:
+            logger.warning(f"データの鮮度の保存に失敗しました (user_pk={user_pk}): {e}")
+    return result
+
+
+async def aget(user_pk):
+    """get() の非同期版 (一覧のAPIから呼ぶ)"""
+    keys = _keys(user_pk)
+    try:
+        cached = await cache.aget_many(list(keys))
+    except Exception as e:
+        logger.warning(f"データの鮮度の取得に失敗しました (user_pk={user_pk}): {e}")
+        cached = {}
+    runs = [row async for row in _from_runs(user_pk)] if len(cached) < len(keys) else []
+    result, missing = _result(keys, cached, runs)
+    if missing:
+        try:
+            await cache.aset_many(missing, timeout=None)
+        except Exception as e:
+            logger.warning(f"データの鮮度の保存に失敗しました (user_pk={user_pk}): {e}")
+    return result
+
+
+def is_fresh(freshness, platform, max_age):
+    """最後に成功してから max_age 秒以内かどうか"""
+    last_success_at = freshness[platform]['last_success_at']
+    return last_success_at is not None and timezone.now() - last_success_at <= timedelta(seconds=max_age)
+
+
+def stale_platforms(freshness, max_age):
+    """最後の成功から max_age 秒を超えた (または一度も成功していない) プラットフォーム"""
+    return [platform for platform in PLATFORMS if not is_fresh(freshness, platform, max_age)]
+
+
+def to_representation(freshness):
+    """応答に含める形式 (ISO 8601の文字列) に変換する"""
+    return {
+        platform: {field: value.isoformat() if value else None for field, value in fields.items()}
+        for platform, fields in freshness.items()
+    }
@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from scraping import archive
+
+
+class Command(BaseCommand):
+    help = '提出期限から一定の日数が過ぎた課題と、課題が残っていない古い授業をアーカイブ用のテーブルへ移動します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='提出期限からの日数 (省略時は ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, help='1回のトランザクションで移動する件数 (省略時は ARCHIVE_BATCH_SIZE)')
+        parser.add_argument('--dry-run', action='store_true', help='移動せずに対象の件数だけを表示する')
+
+    def handle(self, *args, **options):
+        if options['days'] is not None:
+            before = timezone.now() - timedelta(days=options['days'])
+        else:
+            before = archive.cutoff()
+
+        if options['dry_run']:
+            # 課題を移動した後に対象となる授業は数えられないため、現時点で対象の授業のみ表示する
+            assignments = archive.expired_assignments(before).count()
+            courses = archive.expired_courses(before).count()
+            self.stdout.write(f'{before:%Y-%m-%d %H:%M}より前: 課題{assignments}件, 授業{courses}件 (移動していません)')
+            return
+
+        result = archive.archive(before, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{before:%Y-%m-%d %H:%M}より前の課題{result['assignments']}件と授業{result['courses']}件をアーカイブしました。"
+        ))
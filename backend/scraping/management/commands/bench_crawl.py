@@ -0,0 +1,116 @@
+import json
+import resource
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from scrapy.crawler import CrawlerProcess
+from scrapy.settings import Settings
+
+from scraping.crawlers import settings as crawler_settings
+from scraping.crawlers.spiders.moodle_spider import MoodleSpider
+from scraping.crawlers.spiders.webclass_spider import WebclassSpider
+from scraping.standin import StandInLMS, StandInConfig
+
+
+User = get_user_model()
+
+SPIDERS = {
+    'moodle': MoodleSpider,
+    'webclass': WebclassSpider,
+}
+
+
+class Command(BaseCommand):
+    help = 'ローカルのスタンドインLMSに対してSpiderを実行し、クロール性能をJSONで出力します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--platform', choices=sorted(SPIDERS), default='moodle', help='実行するSpider')
+        parser.add_argument('--users', type=int, default=1, help='同時にクロールするユーザー数')
+        parser.add_argument('--courses', type=int, default=10, help='ユーザーあたりのコース数')
+        parser.add_argument('--assignments', type=int, default=5, help='コースあたりの課題数')
+        parser.add_argument('--tab-ratio', type=float, default=0.3, help='タブ形式のコースの割合')
+        parser.add_argument('--quiz-ratio', type=float, default=0.2, help='小テストの割合')
+        parser.add_argument('--description-bytes', type=int, default=2000, help='課題説明のおおよそのバイト数')
+        parser.add_argument('--latency', type=float, default=0.0, help='スタンドインサーバーの応答遅延(秒)')
+        parser.add_argument('--output', help='結果のJSONを書き出すファイル (省略時は標準出力)')
+        parser.add_argument('--keep-data', action='store_true', help='ベンチマーク用ユーザーと課題を削除しない')
+
+    def handle(self, *args, **options):
+        spider_cls = SPIDERS[options['platform']]
+        config = StandInConfig(
+            courses=options['courses'],
+            assignments_per_course=options['assignments'],
+            tab_ratio=options['tab_ratio'],
+            quiz_ratio=options['quiz_ratio'],
+            description_bytes=options['description_bytes'],
+            latency=options['latency'],
+        )
+
+        # ベンチマーク用ユーザー (university_idは最大10文字)
+        users = [
+            User.objects.get_or_create(university_id=f'BENCH{i:05d}')[0]
+            for i in range(options['users'])
+        ]
+        self._delete_bench_data(users)
+
+        settings = Settings()
+        settings.setmodule(crawler_settings, priority='project')
+        settings.set('LOG_LEVEL', 'WARNING', priority='cmdline')
+        process = CrawlerProcess(settings, install_root_handler=False)
+
+        with StandInLMS(config) as lms:
+            login_url = lms.webclass_login_url if options['platform'] == 'webclass' else lms.moodle_login_url
+            crawlers = []
+            for user in users:
+                crawler = process.create_crawler(spider_cls)
+                process.crawl(crawler, user_pk=user.pk, password='benchmark', login_url=login_url)
+                crawlers.append(crawler)
+
+            started = time.perf_counter()
+            process.start()
+            elapsed = time.perf_counter() - started
+
+        stats = [crawler.stats.get_stats() for crawler in crawlers]
+        requests = sum(s.get('downloader/request_count', 0) for s in stats)
+        items = sum(s.get('item_scraped_count', 0) for s in stats)
+        db_seconds = sum(s.get('pipeline/db_time_seconds', 0) for s in stats)
+        # Linuxでは ru_maxrss はKB単位
+        peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        result = {
+            'platform': options['platform'],
+            'users': options['users'],
+            'courses': options['courses'],
+            'assignments_per_course': options['assignments'],
+            'expected_items': lms.expected_items(options['users']),
+            'items': items,
+            'requests': requests,
+            'crawl_seconds': round(elapsed, 3),
+            'requests_per_second': round(requests / elapsed, 2) if elapsed else None,
+            'items_per_second': round(items / elapsed, 2) if elapsed else None,
+            'db_seconds': round(db_seconds, 3),
+            'peak_rss_mb': round(peak_rss_kb / 1024, 1),
+            'finish_reasons': sorted({str(s.get('finish_reason')) for s in stats}),
+        }
+
+        if not options['keep_data']:
+            self._delete_bench_data(users)
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+        output = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"結果を {options['output']} に書き出しました。"))
+        else:
+            self.stdout.write(output)
+
+        if items < result['expected_items']:
+            raise CommandError(f"取得件数が想定より少ない結果です ({items}/{result['expected_items']})。")
+
+    def _delete_bench_data(self, users):
+        for user in users:
+            user.assignments.all().delete()
+            user.courses.all().delete()
+            user.scrape_runs.all().delete()
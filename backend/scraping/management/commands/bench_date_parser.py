@@ -0,0 +1,61 @@
+import json
+import timeit
+
+from django.core.management.base import BaseCommand
+from parsel import Selector
+
+from scraping import date_parser
+
+
+# 言語ごとの課題ページの日付部分 (div.activity-dates)
+SAMPLES = {
+    'ja': ('開始:', '2025年 4月 1日(火曜日) 9:00', '期限:', '2025年 4月 30日(水曜日) 23:59'),
+    'en': ('Opened:', 'Tuesday, 1 April 2025, 9:00 AM', 'Due:', 'Wednesday, 30 April 2025, 11:59 PM'),
+    'en_us': ('Opened:', 'Tuesday, April 1, 2025, 9:00 AM', 'Due:', 'Wednesday, April 30, 2025, 11:59 PM'),
+    'vi': ('Opened:', 'Thứ Ba, 1 tháng 4 2025, 9:00 AM', 'Due:', 'Thứ Tư, 30 tháng 4 2025, 11:59 PM'),
+    'zh_tw': ('開啟:', '2025年 04月 1日(週二) 09:00', '到期:', '2025年 04月 30日(週三) 23:59'),
+    'zh_cn': ('已打开:', '2025年04月1日 星期二 09:00', '到期日:', '2025年04月30日 星期三 23:59'),
+    'ko': ('Opened:', '화요일, 1 4월 2025, 9:00 AM', 'Due:', '수요일, 30 4월 2025, 11:59 PM'),
+}
+
+
+def _page(sample):
+    start_label, start, end_label, end = sample
+    return (
+        '<html><body><div class="activity-dates">'
+        f'<div><strong>{start_label}</strong> {start}</div>'
+        f'<div><strong>{end_label}</strong> {end}</div>'
+        '</div></body></html>'
+    )
+
+
+class Command(BaseCommand):
+    help = 'Moodleの日付解析を言語ごとに繰り返し実行し、1回あたりの処理時間(マイクロ秒)をJSONで出力します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=10000, help='1計測あたりの実行回数')
+        parser.add_argument('--repeat', type=int, default=5, help='計測の繰り返し回数 (最小値を採用)')
+
+    def handle(self, *args, **options):
+        number, repeat = options['number'], options['repeat']
+        results = {}
+        for lang_code, sample in SAMPLES.items():
+            element = Selector(text=_page(sample)).css('div.activity-dates')[0].root
+
+            def with_lang():
+                date_parser.parse_start_end_datetimes(date_parser.element_lines(element), lang_code)
+
+            def detected():
+                date_parser.parse_start_end_datetimes(date_parser.element_lines(element), None)
+
+            assert date_parser.parse_start_end_datetimes(date_parser.element_lines(element), lang_code)[1] is not None
+            results[lang_code] = {
+                'with_lang_code_us': self._measure(with_lang, number, repeat),
+                'detected_us': self._measure(detected, number, repeat),
+            }
+
+        self.stdout.write(json.dumps({'number': number, 'repeat': repeat, 'results': results}, indent=2))
+
+    def _measure(self, fn, number, repeat):
+        best = min(timeit.repeat(fn, number=number, repeat=repeat))
+        return round(best / number * 1_000_000, 2)
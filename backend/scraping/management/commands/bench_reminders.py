@@ -0,0 +1,109 @@
+import json
+import random
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from scraping import reminders
+from scraping.models import Assignment, AssignmentReminder
+
+
+User = get_user_model()
+
+# ベンチマーク用ユーザーの学籍番号の接頭辞 (university_idは最大10文字)
+USER_PREFIX = 'RMD'
+
+
+class Command(BaseCommand):
+    help = (
+        '未提出の課題を大量に作成してリマインダーの定期実行 (scraping.reminders) を計測し、'
+        '1回の実行にかかる時間と部分索引の使用状況をJSONで出力します (送信は行いません)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assignments', type=int, default=100000, help='未提出の課題の件数')
+        parser.add_argument('--users', type=int, default=2000, help='課題を割り当てるユーザー数')
+        parser.add_argument('--days', type=int, default=120, help='提出期限を分散させる日数')
+        parser.add_argument('--submitted-ratio', type=float, default=0.5, help='未提出の課題に加えて作成する提出済みの課題の割合')
+        parser.add_argument('--keep-data', action='store_true', help='ベンチマーク用ユーザーと課題を削除しない')
+
+    def handle(self, *args, **options):
+        users = self._create_users(options['users'])
+        try:
+            created = self._create_assignments(users, options)
+            now = timezone.now()
+            # 送信 (WebSocket・Webhook・メール) とメトリクスは計測に含めない
+            with mock.patch.object(reminders, 'send_reminders'), \
+                    mock.patch.object(reminders, '_send_webhook'), \
+                    mock.patch.object(reminders, '_send_email'), \
+                    mock.patch.object(reminders.metrics, 'REMINDERS_SENT'):
+                # 1回目は締切が近い課題の分だけ送信し、2回目以降は送信済みの台帳で除外される
+                first = self._tick(now)
+                steady = self._tick(now)
+            result = {
+                'open_assignments': options['assignments'],
+                'submitted_assignments': created - options['assignments'],
+                'offsets_minutes': settings.REMINDER_OFFSETS_MINUTES,
+                'first_tick': first,
+                'steady_tick': steady,
+                'query_plan': self._query_plan(now),
+            }
+        finally:
+            if not options['keep_data']:
+                User.objects.filter(university_id__startswith=USER_PREFIX).delete()
+
+        self.stdout.write(json.dumps(result, ensure_ascii=False, indent=2))
+
+    def _create_users(self, count):
+        users = [User(university_id=f'{USER_PREFIX}{i:06d}') for i in range(count)]
+        User.objects.bulk_create(users, ignore_conflicts=True)
+        return users
+
+    def _create_assignments(self, users, options):
+        now = timezone.now()
+        rng = random.Random(0)
+        span = options['days'] * 24 * 60
+        submitted = int(options['assignments'] * options['submitted_ratio'])
+        assignments = [
+            Assignment(
+                user=users[i % len(users)],
+                title=f'ベンチマーク課題{i}',
+                url=f'https://example.com/mod/assign/view.php?id={i}',
+                platform='moodle',
+                # 期限切れの課題も含め、前後に分散させる
+                due_date=now + timedelta(minutes=rng.randint(-span // 4, span)),
+                is_submitted=i >= options['assignments'],
+            )
+            for i in range(options['assignments'] + submitted)
+        ]
+        Assignment.objects.bulk_create(assignments, batch_size=5000)
+        return len(assignments)
+
+    def _tick(self, now):
+        started = time.perf_counter()
+        sent = reminders._send_due_reminders(now)
+        return {
+            'seconds': round(time.perf_counter() - started, 4),
+            'sent': sent,
+            'ledger_rows': AssignmentReminder.objects.count(),
+        }
+
+    def _query_plan(self, now):
+        """各区間の検索の実行計画 (部分索引 assignment_open_due_idx を使うかどうか)"""
+        plans = {}
+        for offset, lower in reminders._buckets(settings.REMINDER_OFFSETS_MINUTES):
+            sql, params = reminders.due_queryset(offset, lower, now).query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                detail = [row[-1] for row in cursor.fetchall()]
+            plans[offset] = {
+                'uses_index': any('assignment_open_due_idx' in line for line in detail),
+                'plan': detail,
+            }
+        return plans
@@ -0,0 +1,70 @@
+import json
+import timeit
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from backend import fast_json
+from scraping.models import Assignment
+from scraping.serializers import AssignmentSerializer, ValuesReader
+
+
+def _rows(count):
+    """課題一覧の .values() の行に相当するデータを作る (DBには保存しない)"""
+    now = timezone.now()
+    return [
+        {
+            'id': i, 'user_id': 'AB12345', 'course_id': i % 20 or None,
+            'title': f'第{i}回 レポート課題', 'content': '提出方法は授業ページを参照してください。' * 20,
+            'url': f'https://example.com/mod/assign/view.php?id={i}',
+            'due_date': now + timedelta(hours=i), 'is_submitted': i % 3 == 0,
+        }
+        for i in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        '課題一覧のシリアライズとJSON変換を、シリアライザ + JSONRenderer と .values() + fast_json で比較し、'
+        '1回あたりの処理時間(ミリ秒)をJSONで出力します (DBへの問い合わせは含みません)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help='課題の件数')
+        parser.add_argument('--repeat', type=int, default=5, help='計測の繰り返し回数 (最小値を採用)')
+
+    def handle(self, *args, **options):
+        reader = ValuesReader(AssignmentSerializer)
+        renderer = JSONRenderer()
+        results = {}
+        for size in options['sizes']:
+            rows = _rows(size)
+            instances = [Assignment(**row) for row in rows]
+
+            def serializer_path():
+                return renderer.render(AssignmentSerializer(instances, many=True).data)
+
+            def values_path():
+                return fast_json.dumps(reader.to_representation_many(rows))
+
+            # 計測の前に出力が一致することを確認する
+            assert serializer_path() == values_path()
+            serializer_ms = self._measure(serializer_path, options['repeat'])
+            values_ms = self._measure(values_path, options['repeat'])
+            results[size] = {
+                'serializer_ms': serializer_ms,
+                'values_ms': values_ms,
+                'speedup': round(serializer_ms / values_ms, 1) if values_ms else None,
+            }
+
+        self.stdout.write(json.dumps({
+            'json': 'orjson' if fast_json.orjson else 'stdlib',
+            'repeat': options['repeat'],
+            'results': results,
+        }, indent=2))
+
+    def _measure(self, fn, repeat):
+        best = min(timeit.repeat(fn, number=1, repeat=repeat))
+        return round(best * 1000, 2)
@@ -0,0 +1,276 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import redis
+import requests
+import websocket
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+
+from accounts.standin import StandInLDAP
+from backend.metrics import percentile
+from scraping.notifications import PLATFORMS, TERMINAL_STATES
+from scraping.standin import StandInLMS, StandInConfig
+
+
+User = get_user_model()
+
+# 負荷試験用ユーザーの学籍番号の接頭辞 (university_idは最大10文字)
+USER_PREFIX = 'LOAD'
+
+
+def _summary(values):
+    return {
+        'count': len(values),
+        'p50': _round(percentile(values, 50)),
+        'p90': _round(percentile(values, 90)),
+        'p95': _round(percentile(values, 95)),
+        'p99': _round(percentile(values, 99)),
+        'max': _round(max(values) if values else None),
+    }
+
+
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+
+class QueueDepthSampler(threading.Thread):
+    """
+    Celeryのブローカー(Redis)上のキューの長さを一定間隔で記録する。
+    優先度付きのキューは優先度ごとに別のリストになるため、その合計を記録する。
+    """
+
+    def __init__(self, broker_url, queues, interval):
+        super().__init__(name='queue-depth-sampler', daemon=True)
+        self.client = redis.Redis.from_url(broker_url)
+        self.queues = queues
+        options = settings.CELERY_BROKER_TRANSPORT_OPTIONS
+        sep = options.get('sep', '\x06\x16')
+        # 優先度0は接尾辞なしのリスト (kombuのRedisトランスポートの命名規則)
+        self.lists = {
+            queue: [queue] + [f'{queue}{sep}{step}' for step in options.get('priority_steps', []) if step]
+            for queue in queues
+        }
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+        self._origin = time.perf_counter()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                p = self.client.pipeline(transaction=False)
+                for queue in self.queues:
+                    for name in self.lists[queue]:
+                        p.llen(name)
+                lengths = iter(p.execute())
+                depths = {queue: sum(next(lengths) for _ in self.lists[queue]) for queue in self.queues}
+            except redis.RedisError:
+                depths = None
+            self.samples.append({'t': round(time.perf_counter() - self._origin, 1), 'depth': depths})
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def max_depths(self):
+        return {
+            queue: max((s['depth'][queue] for s in self.samples if s['depth'] is not None), default=None)
+            for queue in self.queues
+        }
+
+
+class Command(BaseCommand):
+    help = (
+        'ログインAPIに同時ログインを発生させ、ログイン応答・最初の進捗通知・スクレイピング完了までの時間と'
+        'Celeryのキューの長さを計測します。LDAPとLMSのスタンドインサーバーも起動するため、'
+        'バックエンドとワーカーは表示される環境変数を設定して起動してください。'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://localhost:8000', help='バックエンドのURL')
+        parser.add_argument('--users', type=int, default=100, help='ログインするユーザー数')
+        parser.add_argument('--concurrency', type=int, default=100, help='同時に処理するユーザー数の上限')
+        parser.add_argument('--ramp', type=float, default=60.0, help='全ユーザーのログインを開始し終えるまでの秒数')
+        parser.add_argument('--timeout', type=float, default=600.0, help='1ユーザーあたりのスクレイピング完了待ちの上限(秒)')
+        parser.add_argument('--password', default='loadtest', help='ログインに使用するパスワード')
+        parser.add_argument('--no-standins', action='store_true', help='スタンドインサーバーを起動しない (起動済みの場合)')
+        parser.add_argument('--bind', default='127.0.0.1', help='スタンドインサーバーの待ち受けアドレス')
+        parser.add_argument('--advertise-host', help='バックエンド・ワーカーから見たスタンドインサーバーのホスト名')
+        parser.add_argument('--ldap-port', type=int, default=3890, help='LDAPスタンドインのポート')
+        parser.add_argument('--ldap-latency', type=float, default=0.0, help='LDAPスタンドインの応答遅延(秒)')
+        parser.add_argument('--lms-port', type=int, default=8089, help='LMSスタンドインのポート')
+        parser.add_argument('--lms-latency', type=float, default=0.0, help='LMSスタンドインの応答遅延(秒)')
+        parser.add_argument('--courses', type=int, default=10, help='ユーザーあたりのコース数')
+        parser.add_argument('--assignments', type=int, default=5, help='コースあたりの課題数')
+        parser.add_argument('--broker-url', default=settings.CELERY_BROKER_URL, help='キューの長さを取得するブローカーのURL')
+        parser.add_argument('--queues', nargs='+', default=['celery', 'moodle', 'webclass'], help='長さを記録するCeleryのキュー名')
+        parser.add_argument('--sample-interval', type=float, default=1.0, help='キューの長さを記録する間隔(秒)')
+        parser.add_argument('--output', help='結果のJSONを書き出すファイル (省略時は標準出力)')
+        parser.add_argument('--keep-data', action='store_true', help='負荷試験用ユーザーと課題を削除しない')
+
+    def handle(self, *args, **options):
+        if options['users'] > 99999:
+            raise CommandError('--users は99999以下で指定してください。')
+
+        ldap = lms = None
+        if not options['no_standins']:
+            ldap = StandInLDAP(
+                host=options['bind'], port=options['ldap_port'],
+                password=options['password'], latency=options['ldap_latency'],
+                public_host=options['advertise_host'],
+            ).start()
+            lms = StandInLMS(
+                StandInConfig(
+                    courses=options['courses'],
+                    assignments_per_course=options['assignments'],
+                    latency=options['lms_latency'],
+                ),
+                host=options['bind'], port=options['lms_port'], public_host=options['advertise_host'],
+            ).start()
+            self.stderr.write('バックエンドとワーカーを次の環境変数で起動してください (DEBUG=False):')
+            self.stderr.write(f'  LDAP_SERVER={ldap.url}')
+            self.stderr.write(f'  MOODLE_LOGIN_URL={lms.moodle_login_url}')
+            self.stderr.write(f'  WEBCLASS_LOGIN_URL={lms.webclass_login_url}')
+
+        sampler = QueueDepthSampler(options['broker_url'], options['queues'], options['sample_interval'])
+        university_ids = [f'{USER_PREFIX}{i:05d}' for i in range(options['users'])]
+
+        try:
+            sampler.start()
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                futures = []
+                for i, university_id in enumerate(university_ids):
+                    # 開始時刻をramp秒の間に均等に分散させる
+                    offset = options['ramp'] * i / len(university_ids)
+                    futures.append(executor.submit(self._run_user, university_id, started + offset, options))
+                results = [future.result() for future in futures]
+            elapsed = time.perf_counter() - started
+        finally:
+            sampler.stop()
+            if ldap:
+                ldap.stop()
+            if lms:
+                lms.stop()
+
+        report = self._report(results, elapsed, sampler, ldap, options)
+
+        if not options['keep_data']:
+            User.objects.filter(university_id__in=university_ids).delete()
+
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"結果を {options['output']} に書き出しました。"))
+        else:
+            self.stdout.write(output)
+
+    def _run_user(self, university_id, start_at, options):
+        """1ユーザー分のログインから全プラットフォームの完了までを計測する"""
+        delay = start_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+        result = {'university_id': university_id, 'states': {}}
+        session = requests.Session()
+        t0 = time.perf_counter()
+        try:
+            response = session.post(
+                f"{options['base_url']}/api/login/",
+                json={'university_id': university_id, 'password': options['password']},
+                timeout=options['timeout'],
+            )
+        except requests.RequestException as e:
+            result['error'] = f'login: {e.__class__.__name__}'
+            return result
+        result['login_seconds'] = time.perf_counter() - t0
+        result['login_status'] = response.status_code
+        if response.status_code != 200:
+            return result
+
+        parsed = urlparse(options['base_url'])
+        scheme = 'wss' if parsed.scheme == 'https' else 'ws'
+        cookie = '; '.join(f'{name}={value}' for name, value in session.cookies.items())
+        deadline = t0 + options['timeout']
+        try:
+            ws = websocket.create_connection(
+                f'{scheme}://{parsed.netloc}/ws/scraping-status/',
+                cookie=cookie,
+                timeout=options['timeout'],
+            )
+        except (websocket.WebSocketException, OSError) as e:
+            result['error'] = f'websocket: {e.__class__.__name__}'
+            return result
+
+        try:
+            while time.perf_counter() < deadline:
+                ws.settimeout(max(deadline - time.perf_counter(), 0.1))
+                message = json.loads(ws.recv())
+                if message.get('type') == 'snapshot':
+                    updates = message.get('statuses', {}).values()
+                elif message.get('type') == 'status':
+                    updates = [message]
+                else:
+                    continue
+
+                for update in updates:
+                    if update.get('platform') in PLATFORMS and update.get('state'):
+                        result['states'][update['platform']] = update['state']
+                        # 待機中以外の状態を最初に受け取った時点を「最初の進捗通知」とする
+                        if update['state'] != 'queued' and 'first_progress_seconds' not in result:
+                            result['first_progress_seconds'] = time.perf_counter() - t0
+
+                if all(result['states'].get(p) in TERMINAL_STATES for p in PLATFORMS):
+                    result['completion_seconds'] = time.perf_counter() - t0
+                    break
+        except websocket.WebSocketTimeoutException:
+            pass
+        except (websocket.WebSocketException, OSError, ValueError) as e:
+            result['error'] = f'websocket: {e.__class__.__name__}'
+        finally:
+            ws.close()
+
+        if 'completion_seconds' not in result and 'error' not in result:
+            result['error'] = 'timeout'
+        return result
+
+    def _report(self, results, elapsed, sampler, ldap, options):
+        login_statuses = {}
+        errors = {}
+        final_states = {platform: {} for platform in PLATFORMS}
+        for result in results:
+            if 'login_status' in result:
+                key = str(result['login_status'])
+                login_statuses[key] = login_statuses.get(key, 0) + 1
+            if 'error' in result:
+                errors[result['error']] = errors.get(result['error'], 0) + 1
+            for platform in PLATFORMS:
+                state = str(result['states'].get(platform))
+                final_states[platform][state] = final_states[platform].get(state, 0) + 1
+
+        return {
+            'users': options['users'],
+            'concurrency': options['concurrency'],
+            'ramp_seconds': options['ramp'],
+            'elapsed_seconds': round(elapsed, 3),
+            'logins_per_second': round(len(results) / elapsed, 2) if elapsed else None,
+            'login_statuses': login_statuses,
+            'completed': sum(1 for r in results if 'completion_seconds' in r),
+            'errors': errors,
+            'final_states': final_states,
+            'login_seconds': _summary([r['login_seconds'] for r in results if 'login_seconds' in r]),
+            'first_progress_seconds': _summary([r['first_progress_seconds'] for r in results if 'first_progress_seconds' in r]),
+            'completion_seconds': _summary([r['completion_seconds'] for r in results if 'completion_seconds' in r]),
+            'queue_depth': {
+                'max': sampler.max_depths(),
+                'samples': sampler.samples,
+            },
+            'ldap': dict(ldap.stats) if ldap else None,
+        }
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from backend import worker_memory
+
+
+class Command(BaseCommand):
+    help = (
+        'Celeryワーカーでtracemallocを一時的に有効にし、タスクごとに増加した割り当て箇所をログに出力させます。'
+        '各ワーカーは次のタスクの開始時に設定を読み込みます。'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=int, default=30, help='有効にする時間(分)')
+        parser.add_argument('--off', action='store_true', help='有効期限を待たずに無効にする')
+
+    def handle(self, *args, **options):
+        if options['off']:
+            worker_memory.request_trace(0)
+            self.stdout.write(self.style.SUCCESS('tracemallocを無効にしました。'))
+            return
+
+        worker_memory.request_trace(options['minutes'] * 60)
+        self.stdout.write(self.style.SUCCESS(f"tracemallocを{options['minutes']}分間有効にしました。"))
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.3 on 2026-10-19 10:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraping', '0004_alter_assignment_unique_together'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScrapeRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('platform', models.CharField(max_length=255, verbose_name='プラットフォーム')),
+                ('status', models.CharField(choices=[('running', '実行中'), ('success', '成功'), ('failure', '失敗')], default='running', max_length=16, verbose_name='状態')),
+                ('task_id', models.CharField(blank=True, max_length=255, null=True, verbose_name='タスクID')),
+                ('started_at', models.DateTimeField(verbose_name='開始日時')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='終了日時')),
+                ('duration', models.FloatField(blank=True, null=True, verbose_name='所要時間(秒)')),
+                ('request_count', models.PositiveIntegerField(default=0, verbose_name='リクエスト数')),
+                ('item_count', models.PositiveIntegerField(default=0, verbose_name='取得件数')),
+                ('retries', models.PositiveSmallIntegerField(default=0, verbose_name='再試行回数')),
+                ('bytes_downloaded', models.BigIntegerField(default=0, verbose_name='ダウンロード量(バイト)')),
+                ('finish_reason', models.CharField(blank=True, max_length=255, null=True, verbose_name='終了理由')),
+                ('failure_reason', models.TextField(blank=True, null=True, verbose_name='失敗理由')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scrape_runs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['started_at', 'platform'], name='scraperun_started_platform_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+# 課題のタイトルと詳細の全文検索用のFTS5索引 (scraping.search)
+
+from django.db import migrations
+
+# 日本語は単語の区切りがないため、3文字単位で索引するtrigramトークナイザを使う。
+# 課題テーブルを外部コンテンツとし、トリガーで索引を同期する。
+# 注意: SQLiteでは課題テーブルを作り直す変更 (列の型変更など) でトリガーが削除されるため、
+#       そのようなマイグレーションを追加する場合はトリガーを作り直すこと。
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE scraping_assignment_fts USING fts5(
+        title, content,
+        content='scraping_assignment', content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER scraping_assignment_fts_ai AFTER INSERT ON scraping_assignment BEGIN
+        INSERT INTO scraping_assignment_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER scraping_assignment_fts_ad AFTER DELETE ON scraping_assignment BEGIN
+        INSERT INTO scraping_assignment_fts(scraping_assignment_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER scraping_assignment_fts_au AFTER UPDATE OF title, content ON scraping_assignment BEGIN
+        INSERT INTO scraping_assignment_fts(scraping_assignment_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO scraping_assignment_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    # 既存の課題を索引する
+    "INSERT INTO scraping_assignment_fts(scraping_assignment_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS scraping_assignment_fts_au',
+    'DROP TRIGGER IF EXISTS scraping_assignment_fts_ad',
+    'DROP TRIGGER IF EXISTS scraping_assignment_fts_ai',
+    'DROP TABLE IF EXISTS scraping_assignment_fts',
+]
+
+
+def _execute(statements):
+    def run(apps, schema_editor):
+        # FTS5はSQLite専用のため、他のデータベースでは何もしない (検索はLIKEで行う)
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraping', '0005_scraperun'),
+    ]
+
+    operations = [
+        migrations.RunPython(_execute(CREATE_SQL), _execute(DROP_SQL)),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.3 on 2026-10-19 14:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraping', '0006_assignment_fts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssignmentReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('offset_minutes', models.PositiveIntegerField(verbose_name='締切の何分前の通知か')),
+                ('due_date', models.DateTimeField(verbose_name='通知時の提出期限')),
+                ('sent_at', models.DateTimeField(auto_now_add=True, verbose_name='送信日時')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(condition=models.Q(('is_submitted', False)), fields=['due_date'], name='assignment_open_due_idx'),
+        ),
+        migrations.AddField(
+            model_name='assignmentreminder',
+            name='assignment',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='scraping.assignment'),
+        ),
+        migrations.AddIndex(
+            model_name='assignmentreminder',
+            index=models.Index(fields=['due_date'], name='assignmentreminder_due_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='assignmentreminder',
+            constraint=models.UniqueConstraint(fields=('assignment', 'offset_minutes', 'due_date'), name='assignmentreminder_unique'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.3 on 2026-10-19 14:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraping', '0007_assignment_reminders'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAssignment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('course_id', models.BigIntegerField(blank=True, null=True, verbose_name='授業ID')),
+                ('title', models.CharField(max_length=255, verbose_name='課題タイトル')),
+                ('content', models.TextField(blank=True, null=True, verbose_name='課題詳細')),
+                ('url', models.URLField(blank=True, max_length=512, null=True, verbose_name='課題URL')),
+                ('start_date', models.DateTimeField(blank=True, null=True, verbose_name='開始日時')),
+                ('due_date', models.DateTimeField(blank=True, null=True, verbose_name='提出期限')),
+                ('is_submitted', models.BooleanField(default=False, verbose_name='提出済み')),
+                ('platform', models.CharField(blank=True, max_length=255, null=True, verbose_name='プラットフォーム')),
+                ('created_at', models.DateTimeField(verbose_name='作成日時')),
+                ('updated_at', models.DateTimeField(verbose_name='更新日時')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='アーカイブ日時')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_assignments', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['due_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedCourse',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=255, verbose_name='授業タイトル')),
+                ('day_of_week', models.IntegerField(blank=True, choices=[(1, '月曜日'), (2, '火曜日'), (3, '水曜日'), (4, '木曜日'), (5, '金曜日'), (6, '土曜日'), (7, '日曜日')], null=True, verbose_name='曜日')),
+                ('period', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='時限')),
+                ('created_at', models.DateTimeField(verbose_name='作成日時')),
+                ('updated_at', models.DateTimeField(verbose_name='更新日時')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='アーカイブ日時')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_courses', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
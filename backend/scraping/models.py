@@ -39,6 +39,108 @@ class Assignment(models.Model):
     class Meta:
         unique_together = ('user', 'title', 'url')
         ordering = ['due_date']
+        indexes = [
+            # 締切のリマインダー (scraping.reminders) で未提出の課題を締切の範囲で探すため
+            # 提出済みの課題は含めない部分索引にする (filter(is_submitted=False) の条件と一致させる)
+            models.Index(fields=['due_date'], condition=models.Q(is_submitted=False), name='assignment_open_due_idx'),
+        ]
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+
+class ScrapeRun(models.Model):
+    """1回のクロールの実行記録 (性能の推移を確認するために使用)"""
+    STATUS_CHOICES = [
+        ('running', '実行中'),
+        ('success', '成功'),
+        ('failure', '失敗'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='scrape_runs')
+    platform = models.CharField(max_length=255, verbose_name='プラットフォーム')
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default='running', verbose_name='状態')
+    task_id = models.CharField(max_length=255, verbose_name='タスクID', blank=True, null=True)
+    started_at = models.DateTimeField(verbose_name='開始日時')
+    finished_at = models.DateTimeField(verbose_name='終了日時', null=True, blank=True)
+    duration = models.FloatField(verbose_name='所要時間(秒)', null=True, blank=True)
+    request_count = models.PositiveIntegerField(default=0, verbose_name='リクエスト数')
+    item_count = models.PositiveIntegerField(default=0, verbose_name='取得件数')
+    retries = models.PositiveSmallIntegerField(default=0, verbose_name='再試行回数')
+    bytes_downloaded = models.BigIntegerField(default=0, verbose_name='ダウンロード量(バイト)')
+    finish_reason = models.CharField(max_length=255, verbose_name='終了理由', blank=True, null=True)
+    failure_reason = models.TextField(verbose_name='失敗理由', blank=True, null=True)
+
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['started_at', 'platform'], name='scraperun_started_platform_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.platform} {self.user_id} {self.started_at:%Y-%m-%d %H:%M}'
+
+
+class AssignmentReminder(models.Model):
+    """送信済みの締切のリマインダー (同じ課題・提出期限・通知のタイミングで二重に送らないための台帳)"""
+    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='reminders')
+    offset_minutes = models.PositiveIntegerField(verbose_name='締切の何分前の通知か')
+    due_date = models.DateTimeField(verbose_name='通知時の提出期限')
+    sent_at = models.DateTimeField(auto_now_add=True, verbose_name='送信日時')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['assignment', 'offset_minutes', 'due_date'], name='assignmentreminder_unique',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['due_date'], name='assignmentreminder_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.assignment_id} {self.offset_minutes}分前'
+
+
+class ArchivedCourse(models.Model):
+    """
+    過去の学期の授業 (scraping.archive でCourseから移動する)。
+    idは元のCourseのものを引き継ぎ、APIでは ?include_archived= を指定した場合に返す。
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_courses')
+    title = models.CharField(max_length=255, verbose_name='授業タイトル')
+    day_of_week = models.IntegerField(choices=Course.DAY_OF_WEEK_CHOICES, verbose_name='曜日', null=True, blank=True)
+    period = models.PositiveSmallIntegerField(verbose_name='時限', null=True, blank=True)
+    created_at = models.DateTimeField(verbose_name='作成日時')
+    updated_at = models.DateTimeField(verbose_name='更新日時')
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name='アーカイブ日時')
+
+    def __str__(self):
+        return self.title
+
+
+class ArchivedAssignment(models.Model):
+    """
+    過去の学期の課題 (scraping.archive でAssignmentから移動する)。
+    idは元のAssignmentのものを引き継ぐ。授業はまだアーカイブされていない場合もあるため、IDだけを保持する。
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_assignments')
+    course_id = models.BigIntegerField(verbose_name='授業ID', null=True, blank=True)
+    title = models.CharField(max_length=255, verbose_name='課題タイトル')
+    content = models.TextField(verbose_name='課題詳細', blank=True, null=True)
+    url = models.URLField(max_length=512, verbose_name='課題URL', null=True, blank=True)
+    start_date = models.DateTimeField(verbose_name='開始日時', null=True, blank=True)
+    due_date = models.DateTimeField(verbose_name='提出期限', null=True, blank=True)
+    is_submitted = models.BooleanField(default=False, verbose_name='提出済み')
+    platform = models.CharField(max_length=255, verbose_name='プラットフォーム', blank=True, null=True)
+    created_at = models.DateTimeField(verbose_name='作成日時')
+    updated_at = models.DateTimeField(verbose_name='更新日時')
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name='アーカイブ日時')
+
+    class Meta:
+        ordering = ['due_date']
+
+    def __str__(self):
+        return self.title
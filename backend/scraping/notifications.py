@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import os
+import threading
+
+from django.core.cache import cache
+from django.utils import timezone
+from channels.layers import get_channel_layer
+
+logger = logging.getLogger(__name__)
+
+# 最新の進捗状態をRedisに保持する時間(秒)
+STATUS_TTL_SECONDS = 60 * 60
+
+PLATFORMS = ('moodle', 'webclass')
+
+# 完了扱いとなる状態 (skipped は混雑時にデータが新しいため取得を省略したもの)
+TERMINAL_STATES = ('success', 'failure', 'skipped')
+
+
+def group_name(user_pk):
+    """ユーザーごとのチャンネルグループ名を返す"""
+    return f'scraping_status_user_{user_pk}'
+
+
+def status_cache_key(user_pk, platform):
+    """プラットフォームごとの最新状態を保存するキャッシュキーを返す"""
+    return f'scraping:status:{user_pk}:{platform}'
+
+
+def summary_cache_key(user_pk):
+    """直近のスクレイピング全体の結果を保存するキャッシュキーを返す"""
+    return f'scraping:summary:{user_pk}'
+
+
+class _ChannelLayerBridge:
+    """
+    同期コード(Celeryタスク)からチャンネルレイヤーへ送信するためのブリッジ。
+    プロセスごとに専用スレッドでイベントループを1つだけ動かし、
+    チャンネルレイヤーとRedis接続をメッセージ間で使い回す。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._loop = None
+        self._channel_layer = None
+
+    def _ensure_started(self):
+        # prefork でフォークされた子プロセスでは親のスレッドが存在しないため作り直す
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name='channel-layer-bridge', daemon=True)
+            thread.start()
+            self._loop = loop
+            self._channel_layer = get_channel_layer()
+            self._pid = pid
+
+    def run(self, coro_factory, timeout=5):
+        """チャンネルレイヤーを受け取るコルーチンをブリッジのループで実行し、結果を待つ"""
+        self._ensure_started()
+        future = asyncio.run_coroutine_threadsafe(coro_factory(self._channel_layer), self._loop)
+        return future.result(timeout)
+
+    def group_send(self, group, event, timeout=5):
+        return self.run(lambda layer: layer.group_send(group, event), timeout=timeout)
+
+
+_bridge = _ChannelLayerBridge()
+
+
+def send_status_update(user_pk, message, platform=None, state=None):
+    """
+    進捗メッセージをユーザーのグループへ送信する。
+    プラットフォームが指定された場合は最新状態としてRedisにも保存し、
+    後から接続したクライアントに再送できるようにする。
+    """
+    status = {
+        'platform': platform,
+        'state': state,
+        'message': message,
+        'updated_at': timezone.now().isoformat(),
+    }
+    if platform:
+        try:
+            cache.set(status_cache_key(user_pk, platform), status, STATUS_TTL_SECONDS)
+        except Exception as e:
+            logger.warning(f"進捗状態の保存に失敗しました (user_pk={user_pk}, platform={platform}): {e}")
+
+    try:
+        _bridge.group_send(group_name(user_pk), {'type': 'scraping.update', **status})
+    except Exception as e:
+        logger.warning(f"進捗メッセージの送信に失敗しました (user_pk={user_pk}): {e}")
+
+
+def send_assignment_delta(user_pk, platform, created, updated, removed):
+    """
+    スクレイピングで追加・更新・削除された課題をユーザーのグループへ送信する。
+    クライアントは一覧を再取得せずに手元のデータを更新できる。
+    """
+    try:
+        _bridge.group_send(group_name(user_pk), {
+            'type': 'assignments.delta',
+            'platform': platform,
+            'created': created,
+            'updated': updated,
+            'removed': removed,
+        })
+    except Exception as e:
+        logger.warning(f"課題の差分の送信に失敗しました (user_pk={user_pk}): {e}")
+
+
+def send_reminders(reminders_by_user, timeout=30):
+    """
+    締切のリマインダーをユーザーごとのグループへ送信する。
+    {user_pk: [リマインダー, ...]} をまとめて受け取り、ブリッジのループで並行して送信する。
+
+    Returns:
+        int: 送信に失敗したユーザー数
+    """
+    async def send_all(layer):
+        return await asyncio.gather(*(
+            layer.group_send(group_name(user_pk), {'type': 'assignments.reminder', 'reminders': reminders})
+            for user_pk, reminders in reminders_by_user.items()
+        ), return_exceptions=True)
+
+    try:
+        results = _bridge.run(send_all, timeout=timeout)
+    except Exception as e:
+        logger.warning(f"リマインダーの送信に失敗しました ({len(reminders_by_user)}人): {e}")
+        return len(reminders_by_user)
+    failures = [result for result in results if isinstance(result, Exception)]
+    if failures:
+        logger.warning(f"{len(failures)}人へのリマインダーの送信に失敗しました: {failures[0]}")
+    return len(failures)
+
+
+def send_scrape_summary(user_pk, outcome, platforms):
+    """
+    全プラットフォームのスクレイピング完了後に、全体の結果を1回だけ送信する。
+    outcome は success / partial / failure、platforms はプラットフォームごとの結果。
+    """
+    summary = {
+        'outcome': outcome,
+        'platforms': platforms,
+        'finished_at': timezone.now().isoformat(),
+    }
+    try:
+        cache.set(summary_cache_key(user_pk), summary, STATUS_TTL_SECONDS)
+    except Exception as e:
+        logger.warning(f"スクレイピング結果の保存に失敗しました (user_pk={user_pk}): {e}")
+
+    try:
+        _bridge.group_send(group_name(user_pk), {'type': 'scraping.summary', **summary})
+    except Exception as e:
+        logger.warning(f"スクレイピング結果の送信に失敗しました (user_pk={user_pk}): {e}")
+
+
+def mark_scrape_queued(user_pk, platforms=PLATFORMS, queue_info=None):
+    """
+    スクレイピングをキューに登録した時点の状態を保存する。
+    前回の完了状態が再送されて、取得中の画面が完了扱いになるのを防ぐ。
+    queue_info にはプラットフォームごとの順番と完了までの目安時間を渡す。
+    """
+    queued_at = timezone.now().isoformat()
+    queue_info = queue_info or {}
+    statuses = {}
+    for platform in platforms:
+        info = queue_info.get(platform, {})
+        statuses[status_cache_key(user_pk, platform)] = {
+            'platform': platform,
+            'state': 'queued',
+            'message': '課題情報の取得を待機しています...',
+            'position': info.get('position'),
+            'eta_seconds': info.get('eta_seconds'),
+            'updated_at': queued_at,
+        }
+    try:
+        cache.set_many(statuses, STATUS_TTL_SECONDS)
+    except Exception as e:
+        logger.warning(f"進捗状態の保存に失敗しました (user_pk={user_pk}): {e}")
+
+
+async def aget_last_statuses(user_pk):
+    """ユーザーの各プラットフォームの最新状態を取得する (WebSocket接続時の再送用)"""
+    keys = {status_cache_key(user_pk, platform): platform for platform in PLATFORMS}
+    found = await cache.aget_many(list(keys))
+    return {keys[key]: status for key, status in found.items()}
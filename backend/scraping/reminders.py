@@ -0,0 +1,170 @@
+"""
+締切が近い課題のリマインダー。
+
+Celery beat から定期的に実行し (scraping.task.send_reminders_task)、未提出の課題を締切の範囲で探して
+WebSocketのグループ (設定があればWebhook・メール) へまとめて送信する。
+課題ごとにETA付きのタスクを登録せず、未提出の課題の due_date の部分索引 (assignment_open_due_idx) の範囲検索で対象を求める。
+
+通知のタイミング (REMINDER_OFFSETS_MINUTES) は締切までの時間を区間に分ける。
+例えば 1440,60 なら、締切まで24時間〜1時間の課題に「1440分前」、1時間以内の課題に「60分前」を1回ずつ送る。
+実行が遅れた場合や、締切の直前に課題が追加された場合も、その時点の区間のリマインダーが送られる。
+送信済みのリマインダーは台帳 (AssignmentReminder) に記録し、提出期限が変わった場合は改めて送る。
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import send_mass_mail
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from backend import metrics
+from .models import Assignment, AssignmentReminder
+from .notifications import send_reminders
+
+logger = logging.getLogger(__name__)
+
+# 前回の実行が終わらないうちに次の実行が始まった場合は、後の実行を省略する
+LOCK_KEY = 'reminders:lock'
+LOCK_TIMEOUT_SECONDS = 10 * 60
+
+_FIELDS = ('id', 'user_id', 'user__university_id', 'title', 'url', 'platform', 'due_date', 'course__title')
+
+
+def _buckets(offsets):
+    """通知のタイミングごとの締切までの区間 [(offset, 区間の下限(分)), ...] (大きい順)"""
+    offsets = sorted(set(offsets), reverse=True)
+    return list(zip(offsets, offsets[1:] + [0]))
+
+
+def due_queryset(offset, lower, now):
+    """締切まで lower 分より後・offset 分以内で、offset 分前のリマインダーをまだ送っていない未提出の課題"""
+    sent = AssignmentReminder.objects.filter(
+        assignment=OuterRef('pk'), offset_minutes=offset, due_date=OuterRef('due_date'),
+    )
+    return (
+        Assignment.objects
+        .filter(
+            is_submitted=False,
+            due_date__gt=now + timedelta(minutes=lower),
+            due_date__lte=now + timedelta(minutes=offset),
+        )
+        .filter(~Exists(sent))
+        .order_by('due_date')
+        .values(*_FIELDS)
+    )
+
+
+def _reminder(row, offset):
+    return {
+        'assignment_id': row['id'],
+        'title': row['title'],
+        'course': row['course__title'],
+        'url': row['url'],
+        'platform': row['platform'],
+        'due_date': timezone.localtime(row['due_date']).isoformat(),
+        'offset_minutes': offset,
+    }
+
+
+def _send_webhook(reminders_by_user):
+    url = settings.REMINDER_WEBHOOK_URL
+    if not url:
+        return
+    payload = {
+        'reminders': [
+            {'user_id': user_pk, **reminder}
+            for user_pk, reminders in reminders_by_user.items() for reminder in reminders
+        ],
+    }
+    try:
+        response = requests.post(url, json=payload, timeout=settings.REMINDER_WEBHOOK_TIMEOUT_SECONDS)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logger.warning(f"リマインダーのWebhookへの送信に失敗しました: {e}")
+
+
+def _email(reminders):
+    lines = [
+        f"・{reminder['title']} ({reminder['course'] or '授業不明'}) "
+        f"{datetime.fromisoformat(reminder['due_date']):%m/%d %H:%M}まで"
+        for reminder in reminders
+    ]
+    return '提出期限が近い課題があります', '\n'.join(lines)
+
+
+def _send_email(reminders_by_user, university_ids):
+    """university_ids: {user_pk: 学籍番号} (宛先は「学籍番号@ドメイン」)"""
+    domain = settings.REMINDER_EMAIL_DOMAIN
+    if not domain:
+        return
+    messages = [
+        (*_email(reminders), None, [f'{university_ids[user_pk].lower()}@{domain}'])
+        for user_pk, reminders in reminders_by_user.items()
+    ]
+    try:
+        send_mass_mail(messages)
+    except Exception as e:
+        logger.warning(f"リマインダーのメールの送信に失敗しました ({len(messages)}件): {e}")
+
+
+def _dispatch(rows, offset):
+    """
+    1バッチ分のリマインダーを台帳に記録してから送信する。
+    先に記録するため、送信に失敗した場合も再送はしない (同じ通知を繰り返し送らないことを優先する)。
+    """
+    AssignmentReminder.objects.bulk_create(
+        [AssignmentReminder(assignment_id=row['id'], offset_minutes=offset, due_date=row['due_date']) for row in rows],
+        ignore_conflicts=True,
+    )
+    reminders_by_user = defaultdict(list)
+    university_ids = {}
+    for row in rows:
+        reminders_by_user[row['user_id']].append(_reminder(row, offset))
+        university_ids[row['user_id']] = row['user__university_id']
+    send_reminders(reminders_by_user)
+    _send_webhook(reminders_by_user)
+    _send_email(reminders_by_user, university_ids)
+    metrics.REMINDERS_SENT.inc(len(rows), offset_minutes=offset)
+
+
+def _send_due_reminders(now):
+    # 締切を過ぎた課題の記録は以後の検索に一致しないため削除する
+    AssignmentReminder.objects.filter(due_date__lte=now).delete()
+
+    batch_size = settings.REMINDER_BATCH_SIZE
+    sent = 0
+    for offset, lower in _buckets(settings.REMINDER_OFFSETS_MINUTES):
+        rows = list(due_queryset(offset, lower, now))
+        for start in range(0, len(rows), batch_size):
+            _dispatch(rows[start:start + batch_size], offset)
+        sent += len(rows)
+    return sent
+
+
+def send_due_reminders(now=None):
+    """
+    送るべきリマインダーをすべて送信し、送信した件数を返す。
+    別の実行が進行中の場合や、ロックを取得できない場合は何もせずNoneを返す。
+    """
+    try:
+        locked = cache.add(LOCK_KEY, 1, LOCK_TIMEOUT_SECONDS)
+    except Exception as e:
+        # 台帳の一意制約は記録の重複を防ぐだけで、送信の重複は防げない。実行が重なり得るため今回は省略する
+        # (締切までの区間で対象を求めるため、次回の実行で送られる)
+        logger.warning(f"リマインダーのロックの取得に失敗したため省略します: {e}")
+        return None
+    if not locked:
+        logger.info("前回のリマインダーの送信が実行中のため省略します。")
+        return None
+
+    try:
+        return _send_due_reminders(now or timezone.now())
+    finally:
+        try:
+            cache.delete(LOCK_KEY)
+        except Exception as e:
+            logger.warning(f"リマインダーのロックの解除に失敗しました: {e}")
@@ -1,12 +1,12 @@
 import re
 import logging
 import requests
-from datetime import datetime
-from zoneinfo import ZoneInfo
 from bs4 import BeautifulSoup
 from typing import List, Tuple, Dict, Any, Optional, Type
 from types import TracebackType
 
+from scraping import date_parser
+
 
 class MoodleScraper:
     """Moodleサイトから課題情報をスクレイピングするクラス。
@@ -49,73 +49,6 @@ class MoodleScraper:
             logger.error(f"スクレイピング処理中に予期せぬエラーが発生しました: {e}")
     """
 
-    # 英語の月名を数値に変換するためのマッピング
-    _MONTH_MAP_EN: Dict[str, int] = {
-        'january': 1, 'february': 2, 'march': 3, 'april': 4, 'may': 5, 'june': 6,
-        'july': 7, 'august': 8, 'september': 9, 'october': 10, 'november': 11, 'december': 12
-    }
-
-    # 言語ごとの設定
-    # group_orderで正規表現のキャプチャグループの順序を指定することで、様々な日付形式に対応
-    _DATE_CONFIG: Dict[str, Dict[str, Any]] = {
-        'en': { # English
-            'pattern': re.compile(
-                r'(?:\w+,\s+)?(\d{1,2})\s+(January|February|March|April|May|June|July|August|September|October|November|December)\s+(\d{4}),\s+(\d{1,2}):(\d{2})\s+(AM|PM)',
-                re.IGNORECASE
-            ),
-            'group_order': ['day', 'month_str', 'year', 'hour', 'minute', 'ampm'],
-            'month_map': _MONTH_MAP_EN,
-            'start_keywords': ['Open'],
-            'end_keywords': ['Due', 'Close']
-        },
-        'en_us': { # English(United States)
-            'pattern': re.compile(
-                r'(?:\w+,\s+)?(January|February|March|April|May|June|July|August|September|October|November|December)\s+(\d{1,2}),\s+(\d{4}),\s+(\d{1,2}):(\d{2})\s+(AM|PM)',
-                re.IGNORECASE
-            ),
-            'group_order': ['month_str', 'day', 'year', 'hour', 'minute', 'ampm'],
-            'month_map': _MONTH_MAP_EN,
-            'start_keywords': ['Open'],
-            'end_keywords': ['Due', 'Close']
-        },
-        'vi': { # Vietnamese
-            'pattern': re.compile(
-                r'Thứ\s+\w+,\s*(\d{1,2})\s+tháng\s+(\d{1,2})\s+(\d{4}),\s*(\d{1,2}):(\d{2})\s*(AM|PM)',
-                re.IGNORECASE
-            ),
-            'group_order': ['day', 'month', 'year', 'hour', 'minute', 'ampm'],
-            'start_keywords': ['Open'],
-            'end_keywords': ['Due', 'Close']
-        },
-        'zh_tw': { # 正體中文
-            'pattern': re.compile(r'(\d{4})年\s*(\d{1,2})月\s*(\d{1,2})日.*?(\d{1,2}):(\d{2})'),
-            'group_order': ['year', 'month', 'day', 'hour', 'minute'],
-            'start_keywords': ['開始', '開啟'],
-            'end_keywords': ['到期', '關閉', '結束']
-        },
-        'ja': { # 日本語
-            'pattern': re.compile(r'(\d{4})年\s*(\d{1,2})月\s*(\d{1,2})日.*?(\d{1,2}):(\d{2})'),
-            'group_order': ['year', 'month', 'day', 'hour', 'minute'],
-            'start_keywords': ['開始'],
-            'end_keywords': ['期限', '終了']
-        },
-        'zh_cn': { # 简体中文
-            'pattern': re.compile(r'(\d{4})年\s*(\d{1,2})月\s*(\d{1,2})日.*?(\d{1,2}):(\d{2})'),
-            'group_order': ['year', 'month', 'day', 'hour', 'minute'],
-            'start_keywords': ['打开', '已打开'],
-            'end_keywords': ['到期日', '关闭', '已关闭']
-        },
-        'ko': { # 한국어
-            'pattern': re.compile(
-                r'(?:\w+,\s+)?(\d{1,2})\s+(\d{1,2})월\s+(\d{4}),\s+(\d{1,2}):(\d{2})\s+(AM|PM)',
-                re.IGNORECASE
-            ),
-            'group_order': ['day', 'month', 'year', 'hour', 'minute', 'ampm'],
-            'start_keywords': ['Opened','열기', '열림'],
-            'end_keywords': ['Due','닫기', '닫힘']
-        }
-    }
-
     def __init__(self, username: str, password: str, moodle_login_url: str, logger: logging.Logger):
         """MoodleScraperのコンストラクタ。
 
@@ -129,7 +62,7 @@ class MoodleScraper:
         self.password: str = password
         self.login_url: str = moodle_login_url
         self.home_url: Optional[str] = None
-        self.lang_code: str = 'ja'
+        self.lang_code: Optional[str] = None
         self.logger: logging.Logger = logger
         self.session: requests.Session = requests.Session()
         self.session.headers.update({
@@ -181,7 +114,7 @@ class MoodleScraper:
             if soup.select_one(".usermenu"):
                 self.logger.info("ログインに成功しました。")
                 self.home_url = login_res.url
-                self._extract_lang_code(soup)
+                self.lang_code = self._extract_lang_code(soup)
                 return True
             else:
                 self.logger.error("ログインに失敗しました。ID/Passwordが間違っている可能性があります。")
@@ -365,8 +298,7 @@ class MoodleScraper:
 
             date_div = soup.select_one("div.activity-dates")
             if date_div:
-                date_text = date_div.get_text()
-                date = self._parse_start_end_datetimes(date_text, self.lang_code)
+                date = date_parser.parse_start_end_datetimes(date_parser.element_lines(date_div), self.lang_code)
             else:
                 self.logger.warning(f"URL: {assign_url} で課題期日が見つかりませんでした。")
 
@@ -433,75 +365,18 @@ class MoodleScraper:
             is_submitted = True
         return is_submitted
 
-    @classmethod
-    def _parse_start_end_datetimes(cls, text: str, lang_code: Optional[str], tz_str: str = "Asia/Tokyo") -> Tuple[Optional[datetime], Optional[datetime]]:
-        """日付情報を含む文字列を解析し、開始日時と終了日時のタプルを返します。
-
-        Args:
-            text (str): 解析対象の日付・時刻情報を含むテキスト。
-            lang_code (Optional[str]): 言語コード ('en', 'ja'など)。日付フォーマットの識別に利用。
-            tz_str (str, optional): タイムゾーン文字列。デフォルトは "Asia/Tokyo"。
-
-        Returns:
-            Tuple[Optional[datetime], Optional[datetime]]: (開始日時, 終了日時) のタプル。
-                見つからない場合はNone。
-        """
-        start_dt, end_dt = None, None
-
-        if not lang_code or lang_code not in cls._DATE_CONFIG:
-            lang_code = 'ja'  # デフォルトとして日本語を設定
-
-        config = cls._DATE_CONFIG[lang_code]
-        pattern = config['pattern']
-
-        try:
-            tz = ZoneInfo(tz_str)
-        except Exception:
-            tz = ZoneInfo("UTC")
-
-        for line in text.splitlines():
-            match = pattern.search(line)
-            if not match:
-                continue
-
-            try:
-                parts = dict(zip(config['group_order'], match.groups()))
-                time_parts: Dict[str, int] = {k: int(v) for k, v in parts.items() if v and k in ['year', 'month', 'day', 'hour', 'minute']}
-
-                if 'month_str' in parts and 'month_map' in config and parts['month_str']:
-                    time_parts['month'] = config['month_map'][parts['month_str'].lower()]
-
-                if 'ampm' in parts and parts['ampm']:
-                    hour = time_parts.get('hour', 0)
-                    if parts['ampm'].lower() == 'pm' and hour != 12:
-                        hour += 12
-                    elif parts['ampm'].lower() == 'am' and hour == 12:
-                        hour = 0
-                    time_parts['hour'] = hour
-
-                naive_dt = datetime(**time_parts)
-                aware_dt = naive_dt.replace(tzinfo=tz)
-
-                if any(keyword in line for keyword in config['start_keywords']):
-                    start_dt = aware_dt
-                elif any(keyword in line for keyword in config['end_keywords']):
-                    end_dt = aware_dt
-            except (ValueError, KeyError, TypeError) as e:
-                logging.warning(f"日付の解析に失敗しました: {line.strip()}, lang: {lang_code}, error: {e}")
-                continue
-
-        return (start_dt, end_dt)
-
-    def _extract_lang_code(self, soup: BeautifulSoup) -> str:
+    def _extract_lang_code(self, soup: BeautifulSoup) -> Optional[str]:
         """テキストから括弧で囲まれた言語コード (例: "(ja)") を抽出します。
 
         Args:
             soup (BeautifulSoup): 解析対象のページのBeautifulSoupオブジェクト。
 
         Returns:
-            str: 見つかった言語コード。複数ある場合は最後のものを返す。見つからない場合は日本語。
+            Optional[str]: 見つかった言語コード。複数ある場合は最後のものを返す。
+                見つからない場合はNone (課題ページの本文から推定する)。
         """
         # 言語コードの特定
+        lang_text = ''
         lang_div = soup.select_one("div.container-fluid a.dropdown-toggle.nav-link")
         if lang_div:
             lang_text = lang_div.text
@@ -513,8 +388,8 @@ class MoodleScraper:
         if matches:
             # 複数マッチした場合、最後のものを言語コードとみなして返す
             self.logger.info(f"特定された言語コードは{matches[-1]}です。")
-            return matches[-1]
+            return date_parser.normalize_lang_code(matches[-1])
         else:
-            # マッチするものが一つもなければ日本語を適用
-            self.logger.warning(f"言語コードが見つかりませんでした。日本語を適用します。")
-            return 'ja'
\ No newline at end of file
+            # マッチするものが一つもなければ課題ページの本文から推定する
+            self.logger.warning(f"言語コードが見つかりませんでした。課題ページの本文から推定します。")
+            return None
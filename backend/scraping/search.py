@@ -0,0 +1,65 @@
+"""
+課題のタイトルと詳細の全文検索。
+
+SQLiteではFTS5の索引 (scraping_assignment_fts, trigramトークナイザ) で絞り込み、bm25で関連度順に並べる。
+trigramは3文字未満の語を検索できないため、短い語はLIKEで絞り込む。
+APIの検索 (/api/assignments/search/) と管理画面の検索で共有する。
+"""
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'scraping_assignment_fts'
+# trigramトークナイザで索引できる最短の語の長さ
+MIN_FTS_TERM_LENGTH = 3
+# bm25の列ごとの重み (タイトル, 詳細)。タイトルに含まれる課題を上位にする
+BM25_WEIGHTS = (10.0, 1.0)
+
+_MATCH_SQL = f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+_RANK_SQL = (
+    f'SELECT bm25({FTS_TABLE}, {BM25_WEIGHTS[0]}, {BM25_WEIGHTS[1]}) FROM {FTS_TABLE} '
+    f'WHERE {FTS_TABLE} MATCH %s AND rowid = scraping_assignment.id'
+)
+
+
+def _fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def _match_expression(terms):
+    """語をそれぞれフレーズとして引用し、すべてを含む (AND) FTS5の検索式を作る"""
+    return ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+
+def search_queryset(queryset, query):
+    """
+    課題のクエリセットを検索語で絞り込む。
+
+    Args:
+        queryset: Assignmentのクエリセット。
+        query: 空白区切りの検索語 (すべてを含む課題を返す)。
+
+    Returns:
+        (QuerySet, bool): 絞り込んだクエリセットと、関連度順 (rank) に並べたかどうか。
+    """
+    terms = query.split()
+    if _fts_available():
+        fts_terms = [term for term in terms if len(term) >= MIN_FTS_TERM_LENGTH]
+        like_terms = [term for term in terms if len(term) < MIN_FTS_TERM_LENGTH]
+    else:
+        fts_terms, like_terms = [], terms
+
+    for term in like_terms:
+        queryset = queryset.filter(Q(title__icontains=term) | Q(content__icontains=term))
+
+    if not fts_terms:
+        return queryset, False
+
+    expression = _match_expression(fts_terms)
+    queryset = (
+        queryset
+        .filter(pk__in=RawSQL(_MATCH_SQL, [expression]))
+        .annotate(rank=RawSQL(_RANK_SQL, [expression]))
+        .order_by('rank', 'due_date')
+    )
+    return queryset, True
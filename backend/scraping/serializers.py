@@ -1,14 +1,131 @@
-from rest_framework import serializers
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
 from .models import Assignment, Course
 
 
-class AssignmentSerializer(serializers.ModelSerializer):
+def _split_fields(value):
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+def selected_fields(serializer_class, params):
+    """
+    クエリパラメータの ?fields= (出力するフィールド) と ?omit= (除くフィールド) から、
+    出力するフィールド名のリストを求める。どちらも指定がなければNoneを返す。
+    存在しないフィールドが指定された場合はValueErrorを送出する。
+    """
+    fields = _split_fields(params.get('fields'))
+    omit = _split_fields(params.get('omit'))
+    if not fields and not omit:
+        return None
+    available = serializer_class.Meta.fields
+    unknown = sorted(set(fields + omit) - set(available))
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}.")
+    return [name for name in available if (not fields or name in fields) and name not in omit]
+
+
+class FieldSelectionMixin:
+    """fields= で出力するフィールドを絞り込めるシリアライザ (selected_fields と組み合わせて使う)"""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class AssignmentSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     class Meta:
         model = Assignment
         fields = ['id', 'user', 'course', 'title', 'content', 'url', 'due_date', 'is_submitted']
         read_only_fields = ['id', 'user']
 
-class CourseSerializer(serializers.ModelSerializer):
+# to_representation を呼ばなくても .values() の値がそのまま出力と一致するフィールド
+_PASSTHROUGH_FIELDS = (
+    serializers.IntegerField, serializers.BooleanField, serializers.CharField,
+    serializers.ChoiceField, serializers.PrimaryKeyRelatedField,
+)
+
+
+def _iso_datetime_converter(field):
+    """
+    DateTimeField.to_representation (ISO 8601) と同じ変換を行う関数を返す。
+    DRFは値ごとに現在のタイムゾーンを取得し直して遅いため、呼び出しごとに1回だけ取得する。
+    """
+    tz = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if tz is None:
+        return field.to_representation
+
+    def convert(value):
+        if value.tzinfo is None:
+            return field.to_representation(value)
+        value = value.astimezone(tz).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+class ValuesReader:
+    """
+    ModelSerializer (FieldSelectionMixinを使うもの) と同じ出力を、.values() の行から作る読み取り専用の高速版。
+    行ごとにシリアライザやモデルのインスタンスを作らず、変換が必要なフィールド (日時など) だけ変換する。
+    出力が一致することは scraping.tests の ValuesReaderParityTests で確認している。
+    """
+
+    def __init__(self, serializer_class, fields=None):
+        serializer = serializer_class(fields=fields)
+        opts = serializer_class.Meta.model._meta
+        # (出力名, .values() のキー, フィールド)
+        self.columns = [
+            (name, opts.get_field(field.source).attname, field)
+            for name, field in serializer.fields.items()
+        ]
+        self.keys = [key for _, key, _ in self.columns]
+
+    def values(self, queryset):
+        """出力に必要な列だけを取得するクエリセットを返す"""
+        return queryset.values(*self.keys)
+
+    def _converters(self):
+        converters = []
+        for name, key, field in self.columns:
+            if isinstance(field, _PASSTHROUGH_FIELDS):
+                convert = None
+            elif isinstance(field, serializers.DateTimeField) and \
+                    getattr(field, 'format', api_settings.DATETIME_FORMAT).lower() == ISO_8601:
+                convert = _iso_datetime_converter(field)
+            else:
+                convert = field.to_representation
+            converters.append((name, key, convert))
+        return converters
+
+    def to_representation(self, row, converters=None):
+        data = {}
+        for name, key, convert in converters or self._converters():
+            value = row[key]
+            data[name] = value if convert is None or value is None else convert(value)
+        return data
+
+    def to_representation_many(self, rows):
+        converters = self._converters()
+        return [self.to_representation(row, converters) for row in rows]
+
+
+class AssignmentBulkUpdateSerializer(serializers.ModelSerializer):
+    """一括更新の1件分 (id と変更するフィールドのみ)"""
+    id = serializers.IntegerField()
+
+    class Meta:
+        model = Assignment
+        fields = ['id', 'title', 'content', 'url', 'due_date', 'is_submitted']
+        extra_kwargs = {field: {'required': False} for field in fields if field != 'id'}
+
+class UpcomingAssignmentSerializer(FieldSelectionMixin, serializers.ModelSerializer):
+    """締切が近い課題の一覧用 (索引に保存するため課題本文を含めない)"""
+    class Meta:
+        model = Assignment
+        fields = ['id', 'user', 'course', 'title', 'url', 'due_date', 'is_submitted']
+
+class CourseSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     class Meta:
         model = Course
         fields = ['id', 'user', 'title', 'day_of_week', 'period']
\ No newline at end of file
@@ -2,34 +2,124 @@ import os
 import logging
 from dotenv import load_dotenv
 
-# ScrapyのCrawlerProcessとSettingsをインポート
-from scrapy.crawler import CrawlerProcess
+from django.utils import timezone
+
+# ScrapyのSettingsをインポート
 from scrapy.settings import Settings
 from scrapy import signals
 
 # Djangoのモデルと、作成したScrapyの設定モジュールをインポート
 from accounts.models import User
+from backend import metrics
+from .models import Assignment, ScrapeRun
+from .serializers import AssignmentSerializer
+from .notifications import send_assignment_delta
+from . import admission, data_version, freshness, upcoming
 from .crawlers import settings as crawler_settings_module
+from .crawlers.runner import run_crawl
 from .crawlers.spiders.moodle_spider import MoodleSpider
-from .crawlers.spiders.webclass_spider import WebclassSpider, LogoutException
+from .crawlers.spiders.webclass_spider import WebclassSpider, LogoutException, LOGOUT_CLOSE_REASON
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
-def _run_spider(spider_cls, user: User, password: str, login_url: str):
+def _snapshot_assignments(user: User, platform: str):
+    """
+    ユーザーとプラットフォームに紐づく課題の現在値を {id: 値の辞書} で取得する。
+    """
+    rows = Assignment.objects.filter(user=user, platform=platform).values(*AssignmentSerializer.Meta.fields)
+    return {row['id']: row for row in rows}
+
+
+def _push_assignment_delta(user: User, platform: str, before: dict):
+    """
+    スクレイピング前後の課題を比較し、追加・更新・削除された課題をクライアントへ送信する。
+    """
+    after = _snapshot_assignments(user, platform)
+    created_ids = [pk for pk in after if pk not in before]
+    updated_ids = [pk for pk, row in after.items() if pk in before and before[pk] != row]
+    removed_ids = [pk for pk in before if pk not in after]
+
+    if not (created_ids or updated_ids or removed_ids):
+        logger.info(f"ユーザー'{user.university_id}'の{platform}の課題に変更はありませんでした。")
+        return
+
+    # 締切が近い課題の索引を作り直し、データの版数を増やす
+    upcoming.rebuild(user.pk)
+    data_version.bump(user.pk)
+
+    changed = Assignment.objects.filter(pk__in=created_ids + updated_ids)
+    data = {row['id']: dict(row) for row in AssignmentSerializer(changed, many=True).data}
+    send_assignment_delta(
+        user.pk,
+        platform,
+        created=[data[pk] for pk in created_ids if pk in data],
+        updated=[data[pk] for pk in updated_ids if pk in data],
+        removed=removed_ids,
+    )
+    logger.info(
+        f"ユーザー'{user.university_id}'の{platform}の差分を送信しました "
+        f"(追加: {len(created_ids)}, 更新: {len(updated_ids)}, 削除: {len(removed_ids)})"
+    )
+
+
+def _finish_scrape_run(run: ScrapeRun, stats: dict, error: Exception = None):
+    """
+    クロールの統計情報と結果をScrapeRunに記録する。
+    """
+    run.finished_at = timezone.now()
+    run.duration = (run.finished_at - run.started_at).total_seconds()
+    run.request_count = stats.get('downloader/request_count', 0)
+    run.item_count = stats.get('item_scraped_count', 0)
+    run.bytes_downloaded = stats.get('downloader/response_bytes', 0)
+    run.finish_reason = stats.get('finish_reason')
+    run.status = 'failure' if error else 'success'
+    run.failure_reason = str(error) if error else None
+    try:
+        run.save()
+    except Exception as e:
+        logger.warning(f"ScrapeRun(id={run.pk})の記録に失敗しました: {e}")
+
+    # 待ち時間の目安は成功したクロールの所要時間から求める
+    if not error:
+        admission.record_duration(run.platform, run.duration)
+        freshness.record_success(run.user_id, run.platform, run.finished_at)
+
+
+def _run_spider(spider_cls, user: User, password: str, login_url: str, task_id: str = None, retries: int = 0,
+                spider_kwargs: dict = None):
     """
-    指定されたSpiderをCrawlerProcessで実行し、終了ステータスを監視する共通関数
+    指定されたSpiderをワーカー内のreactorで実行し、終了ステータスを監視する共通関数
     """
     if not login_url:
         msg = f"環境変数で {spider_cls.name} のURLが設定されていません。"
         logger.error(msg)
         raise ValueError(msg)
 
+    # 実行記録 (所要時間や取得件数の推移を管理画面で確認するため)
+    run = ScrapeRun.objects.create(
+        user=user,
+        platform=spider_cls.name,
+        task_id=task_id,
+        retries=retries,
+        started_at=timezone.now(),
+    )
+    freshness.record_started(user.pk, spider_cls.name, run.started_at)
+    stats = {}
+
     # スパイダーの失敗理由を記録するためのリスト
     failures = []
+    close_reasons = []
+
+    # レスポンスごとのダウンロード時間を記録するリスト
+    latencies = []
+
+    def response_received(response, request, spider):
+        latencies.append(request.meta.get('download_latency'))
 
     # スパイダーが閉じたときに呼び出される関数
     def spider_closed(spider, reason):
+        close_reasons.append(reason)
         # 'finished' は正常終了を意味する
         if reason != 'finished':
             # 正常終了以外の場合、失敗理由をリストに追加
@@ -40,48 +130,68 @@ def _run_spider(spider_cls, user: User, password: str, login_url: str):
     try:
         settings = Settings()
         settings.setmodule(crawler_settings_module, priority='project')
-        
-        process = CrawlerProcess(settings, install_root_handler=False)
-        
-        crawler = process.create_crawler(spider_cls)
-        
-        crawler.signals.connect(spider_closed, signal=signals.spider_closed)
-
-        process.crawl(
-            crawler,
-            user_pk=user.pk,
-            password=password,
-            login_url=login_url
-        )
-        
-        process.start() # スパイダーの実行完了までブロック
+
+        # 失敗した場合も統計情報を記録できるよう、作成されたCrawlerを保持する
+        crawlers = []
+
+        def setup(crawler):
+            crawler.signals.connect(spider_closed, signal=signals.spider_closed)
+            crawler.signals.connect(response_received, signal=signals.response_received)
+            crawlers.append(crawler)
+
+        # 差分計算のため、実行前の課題を記録しておく
+        before = _snapshot_assignments(user, spider_cls.name)
+
+        try:
+            # ワーカー内で動き続けるreactorでクロールし、完了までブロック
+            run_crawl(
+                settings, spider_cls, setup=setup,
+                user_pk=user.pk, password=password, login_url=login_url, **(spider_kwargs or {}),
+            )
+        finally:
+            if crawlers:
+                stats = crawlers[0].stats.get_stats()
+                metrics.record_crawl(spider_cls.name, stats, latencies)
+
+            # 途中で失敗した場合も、保存済みの課題はクライアントへ反映する
+            try:
+                _push_assignment_delta(user, spider_cls.name, before)
+            except Exception as e:
+                logger.warning(f"'{user.university_id}'の{spider_cls.name}の差分送信に失敗しました: {e}")
 
         # 実行後、failuresリストに何か入っていれば例外を送出
         if failures:
-            if any("LogoutException" in reason for reason in failures):
+            if LOGOUT_CLOSE_REASON in close_reasons:
                 raise LogoutException("WebClassからログアウトされました。再試行します。")
             raise RuntimeError("Scrapy process failed: " + "; ".join(failures))
 
     except Exception as e:
         logger.error(f"'{user.university_id}'の{spider_cls.name}スクレイピング中にエラー: {e}", exc_info=True)
+        _finish_scrape_run(run, stats, error=e)
         raise e
 
+    _finish_scrape_run(run, stats)
+
 
-def scrape_moodle(user: User, password: str):
+def scrape_moodle(user: User, password: str, task_id: str = None, retries: int = 0):
     """
     MoodleSpiderを実行する。
     """
     logger.info(f"ユーザー'{user.university_id}'のMoodleスクレイピング処理を開始します (Spider版)。")
     login_url = os.getenv('MOODLE_LOGIN_URL')
-    _run_spider(MoodleSpider, user, password, login_url)
+    _run_spider(MoodleSpider, user, password, login_url, task_id=task_id, retries=retries)
     logger.info(f"ユーザー'{user.university_id}'のMoodleスクレイピング処理が完了しました。")
 
 
-def scrape_webclass(user: User, password: str):
+def scrape_webclass(user: User, password: str, task_id: str = None, retries: int = 0):
     """
     WebclassSpiderを実行する。
     """
     logger.info(f"ユーザー'{user.university_id}'のWebClassスクレイピング処理を開始します (Spider版)。")
     login_url = os.getenv('WEBCLASS_LOGIN_URL')
-    _run_spider(WebclassSpider, user, password, login_url)
+    # 再試行では、ログアウト前に取得済みのコースを飛ばして続きから取得する
+    _run_spider(
+        WebclassSpider, user, password, login_url, task_id=task_id, retries=retries,
+        spider_kwargs={'resume': retries > 0},
+    )
     logger.info(f"ユーザー'{user.university_id}'のWebClassスクレイピング処理が完了しました。")
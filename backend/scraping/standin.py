@@ -0,0 +1,300 @@
+"""
+ベンチマーク・負荷試験用の Moodle / WebClass スタンドインサーバー。
+
+実際のLMSと同じセレクタで解析できる合成ページをローカルのHTTPサーバーで返す。
+全ユーザーが同じコースを履修している想定で、提出状況のみユーザーごとに変わる。
+"""
+import re
+import threading
+import zlib
+from dataclasses import dataclass
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+@dataclass
+class StandInConfig:
+    """合成するコース・課題の構成"""
+    courses: int = 10
+    assignments_per_course: int = 5
+    # タブ形式のコースの割合 (0.0〜1.0)
+    tab_ratio: float = 0.3
+    # 課題のうち小テストにする割合 (0.0〜1.0)
+    quiz_ratio: float = 0.2
+    # 提出済みにする割合 (0.0〜1.0)
+    submitted_ratio: float = 0.5
+    tabs_per_course: int = 3
+    description_bytes: int = 2000
+    # レスポンスを返すまでの人工的な遅延 (秒)
+    latency: float = 0.0
+
+
+def _is_submitted(username, module_id, ratio):
+    # ユーザーと課題の組み合わせから決定的に提出状況を決める
+    return (zlib.crc32(f'{username}:{module_id}'.encode()) % 1000) < ratio * 1000
+
+
+def _page(body, title='Stand-in LMS'):
+    return f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{escape(title)}</title></head><body>{body}</body></html>'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'StandInLMS/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        # アクセスログはベンチマーク結果の妨げになるため出力しない
+        pass
+
+    @property
+    def lms(self):
+        return self.server.lms
+
+    def _send(self, body, status=200, headers=None):
+        if self.lms.config.latency:
+            threading.Event().wait(self.lms.config.latency)
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _username(self):
+        match = re.search(r'standin_user=([^;]+)', self.headers.get('Cookie', ''))
+        return match.group(1) if match else 'anonymous'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        routes = {
+            '/login/index.php': lambda: self._send(self.lms.moodle_login_page()),
+            '/my/': lambda: self._send(self.lms.moodle_home_page()),
+            '/course/view.php': lambda: self._send(self.lms.moodle_course_page(int(query['id'][0]), query.get('section', [None])[0])),
+            '/mod/assign/view.php': lambda: self._send(self.lms.moodle_module_page(int(query['id'][0]), self._username())),
+            '/mod/quiz/view.php': lambda: self._send(self.lms.moodle_module_page(int(query['id'][0]), self._username())),
+            '/webclass/login.php': lambda: self._send(self.lms.webclass_login_page()),
+            '/webclass/dashboard': lambda: self._send(self.lms.webclass_dashboard_page(self._username())),
+            '/webclass/course.php': lambda: self._send(self.lms.webclass_course_page(int(query['id'][0]))),
+        }
+        route = routes.get(url.path)
+        if route is None:
+            self._send(_page('<p>Not Found</p>'), status=404)
+            return
+        try:
+            route()
+        except (KeyError, ValueError, IndexError):
+            self._send(_page('<p>Bad Request</p>'), status=400)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        username = form.get('username', ['anonymous'])[0]
+        cookie = {'Set-Cookie': f'standin_user={username}; Path=/'}
+
+        path = urlparse(self.path).path
+        if path == '/login/index.php':
+            if form.get('logintoken', [''])[0] != self.lms.LOGIN_TOKEN:
+                self._send(self.lms.moodle_login_page(error=True))
+                return
+            self._send('', status=303, headers={'Location': '/my/', **cookie})
+        elif path == '/webclass/login.php':
+            self._send(self.lms.webclass_home_page(), headers=cookie)
+        else:
+            self._send(_page('<p>Not Found</p>'), status=404)
+
+
+class StandInLMS:
+    """
+    Moodle と WebClass の合成ページを返すローカルサーバー。
+
+    Example:
+        with StandInLMS(StandInConfig(courses=20)) as lms:
+            run_spider(login_url=lms.moodle_login_url)
+    """
+    LOGIN_TOKEN = 'standin-logintoken'
+
+    def __init__(self, config=None, host='127.0.0.1', port=0, public_host=None):
+        self.config = config or StandInConfig()
+        # クローラーから見たホスト名 (コンテナから接続する場合など、待ち受けアドレスと異なるとき)
+        self.public_host = public_host
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.lms = self
+        self._thread = None
+
+    # --- サーバーの起動・停止 ---
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{self.public_host or host}:{port}'
+
+    @property
+    def moodle_login_url(self):
+        return f'{self.base_url}/login/index.php'
+
+    @property
+    def webclass_login_url(self):
+        return f'{self.base_url}/webclass/login.php'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='standin-lms', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    # --- 合成データ ---
+    def course_title(self, course_id):
+        return f'ベンチマーク授業{course_id:03d}'
+
+    def is_tab_course(self, course_id):
+        return course_id < round(self.config.courses * self.config.tab_ratio)
+
+    def module_ids(self, course_id):
+        first = course_id * self.config.assignments_per_course
+        return range(first, first + self.config.assignments_per_course)
+
+    def is_quiz(self, module_id):
+        per = self.config.assignments_per_course
+        return (module_id % per) < round(per * self.config.quiz_ratio)
+
+    def module_title(self, module_id):
+        kind = '小テスト' if self.is_quiz(module_id) else '課題'
+        return f'{kind}{module_id:05d}'
+
+    def expected_items(self, users=1):
+        """全ユーザー分のクロールで得られるはずの課題数"""
+        return users * self.config.courses * self.config.assignments_per_course
+
+    # --- Moodle ---
+    def moodle_login_page(self, error=False):
+        alert = '<div class="alert-danger">Invalid login</div>' if error else ''
+        return _page(f'''
+            {alert}
+            <form action="/login/index.php" method="post" id="login">
+              <input type="hidden" name="logintoken" value="{self.LOGIN_TOKEN}">
+              <input type="text" name="username">
+              <input type="password" name="password">
+              <button type="submit">Log in</button>
+            </form>''')
+
+    def moodle_home_page(self):
+        links = ''.join(
+            f'<li><a href="/course/view.php?id={course_id}">{escape(self.course_title(course_id))}</a></li>'
+            for course_id in range(self.config.courses)
+        )
+        return _page(f'''
+            <div class="container-fluid"><a class="dropdown-toggle nav-link" href="#">日本語 (ja)</a></div>
+            <div class="usermenu">Stand-in User</div>
+            <section data-block="course_list"><ul class="unlist">{links}</ul></section>''')
+
+    def _moodle_module_links(self, module_ids):
+        items = []
+        for module_id in module_ids:
+            modtype = 'quiz' if self.is_quiz(module_id) else 'assign'
+            items.append(
+                f'<li class="activity modtype_{modtype}">'
+                f'<a class="aalink" href="/mod/{modtype}/view.php?id={module_id}">{escape(self.module_title(module_id))}</a></li>'
+            )
+        return ''.join(items)
+
+    def moodle_course_page(self, course_id, section=None):
+        if course_id >= self.config.courses:
+            raise KeyError(course_id)
+        module_ids = list(self.module_ids(course_id))
+        if not self.is_tab_course(course_id):
+            return _page(f'<ul data-for="course_sectionlist">{self._moodle_module_links(module_ids)}</ul>')
+
+        tabs = self.config.tabs_per_course
+        current = int(section) if section is not None else 0
+        tab_links = ''.join(
+            f'<a class="nav-link{" active" if i == current else ""}" title="タブ{i}" '
+            f'href="/course/view.php?id={course_id}&amp;section={i}">タブ{i}</a>'
+            for i in range(tabs)
+        )
+        modules_in_tab = [m for i, m in enumerate(module_ids) if i % tabs == current]
+        return _page(f'''
+            <div id="tabs-tree-start"></div>
+            <div class="tabs-wrapper">{tab_links}</div>
+            <ul>{self._moodle_module_links(modules_in_tab)}</ul>''')
+
+    def moodle_module_page(self, module_id, username):
+        title = self.module_title(module_id)
+        submitted = _is_submitted(username, module_id, self.config.submitted_ratio)
+        if self.is_quiz(module_id):
+            status = '<div id="feedback">Finished</div>' if submitted else ''
+        else:
+            cell = 'submissionstatussubmitted' if submitted else 'submissionstatusnew'
+            status = f'<div class="submissionstatustable"><table><tr><td class="{cell}">status</td></tr></table></div>'
+        description = ('これはベンチマーク用の課題説明です。' * (self.config.description_bytes // 48 + 1))[:self.config.description_bytes // 3]
+        return _page(f'''
+            <div class="activity-information" data-activityname="{escape(title)}"></div>
+            <div class="activity-dates">
+              <div><strong>開始:</strong> 2025年4月1日(火曜日) 0:00</div>
+              <div><strong>期限:</strong> 2099年12月31日(木曜日) 23:59</div>
+            </div>
+            <div class="activity-description"><p>{description}</p></div>
+            {status}''')
+
+    # --- WebClass ---
+    def webclass_login_page(self):
+        return _page('''
+            <form action="/webclass/login.php" method="post">
+              <input type="text" id="username" name="username">
+              <input type="password" id="password" name="password">
+              <input type="submit" id="LoginBtn" value="ログイン">
+            </form>''')
+
+    def webclass_home_page(self):
+        courses = ''.join(
+            f'<a href="/webclass/course.php?id={course_id}">» {escape(self.course_title(course_id))}</a>'
+            for course_id in range(self.config.courses)
+        )
+        return _page(f'''
+            <a href="/webclass/logout.php">ログアウト</a>
+            <a href="/webclass/dashboard">» ダッシュボード</a>
+            <div id="schedule-table">{courses}</div>''')
+
+    def webclass_dashboard_page(self, username):
+        blocks = []
+        for course_id in range(self.config.courses):
+            rows = ''.join(
+                f'<tr><td>{escape(self.module_title(m))}</td><td>2099/12/31 23:59</td>'
+                f'<td>{"2025/04/10 12:00" if _is_submitted(username, m, self.config.submitted_ratio) else "-"}</td>'
+                f'<td>-</td><td>-</td></tr>'
+                for m in self.module_ids(course_id)
+            )
+            blocks.append(f'''
+                <div class="course">
+                  <div><a class="font-semibold" target="course" href="{self.base_url}/webclass/course.php?id={course_id}">{escape(self.course_title(course_id))}</a></div>
+                  <table>
+                    <thead><tr><th>教材</th><th>締切</th><th>実施日</th><th>最高点</th><th>状態</th></tr></thead>
+                    <tbody>{rows}</tbody>
+                  </table>
+                </div>''')
+        return _page(f'<main role="main">{"".join(blocks)}</main>')
+
+    def webclass_course_page(self, course_id):
+        if course_id >= self.config.courses:
+            raise KeyError(course_id)
+        contents = ''.join(
+            f'''<div class="cl-contentsList_content">
+                  <div class="cl-contentsList_categoryLabel">{"テスト" if self.is_quiz(m) else "レポート"}</div>
+                  <h4 class="cm-contentsList_contentName"><a href="{self.base_url}/webclass/do_contents.php?id={m}">{escape(self.module_title(m))}</a></h4>
+                  <div class="cl-contentsList_contentInfo"><div class="cm-contentsList_contentDetailListItemData">2025/04/01 00:00 - 2099/12/31 23:59</div></div>
+                </div>'''
+            for m in self.module_ids(course_id)
+        )
+        return _page(contents)
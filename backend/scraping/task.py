@@ -1,70 +1,157 @@
-from celery import shared_task, group
+from celery import shared_task, group, chord
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
 import logging
 from accounts.models import User
+from backend import metrics
 from .services import scrape_moodle, scrape_webclass
 from .crawlers.spiders.webclass_spider import LogoutException
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from .notifications import send_status_update, send_scrape_summary, PLATFORMS
+from . import admission, archive, reminders
 
 logger = logging.getLogger(__name__)
 
-def send_status_update(user_pk, message):
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
-        f'scraping_status_user_{user_pk}',
-        {
-            'type': 'scraping.update',
-            'message': message
-        }
-    )
+# WebClassでログアウトを検知した場合の再試行回数
+WEBCLASS_MAX_RETRIES = 3
 
 
-@shared_task(bind=True)
+@shared_task(
+    bind=True,
+    soft_time_limit=settings.SCRAPE_TIME_LIMITS['webclass']['soft'],
+    time_limit=settings.SCRAPE_TIME_LIMITS['webclass']['hard'],
+)
 def scrape_webclass_task(self, user_pk, password):
     """WebClassのスクレイピングを単体で実行し、完了を通知するタスク"""
     user = User.objects.get(pk=user_pk)
+    admission.mark_started(user_pk, 'webclass')
+    send_status_update(user_pk, 'WebClassの課題取得を開始しました。', platform='webclass', state='running')
     try:
-        scrape_webclass(user, password)
-        send_status_update(user_pk, 'WebClassの課題取得が完了しました。')
+        scrape_webclass(user, password, task_id=self.request.id, retries=self.request.retries)
+        send_status_update(user_pk, 'WebClassの課題取得が完了しました。', platform='webclass', state='success')
         return {'status': 'success', 'platform': 'WebClass'} 
     except LogoutException as e:
-        logger.warning(f"WebClassでログアウトを検知。再試行します... (試行回数: {self.request.retries + 1}/{self.max_retries})")
-        send_status_update(user_pk, 'WebClassでログアウトが検知されたため、60秒後に再試行します...')
+        if self.request.retries >= WEBCLASS_MAX_RETRIES:
+            # 再試行の上限に達した場合は失敗として返し、chordのコールバックに結果を渡す
+            logger.error(f"WebClassでログアウトが繰り返し検知されたため、再試行を中止します (user_pk={user_pk})")
+            send_status_update(user_pk, 'WebClassの課題取得中にエラーが発生しました。', platform='webclass', state='failure')
+            return {'status': 'failure', 'platform': 'WebClass', 'error': str(e)}
+        logger.warning(f"WebClassでログアウトを検知。再試行します... (試行回数: {self.request.retries + 1}/{WEBCLASS_MAX_RETRIES})")
+        send_status_update(user_pk, 'WebClassでログアウトが検知されたため、残りのコースの取得を再試行します...', platform='webclass', state='retrying')
         # countdown秒後に再試行、max_retries回まで
-        raise self.retry(exc=e, countdown=1, max_retries=3)
+        raise self.retry(exc=e, countdown=1, max_retries=WEBCLASS_MAX_RETRIES)
+    except SoftTimeLimitExceeded:
+        logger.warning(f"WebClassスクレイピングが時間制限を超えました (user_pk={user_pk})")
+        send_status_update(user_pk, 'WebClassの課題取得が時間内に完了しなかったため、取得済みの課題のみ反映しました。', platform='webclass', state='failure')
+        return {'status': 'timeout', 'platform': 'WebClass'}
     except Exception as e:
         logger.error(f"WebClassスクレイピング中にエラー: {e}", exc_info=True)
-        send_status_update(user_pk, 'WebClassの課題取得中にエラーが発生しました。')
+        send_status_update(user_pk, 'WebClassの課題取得中にエラーが発生しました。', platform='webclass', state='failure')
         return {'status': 'failure', 'platform': 'WebClass', 'error': str(e)}
 
 
-@shared_task
-def scrape_moodle_task(user_pk, password):
+@shared_task(
+    bind=True,
+    soft_time_limit=settings.SCRAPE_TIME_LIMITS['moodle']['soft'],
+    time_limit=settings.SCRAPE_TIME_LIMITS['moodle']['hard'],
+)
+def scrape_moodle_task(self, user_pk, password):
     """Moodleのスクレイピングを単体で実行し、完了を通知するタスク"""
     user = User.objects.get(pk=user_pk)
+    admission.mark_started(user_pk, 'moodle')
+    send_status_update(user_pk, 'Moodleの課題取得を開始しました。', platform='moodle', state='running')
     try:
-        scrape_moodle(user, password)
-        send_status_update(user_pk, 'Moodleの課題取得が完了しました。')
+        scrape_moodle(user, password, task_id=self.request.id, retries=self.request.retries)
+        send_status_update(user_pk, 'Moodleの課題取得が完了しました。', platform='moodle', state='success')
         return {'status': 'success', 'platform': 'Moodle'}
+    except SoftTimeLimitExceeded:
+        logger.warning(f"Moodleスクレイピングが時間制限を超えました (user_pk={user_pk})")
+        send_status_update(user_pk, 'Moodleの課題取得が時間内に完了しなかったため、取得済みの課題のみ反映しました。', platform='moodle', state='failure')
+        return {'status': 'timeout', 'platform': 'Moodle'}
     except Exception as e:
         logger.error(f"Moodleスクレイピング中にエラー: {e}", exc_info=True)
-        send_status_update(user_pk, 'Moodleの課題取得中にエラーが発生しました。')
+        send_status_update(user_pk, 'Moodleの課題取得中にエラーが発生しました。', platform='moodle', state='failure')
         return {'status': 'failure', 'platform': 'Moodle', 'error': str(e)}
 
 
+def _summarize(platform_statuses):
+    """プラットフォームごとの結果から全体の結果 (success / partial / failure) を求める"""
+    succeeded = [status == 'success' for status in platform_statuses.values()]
+    if all(succeeded):
+        return 'success'
+    if any(succeeded):
+        return 'partial'
+    return 'failure'
+
+
+@shared_task
+def scrape_summary_task(results, user_pk):
+    """
+    chordのコールバック。各プラットフォームの結果をまとめて記録し、最終的な完了通知を1回だけ送る。
+    """
+    platforms = {result['platform'].lower(): result['status'] for result in results if result}
+    outcome = _summarize(platforms)
+    metrics.SCRAPE_OUTCOMES.inc(outcome=outcome)
+    logger.info(f"スクレイピングが完了しました (user_pk={user_pk}, outcome={outcome}, platforms={platforms})")
+    send_scrape_summary(user_pk, outcome, platforms)
+    return {'outcome': outcome, 'platforms': platforms}
+
+
+@shared_task
+def scrape_summary_error_task(request, exc, traceback, user_pk, platforms):
+    """
+    chordのエラーコールバック。ハードリミットによる強制終了などでタスクが結果を返さなかった場合も、
+    完了通知を送ってクライアントの待機を終わらせる。
+    """
+    logger.error(f"スクレイピングのタスクが異常終了しました (user_pk={user_pk}): {exc!r}")
+    metrics.SCRAPE_OUTCOMES.inc(outcome='failure')
+    send_scrape_summary(user_pk, 'failure', {platform: 'failure' for platform in platforms})
+
+
+@shared_task
+def send_reminders_task():
+    """締切が近い課題のリマインダーを送る定期タスク (Celery beat から実行する)"""
+    sent = reminders.send_due_reminders()
+    if sent:
+        logger.info(f"締切のリマインダーを{sent}件送信しました。")
+    return sent
+
+
 @shared_task
-def run_all_scrapes_task(user_pk, password):
-    """MoodleとWebClassのスクレイピングタスクを並列で実行する親タスク"""
-    logger.info(f"並列スクレイピングタスクを開始します for user_pk={user_pk}")
+def archive_semesters_task():
+    """過去の学期の課題と授業をアーカイブする定期タスク (ARCHIVE_BEAT_ENABLED が有効な場合に実行する)"""
+    return archive.archive()
+
+
+def dispatch_scrapes(user_pk, password, platforms=None, priority=None):
+    """
+    MoodleとWebClassのスクレイピングタスクを並列で登録し、両方の完了後に scrape_summary_task を実行する。
+    platforms を指定した場合はそのプラットフォームのみ実行し、priority はブローカーの優先度として渡す。
+    """
+    platform_tasks = {
+        'webclass': scrape_webclass_task,
+        'moodle': scrape_moodle_task,
+    }
+    platforms = [platform for platform in platform_tasks if platform in (platforms or PLATFORMS)]
 
     # 並列実行したいタスクのリストを、groupを使って作成します。
     # .s() は「シグネチャ」を作成するメソッドで、タスクの呼び出しと引数を定義します。
     tasks_to_run = group([
-        scrape_webclass_task.s(user_pk, password),
-        scrape_moodle_task.s(user_pk, password)
+        platform_tasks[platform].s(user_pk, password).set(priority=priority)
+        for platform in platforms
     ])
+    callback = scrape_summary_task.s(user_pk).set(priority=priority)
+    callback.on_error(scrape_summary_error_task.s(user_pk, platforms))
 
-    # groupを実行します。これにより、2つのタスクが同時にワーカーに送られます。
-    tasks_to_run.apply_async()
+    # chordを実行します。これにより、タスクが同時にワーカーに送られ、全て完了するとコールバックが呼ばれます。
+    result = chord(tasks_to_run)(callback)
+    logger.info(f"並列スクレイピングタスクをキューに登録しました for user_pk={user_pk}")
+    return result
 
-    logger.info(f"並列スクレイピングタスクをキューに登録しました for user_pk={user_pk}")
\ No newline at end of file
+
+@shared_task
+def run_all_scrapes_task(user_pk, password, platforms=None, priority=None):
+    """
+    登録済みのメッセージとの互換性のために残している親タスク。
+    新しく登録する場合は dispatch_scrapes を直接呼び出すこと。
+    """
+    dispatch_scrapes(user_pk, password, platforms=platforms, priority=priority)
@@ -1,3 +1,590 @@
-from django.test import TestCase
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+import fakeredis
+import fakeredis.aioredis
+from asgiref.sync import async_to_sync
+from bs4 import BeautifulSoup
+from django.contrib import admin
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from parsel import Selector
+from scrapy import Request
+from scrapy.http import HtmlResponse
+from scrapy.settings import Settings
+from rest_framework.renderers import JSONRenderer
+
+from accounts.models import User
+from backend import fast_json
+from scraping import admission, archive, date_parser, reminders, search, task, upcoming
+from scraping.admin import AssignmentAdmin
+from scraping.crawlers import middlewares
+from scraping.crawlers.checkpoint import CrawlCheckpoint
+from scraping.crawlers.spiders.moodle_spider import MoodleSpider
+from scraping.models import ArchivedAssignment, ArchivedCourse, Assignment, AssignmentReminder, Course
+from scraping.serializers import AssignmentSerializer, CourseSerializer, UpcomingAssignmentSerializer, ValuesReader
+
+TOKYO = ZoneInfo('Asia/Tokyo')
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# 言語ごとの div.activity-dates のフィクスチャ (開始: 2025/04/01 09:00, 終了: 2025/04/30 23:59)
+DATE_FIXTURES = {
+    'ja': ('<strong>開始:</strong> 2025年 4月 1日(火曜日) 9:00', '<strong>期限:</strong> 2025年 4月 30日(水曜日) 23:59'),
+    'en': ('<strong>Opened:</strong> Tuesday, 1 April 2025, 9:00 AM', '<strong>Due:</strong> Wednesday, 30 April 2025, 11:59 PM'),
+    'en_us': ('<strong>Opened:</strong> Tuesday, April 1, 2025, 9:00 AM', '<strong>Due:</strong> Wednesday, April 30, 2025, 11:59 PM'),
+    'vi': ('<strong>Opened:</strong> Thứ Ba, 1 tháng 4 2025, 9:00 AM', '<strong>Due:</strong> Thứ Tư, 30 tháng 4 2025, 11:59 PM'),
+    'zh_tw': ('<strong>開啟:</strong> 2025年 04月 1日(週二) 09:00', '<strong>到期:</strong> 2025年 04月 30日(週三) 23:59'),
+    'zh_cn': ('<strong>已打开:</strong> 2025年04月1日 星期二 09:00', '<strong>到期日:</strong> 2025年04月30日 星期三 23:59'),
+    'ko': ('<strong>Opened:</strong> 화요일, 1 4월 2025, 9:00 AM', '<strong>Due:</strong> 수요일, 30 4월 2025, 11:59 PM'),
+}
+
+EXPECTED = (datetime(2025, 4, 1, 9, 0, tzinfo=TOKYO), datetime(2025, 4, 30, 23, 59, tzinfo=TOKYO))
+
+
+def activity_dates_html(lang_code):
+    start, end = DATE_FIXTURES[lang_code]
+    return f'<div class="activity-dates">\n  <div>{start}</div>\n  <div>{end}</div>\n</div>'
+
+
+def lxml_element(html):
+    return Selector(text=html).css('div.activity-dates')[0].root
+
+
+def soup_element(html):
+    return BeautifulSoup(html, 'html.parser').select_one('div.activity-dates')
+
+
+class MoodleDateParserTests(SimpleTestCase):
+
+    def test_every_locale_with_lang_code(self):
+        for lang_code in DATE_FIXTURES:
+            with self.subTest(lang_code=lang_code):
+                lines = date_parser.element_lines(lxml_element(activity_dates_html(lang_code)))
+                self.assertEqual(date_parser.parse_start_end_datetimes(lines, lang_code), EXPECTED)
+
+    def test_every_locale_is_detected_without_lang_code(self):
+        for lang_code in DATE_FIXTURES:
+            with self.subTest(lang_code=lang_code):
+                lines = date_parser.element_lines(lxml_element(activity_dates_html(lang_code)))
+                self.assertEqual(date_parser.parse_start_end_datetimes(lines, None), EXPECTED)
+
+    def test_detect_lang_code_prefers_keyword_matches(self):
+        for lang_code in ('ja', 'zh_tw', 'zh_cn', 'ko', 'vi', 'en', 'en_us'):
+            with self.subTest(lang_code=lang_code):
+                lines = date_parser.element_lines(lxml_element(activity_dates_html(lang_code)))
+                detected = date_parser.detect_lang_code(lines)
+                # en と vi は同じ見出し(Opened/Due)を使うが、日付形式で区別される
+                self.assertEqual(detected, lang_code)
+
+    def test_wrong_lang_code_falls_back_to_detection(self):
+        lines = date_parser.element_lines(lxml_element(activity_dates_html('en')))
+        self.assertEqual(date_parser.parse_start_end_datetimes(lines, 'ja'), EXPECTED)
+
+    def test_lang_code_is_normalized(self):
+        lines = date_parser.element_lines(lxml_element(activity_dates_html('zh_tw')))
+        self.assertEqual(date_parser.parse_start_end_datetimes(lines, 'zh-TW'), EXPECTED)
+
+    def test_beautifulsoup_element_gives_same_lines(self):
+        html = activity_dates_html('ja')
+        self.assertEqual(
+            date_parser.element_lines(soup_element(html)),
+            date_parser.element_lines(lxml_element(html)),
+        )
+
+    def test_plain_text_input(self):
+        text = '開始: 2025年4月1日(火曜日) 9:00\n期限: 2025年4月30日(水曜日) 23:59'
+        self.assertEqual(date_parser.parse_start_end_datetimes(text, 'ja'), EXPECTED)
+
+    def test_missing_or_unreadable_dates(self):
+        self.assertEqual(date_parser.parse_start_end_datetimes(None, 'ja'), (None, None))
+        self.assertEqual(date_parser.parse_start_end_datetimes(['期限なし'], None), (None, None))
+
+    def test_midnight_and_noon(self):
+        lines = ['Opened: Tuesday, 1 April 2025, 12:00 AM', 'Due: Tuesday, 1 April 2025, 12:30 PM']
+        start, end = date_parser.parse_start_end_datetimes(lines, 'en')
+        self.assertEqual((start.hour, end.hour, end.minute), (0, 12, 30))
+
+    def test_timezone_is_cached_and_falls_back_to_utc(self):
+        self.assertIs(date_parser.get_timezone('Asia/Tokyo'), date_parser.get_timezone('Asia/Tokyo'))
+        self.assertEqual(date_parser.get_timezone('Invalid/Zone'), ZoneInfo('UTC'))
+
+
+class ValuesReaderParityTests(TestCase):
+    """.values() を使う読み取り用の出力が、シリアライザ + JSONRenderer とバイト単位で一致すること"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(university_id='AB12345')
+        course = Course.objects.create(user=cls.user, title='線形代数 "演習"', day_of_week=3, period=2)
+        Course.objects.create(user=cls.user, title='Empty')
+        cases = [
+            # (タイトル, 本文, URL, 締切)
+            ('レポート', '改行\nと\tタブ、絵文字 🎓', 'https://example.com/a?x=1&y=2', datetime(2025, 4, 30, 23, 59, tzinfo=ZoneInfo('Asia/Tokyo'))),
+            ('UTC', 'line\u2028separator\u2029', None, datetime(2025, 1, 1, 0, 0, tzinfo=dt_timezone.utc)),
+            ('microseconds', '', 'https://example.com/b', datetime(2025, 6, 1, 12, 0, 0, 123456, tzinfo=dt_timezone.utc)),
+            ('no due date', None, 'https://example.com/c', None),
+        ]
+        for i, (title, content, url, due_date) in enumerate(cases):
+            Assignment.objects.create(
+                user=cls.user, course=course if i % 2 == 0 else None, title=title, content=content,
+                url=url, due_date=due_date, is_submitted=i == 1,
+            )
+
+    def assert_parity(self, serializer_class, queryset, fields=None):
+        expected = JSONRenderer().render(serializer_class(list(queryset), many=True, fields=fields).data)
+        reader = ValuesReader(serializer_class, fields)
+        actual = fast_json.dumps(reader.to_representation_many(reader.values(queryset)))
+        self.assertEqual(actual, expected)
+
+    def test_assignments(self):
+        self.assert_parity(AssignmentSerializer, Assignment.objects.order_by('pk'))
+
+    def test_courses(self):
+        self.assert_parity(CourseSerializer, Course.objects.order_by('pk'))
+
+    def test_upcoming_assignments(self):
+        self.assert_parity(UpcomingAssignmentSerializer, Assignment.objects.order_by('pk'))
+
+    def test_selected_fields(self):
+        self.assert_parity(AssignmentSerializer, Assignment.objects.order_by('pk'), fields=['id', 'title', 'due_date'])
+
+    def test_stdlib_fallback_matches_orjson(self):
+        with mock.patch.object(fast_json, 'orjson', None):
+            self.assert_parity(AssignmentSerializer, Assignment.objects.order_by('pk'))
+
+
+class AdmissionPriorityTests(TestCase):
+    """受付制御の優先度 (scraping.admission)"""
+
+    def test_priority_bands_do_not_overlap(self):
+        now = time.time()
+        pipe = mock.Mock()
+        admission._prune(pipe, 'moodle', now)
+        first_login = admission._score(admission.PRIORITY_FIRST_LOGIN, now)
+        for call in pipe.zremrangebyscore.call_args_list:
+            _, low, high = call.args
+            self.assertFalse(low <= first_login <= high)
+        self.assertLess(first_login, admission._score(admission.PRIORITY_RELOGIN, 0))
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_first_login_job_survives_relogin_admission(self):
+        client = fakeredis.FakeRedis()
+        first = User.objects.create(university_id='AB00001')
+        second = User.objects.create(university_id='AB00002')
+        with mock.patch.object(admission, 'get_client', return_value=client):
+            admission.admit(first, admission.PRIORITY_FIRST_LOGIN, platforms=['moodle'])
+            decisions = admission.admit(second, admission.PRIORITY_RELOGIN, platforms=['moodle'])
+            again = admission.admit(first, admission.PRIORITY_FIRST_LOGIN, platforms=['moodle'])
+
+        self.assertEqual(client.zrank(admission.pending_key('moodle'), str(first.pk)), 0)
+        self.assertEqual(decisions['moodle']['position'], 1)
+        # 既に待機中のジョブは二重に登録しない
+        self.assertEqual(again['moodle'], {'state': 'queued', 'position': 0, 'eta_seconds': mock.ANY, 'enqueue': False})
+
+
+
+class UpcomingIndexRaceTests(SimpleTestCase):
+    """読み込み時の索引の作り直しと削除の競合 (scraping.upcoming)"""
+
+    def setUp(self):
+        server = fakeredis.FakeServer()
+        self.client = fakeredis.FakeRedis(server=server)
+        self.async_client = fakeredis.aioredis.FakeRedis(server=server)
+        for name, client in (('get_client', self.client), ('get_async_client', self.async_client)):
+            patcher = mock.patch.object(upcoming, name, return_value=client)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def rows(self, invalidate):
+        async def rows():
+            if invalidate:
+                # DBを読んでいる間に課題が変更された
+                upcoming.invalidate('AB00001')
+            yield {
+                'id': 1, 'user_id': 'AB00001', 'course_id': None, 'title': '古い課題', 'url': '',
+                'due_date': datetime(2099, 1, 1, tzinfo=TOKYO), 'is_submitted': False,
+            }
+        return rows()
+
+    def test_rebuild_on_read_is_skipped_after_invalidate(self):
+        with mock.patch.object(upcoming, '_rows', side_effect=lambda user_pk: self.rows(invalidate=True)):
+            members = async_to_sync(upcoming.aget_upcoming)('AB00001', 10)
+        self.assertEqual(len(members), 1)
+        self.assertFalse(self.client.exists(upcoming.index_key('AB00001')))
+
+    def test_rebuild_on_read_writes_index(self):
+        with mock.patch.object(upcoming, '_rows', side_effect=lambda user_pk: self.rows(invalidate=False)):
+            async_to_sync(upcoming.aget_upcoming)('AB00001', 10)
+        self.assertTrue(self.client.exists(upcoming.index_key('AB00001')))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ArchiveTests(TestCase):
+    """過去の学期の課題と授業のアーカイブ (scraping.archive)"""
+
+    def setUp(self):
+        self.user = User.objects.create(university_id='AB00001')
+        self.now = datetime(2025, 10, 1, tzinfo=TOKYO)
+        self.old_course = Course.objects.create(user=self.user, title='前期の授業')
+        self.course = Course.objects.create(user=self.user, title='後期の授業')
+        self.old = [
+            Assignment.objects.create(
+                user=self.user, course=self.old_course, title=f'前期の課題{i}', url=f'https://example.com/{i}',
+                due_date=self.now - timedelta(days=200 + i), platform='moodle',
+            )
+            for i in range(3)
+        ]
+        self.current = Assignment.objects.create(
+            user=self.user, course=self.course, title='後期の課題', url='https://example.com/current',
+            due_date=self.now + timedelta(days=7), platform='moodle',
+        )
+        # 授業の作成日時は auto_now_add のため、過去の学期の日時に書き換える
+        Course.objects.update(created_at=self.now - timedelta(days=300))
+
+    def test_moves_expired_rows_and_keeps_ids(self):
+        result = archive.archive(self.now - timedelta(days=180), batch_size=2)
+
+        self.assertEqual(result, {'assignments': 3, 'courses': 1})
+        self.assertEqual(list(Assignment.objects.values_list('pk', flat=True)), [self.current.pk])
+        self.assertEqual(list(Course.objects.values_list('pk', flat=True)), [self.course.pk])
+        archived = ArchivedAssignment.objects.order_by('pk')
+        self.assertEqual([a.pk for a in archived], sorted(a.pk for a in self.old))
+        self.assertEqual({a.course_id for a in archived}, {self.old_course.pk})
+        self.assertEqual(ArchivedCourse.objects.get().pk, self.old_course.pk)
+
+    def test_nothing_to_archive(self):
+        result = archive.archive(self.now - timedelta(days=365))
+
+        self.assertEqual(result, {'assignments': 0, 'courses': 0})
+        self.assertFalse(ArchivedAssignment.objects.exists())
+
+
+class ScrapeSummaryTests(SimpleTestCase):
+    """chordのコールバックによるスクレイピング全体の結果 (scraping.task)"""
+
+    def setUp(self):
+        for target in ('send_scrape_summary', 'metrics'):
+            patcher = mock.patch.object(task, target)
+            setattr(self, target, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def summarize(self, *results):
+        return task.scrape_summary_task(list(results), 'AB00001')
+
+    def test_outcomes(self):
+        success = {'status': 'success', 'platform': 'Moodle'}
+        cases = [
+            ((success, {'status': 'success', 'platform': 'WebClass'}), 'success'),
+            ((success, {'status': 'timeout', 'platform': 'WebClass'}), 'partial'),
+            (({'status': 'failure', 'platform': 'Moodle'}, {'status': 'timeout', 'platform': 'WebClass'}), 'failure'),
+        ]
+        for results, outcome in cases:
+            with self.subTest(outcome=outcome):
+                self.assertEqual(self.summarize(*results)['outcome'], outcome)
+                self.send_scrape_summary.assert_called_with('AB00001', outcome, mock.ANY)
+                self.metrics.SCRAPE_OUTCOMES.inc.assert_called_with(outcome=outcome)
+
+    def test_platforms_are_keyed_by_lowercase_name(self):
+        result = self.summarize({'status': 'success', 'platform': 'WebClass'}, None)
+        self.assertEqual(result, {'outcome': 'success', 'platforms': {'webclass': 'success'}})
+
+    def test_error_callback_reports_failure_for_every_platform(self):
+        task.scrape_summary_error_task(None, RuntimeError('killed'), None, 'AB00001', ['moodle', 'webclass'])
+        self.send_scrape_summary.assert_called_once_with(
+            'AB00001', 'failure', {'moodle': 'failure', 'webclass': 'failure'},
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CrawlCheckpointTests(SimpleTestCase):
+    """WebClassのクロールのチェックポイント (scraping.crawlers.checkpoint)"""
+
+    def test_resumed_crawl_loads_done_courses(self):
+        CrawlCheckpoint('webclass', 'AB00001', 60).mark_done('https://example.com/course/1')
+        # ログアウト後の再試行は、取得済みのコースを読み込んでから続きを記録する
+        retry = CrawlCheckpoint('webclass', 'AB00001', 60)
+        self.assertEqual(retry.load(), {'https://example.com/course/1'})
+        retry.mark_done('https://example.com/course/2')
+
+        resumed = CrawlCheckpoint('webclass', 'AB00001', 60)
+        self.assertEqual(resumed.load(), {'https://example.com/course/1', 'https://example.com/course/2'})
+        self.assertEqual(CrawlCheckpoint('webclass', 'AB00002', 60).load(), set())
+
+    def test_clear(self):
+        checkpoint = CrawlCheckpoint('webclass', 'AB00001', 60)
+        checkpoint.mark_done('https://example.com/course/1')
+        checkpoint.clear()
+        self.assertEqual(CrawlCheckpoint('webclass', 'AB00001', 60).load(), set())
+
+    def test_cache_errors_restart_from_scratch(self):
+        checkpoint = CrawlCheckpoint('webclass', 'AB00001', 60)
+        with mock.patch('scraping.crawlers.checkpoint.cache') as cache:
+            cache.get.side_effect = cache.set.side_effect = ConnectionError('redis is down')
+            checkpoint.mark_done('https://example.com/course/1')
+            self.assertEqual(checkpoint.load(), set())
+
+
+class ReloginMiddlewareTests(SimpleTestCase):
+    """クロール中の再ログイン (scraping.crawlers.middlewares.ReloginMiddleware)"""
+
+    def setUp(self):
+        self.crawler = mock.Mock(settings=Settings({'WEBCLASS_MAX_RELOGINS': 1}))
+        self.spider = mock.Mock(login_url='https://example.com/login')
+        self.spider.is_logged_out.side_effect = lambda response: b'logout' in response.body
+        self.spider.login = mock.AsyncMock()
+        patcher = mock.patch.object(middlewares, 'maybe_deferred_to_future', mock.AsyncMock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.middleware = middlewares.ReloginMiddleware(self.crawler)
+
+    def request(self, n):
+        request = Request(f'https://example.com/course/{n}', headers={'Cookie': 'session=old'})
+        self.middleware.process_request(request, self.spider)
+        return request
+
+    async def respond(self, request, body=b'logout'):
+        response = HtmlResponse(request.url, body=body, request=request)
+        return await self.middleware.process_response(request, response, self.spider)
+
+    def test_concurrent_logouts_relogin_once_and_replay(self):
+        requests = [self.request(n) for n in range(3)]
+
+        async def respond_all():
+            return await asyncio.gather(*(self.respond(request) for request in requests))
+
+        replayed = async_to_sync(respond_all)()
+
+        self.spider.login.assert_awaited_once()
+        self.crawler.engine.pause.assert_called_once_with()
+        self.crawler.engine.unpause.assert_called_once_with()
+        for request, retry in zip(requests, replayed):
+            self.assertIsInstance(retry, Request)
+            self.assertEqual(retry.url, request.url)
+            self.assertTrue(retry.dont_filter)
+            self.assertNotIn(b'Cookie', retry.headers)
+            self.assertNotIn('session_generation', retry.meta)
+
+    def test_request_from_before_relogin_is_replayed_without_login(self):
+        stale = self.request(1)
+        async_to_sync(self.respond)(self.request(2))
+        self.spider.login.reset_mock()
+
+        self.assertIsInstance(async_to_sync(self.respond)(stale), Request)
+        self.spider.login.assert_not_awaited()
+
+    def test_limit_passes_response_through(self):
+        async_to_sync(self.respond)(self.request(1))
+        request = self.request(2)
+        response = async_to_sync(self.respond)(request)
+
+        self.assertIsInstance(response, HtmlResponse)
+        self.assertEqual(self.spider.login.await_count, 1)
+        self.crawler.stats.inc_value.assert_any_call('relogin/limit_reached')
+
+    def test_logged_in_response_is_unchanged(self):
+        response = async_to_sync(self.respond)(self.request(1), body=b'<html>ok</html>')
+        self.assertIsInstance(response, HtmlResponse)
+        self.spider.login.assert_not_awaited()
+
+
+class MoodleSubmittedSkipTests(TestCase):
+    """Moodleの提出済みの課題の取得の省略 (本人の最近の行のみを使う)"""
+
+    def setUp(self):
+        self.user = User.objects.create(university_id='AB00001')
+        other = User.objects.create(university_id='AB00002')
+        self.recent = Assignment.objects.create(
+            user=self.user, title='提出済み', url='https://moodle.example.com/mod/assign/view.php?id=1',
+            platform='moodle', is_submitted=True,
+        )
+        self.stale = Assignment.objects.create(
+            user=self.user, title='以前に提出済み', url='https://moodle.example.com/mod/assign/view.php?id=2',
+            platform='moodle', is_submitted=True,
+        )
+        Assignment.objects.filter(pk=self.stale.pk).update(updated_at=datetime(2025, 1, 1, tzinfo=TOKYO))
+        # 他のユーザーが提出済みでも、本人の取得は省略しない
+        self.others = Assignment.objects.create(
+            user=other, title='他人の提出', url='https://moodle.example.com/mod/assign/view.php?id=3',
+            platform='moodle', is_submitted=True,
+        )
+
+    def spider(self, recheck_seconds):
+        spider = MoodleSpider(self.user.pk, 'password', 'https://moodle.example.com/login/index.php')
+        spider.settings = Settings({'MOODLE_SUBMITTED_RECHECK_SECONDS': recheck_seconds})
+        spider.crawler = mock.Mock()
+
+        async def start():
+            return [request async for request in spider.start()]
+
+        async_to_sync(start)()
+        return spider
+
+    def followed(self, spider):
+        urls = [self.recent.url, self.stale.url, self.others.url]
+        return [request.url for request in spider._follow_modules(urls, '授業')]
+
+    def test_skips_only_recently_submitted_own_modules(self):
+        spider = self.spider(30 * 60)
+        self.assertEqual(spider.submitted_urls, {self.recent.url})
+        self.assertEqual(self.followed(spider), [self.stale.url, self.others.url])
+
+    def test_disabled_fetches_every_module(self):
+        spider = self.spider(0)
+        self.assertEqual(self.followed(spider), [self.recent.url, self.stale.url, self.others.url])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RemindersTests(TestCase):
+    """締切が近い課題のリマインダー (scraping.reminders)"""
+
+    def setUp(self):
+        self.now = datetime(2025, 6, 1, 12, 0, tzinfo=TOKYO)
+        self.user = User.objects.create(university_id='AB00001')
+        for target in ('send_reminders', '_send_webhook', '_send_email', 'metrics'):
+            patcher = mock.patch.object(reminders, target)
+            setattr(self, target, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def assignment(self, title, minutes, **kwargs):
+        return Assignment.objects.create(
+            user=self.user, title=title, url=f'https://example.com/{title}',
+            due_date=self.now + timedelta(minutes=minutes), **kwargs,
+        )
+
+    def sent(self):
+        """send_reminders に渡された {課題ID: 何分前の通知か} (送信ごと)"""
+        return [
+            {reminder['assignment_id']: reminder['offset_minutes'] for reminder in call.args[0][self.user.pk]}
+            for call in self.send_reminders.call_args_list
+        ]
+
+    def test_buckets(self):
+        self.assertEqual(reminders._buckets([60, 1440, 60]), [(1440, 60), (60, 0)])
+        self.assertEqual(reminders._buckets([30]), [(30, 0)])
+
+    @override_settings(REMINDER_OFFSETS_MINUTES=[60, 1440])
+    def test_each_assignment_gets_the_reminder_for_its_bucket(self):
+        tomorrow = self.assignment('明日', 20 * 60)
+        soon = self.assignment('もうすぐ', 30)
+        self.assignment('来週', 7 * 24 * 60)
+        self.assignment('期限切れ', -10)
+        self.assignment('提出済み', 30, is_submitted=True)
+
+        self.assertEqual(reminders._send_due_reminders(self.now), 2)
+        self.assertEqual(self.sent(), [{tomorrow.pk: 1440}, {soon.pk: 60}])
+
+    @override_settings(REMINDER_OFFSETS_MINUTES=[60, 1440])
+    def test_sent_reminders_are_not_sent_again(self):
+        assignment = self.assignment('明日', 20 * 60)
+        reminders._send_due_reminders(self.now)
+        self.assertEqual(reminders._send_due_reminders(self.now + timedelta(minutes=5)), 0)
+        self.assertFalse(reminders.due_queryset(1440, 60, self.now).exists())
+
+        # 締切の1時間前の区間に入ると、次のタイミングのリマインダーを1回だけ送る
+        later = self.now + timedelta(hours=19, minutes=30)
+        self.assertEqual(reminders._send_due_reminders(later), 1)
+        self.assertEqual(reminders._send_due_reminders(later), 0)
+        self.assertEqual(self.sent()[-1], {assignment.pk: 60})
+
+    @override_settings(REMINDER_OFFSETS_MINUTES=[60, 1440])
+    def test_reminder_is_sent_again_after_due_date_changes(self):
+        assignment = self.assignment('延長', 20 * 60)
+        reminders._send_due_reminders(self.now)
+        Assignment.objects.filter(pk=assignment.pk).update(due_date=self.now + timedelta(hours=22))
+
+        self.assertEqual(reminders._send_due_reminders(self.now), 1)
+        self.assertEqual(self.sent(), [{assignment.pk: 1440}, {assignment.pk: 1440}])
+        self.assertEqual(AssignmentReminder.objects.filter(assignment=assignment).count(), 2)
+
+    def test_tick_is_skipped_when_lock_is_unavailable(self):
+        with mock.patch.object(reminders, 'cache') as cache, \
+                mock.patch.object(reminders, '_send_due_reminders') as send:
+            cache.add.side_effect = ConnectionError('redis is down')
+            self.assertIsNone(reminders.send_due_reminders())
+        send.assert_not_called()
+
+
+class SearchTests(TestCase):
+    """課題の全文検索 (scraping.search) とトリガーによるFTS5の索引の同期"""
+
+    def setUp(self):
+        self.user = User.objects.create(university_id='AB00001')
+        self.course = Course.objects.create(user=self.user, title='線形代数')
+        self.report = self.assignment('レポート課題', '固有値の計算について論じる')
+        self.quiz = self.assignment('小テスト', 'レポート課題の提出は不要')
+        self.other = self.assignment('演習問題', '行列式の計算')
+
+    def assignment(self, title, content, **kwargs):
+        return Assignment.objects.create(
+            user=self.user, title=title, content=content, url=f'https://example.com/{title}', **kwargs,
+        )
+
+    def search(self, query):
+        queryset, ranked = search.search_queryset(Assignment.objects.all(), query)
+        return list(queryset.values_list('pk', flat=True)), ranked
+
+    def fts_rowids(self, term):
+        with connection.cursor() as cursor:
+            cursor.execute(search._MATCH_SQL.replace('%s', '?'), [search._match_expression([term])])
+            return {row[0] for row in cursor.fetchall()}
+
+    def test_triggers_exist(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'scraping_assignment'"
+            )
+            triggers = {row[0] for row in cursor.fetchall()}
+        self.assertEqual(triggers, {
+            'scraping_assignment_fts_ai', 'scraping_assignment_fts_ad', 'scraping_assignment_fts_au',
+        })
+
+    def test_index_follows_insert_update_and_delete(self):
+        self.assertEqual(self.fts_rowids('固有値'), {self.report.pk})
+
+        Assignment.objects.filter(pk=self.report.pk).update(content='特異値分解について論じる')
+        self.assertEqual(self.fts_rowids('固有値'), set())
+        self.assertEqual(self.fts_rowids('特異値'), {self.report.pk})
+
+        self.report.delete()
+        self.assertEqual(self.fts_rowids('特異値'), set())
+
+    def test_results_are_ranked_with_title_matches_first(self):
+        self.assertEqual(self.search('レポート課題'), ([self.report.pk, self.quiz.pk], True))
+        # すべての語を含む課題のみを返す
+        self.assertEqual(self.search('レポート 固有値'), ([self.report.pk], True))
+
+    def test_results_follow_edits(self):
+        self.assertEqual(self.search('行列式'), ([self.other.pk], True))
+        self.other.title = '行列式の演習'
+        self.other.content = ''
+        self.other.save()
+        self.assertEqual(self.search('行列式'), ([self.other.pk], True))
+        self.other.title = '演習問題'
+        self.other.save()
+        self.assertEqual(self.search('行列式'), ([], True))
+
+    def test_short_terms_fall_back_to_like(self):
+        pks, ranked = self.search('演習')
+        self.assertEqual((pks, ranked), ([self.other.pk], False))
+        # 短い語と長い語の組み合わせは両方で絞り込む
+        self.assertEqual(self.search('論じ 固有値'), ([self.report.pk], True))
+        self.assertEqual(self.search('不要 固有値'), ([], True))
+
+    def test_admin_search_uses_index_and_course_title(self):
+        model_admin = AssignmentAdmin(Assignment, admin.site)
+        queryset = Assignment.objects.all()
+
+        results, may_have_duplicates = model_admin.get_search_results(None, queryset, '固有値')
+        self.assertEqual(set(results.values_list('pk', flat=True)), {self.report.pk})
+        self.assertFalse(may_have_duplicates)
+
+        Assignment.objects.filter(pk=self.quiz.pk).update(course=self.course)
+        results, _ = model_admin.get_search_results(None, queryset, '線形代数')
+        self.assertEqual(set(results.values_list('pk', flat=True)), {self.quiz.pk})
+
+        results, _ = model_admin.get_search_results(None, queryset, '  ')
+        self.assertEqual(results.count(), 3)
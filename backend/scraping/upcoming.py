@@ -0,0 +1,167 @@
+"""
+ユーザーごとの締切が近い課題の索引。
+
+未提出で締切前の課題を、締切日時をスコアとするRedisのソート済みセットに保存する。
+メンバーは課題本文を除いたJSONで、ホーム画面の「締切が近い課題」はDBに問い合わせずに返せる。
+
+索引はスクレイピングで課題が変わったときに作り直し、APIで課題を変更した場合は削除する。
+存在しない場合は、次の読み込み時にDBから作り直す。
+
+読み込み時の作り直しは、DBを読んでから書き込むまでの間に課題が変更されると古い内容を書き戻してしまう。
+作り直し・削除のたびに世代番号 (generation_key) を増やし、読み込み時は世代が変わっていない場合のみ書き込む。
+"""
+import asyncio
+import logging
+import weakref
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+from django.utils import timezone
+
+from backend import fast_json
+from .models import Assignment
+from .serializers import UpcomingAssignmentSerializer, ValuesReader
+
+logger = logging.getLogger(__name__)
+
+# 索引が作成済みであることを示すメンバー (スコアが -inf のため取得されない)
+# 課題が1件もないユーザーでも、毎回DBから作り直さないようにする
+_BUILT_MEMBER = b''
+
+_client = None
+# redis.asyncio のクライアントはイベントループごとに作成する
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.UPCOMING_REDIS_URL)
+    return _client
+
+
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    if loop not in _async_clients:
+        _async_clients[loop] = aioredis.Redis.from_url(settings.UPCOMING_REDIS_URL)
+    return _async_clients[loop]
+
+
+def index_key(user_pk):
+    return f'upcoming:{user_pk}'
+
+
+def generation_key(user_pk):
+    return f'upcoming:generation:{user_pk}'
+
+
+_reader = None
+
+
+def _get_reader():
+    global _reader
+    if _reader is None:
+        _reader = ValuesReader(UpcomingAssignmentSerializer)
+    return _reader
+
+
+def _rows(user_pk):
+    queryset = (
+        Assignment.objects
+        .filter(user_id=user_pk, is_submitted=False, due_date__gte=timezone.now())
+        .order_by('due_date')
+    )
+    return _get_reader().values(queryset)
+
+
+def _encode(rows):
+    """行をAPIの応答と同じ形式のJSON (バイト列) に変換する"""
+    reader = _get_reader()
+    return [fast_json.dumps(reader.to_representation(row)) for row in rows]
+
+
+def _mapping(rows, members):
+    """ソート済みセットに追加する {JSON: 締切のUNIX時刻}"""
+    mapping = {_BUILT_MEMBER: float('-inf')}
+    for row, member in zip(rows, members):
+        mapping[member] = row['due_date'].timestamp()
+    return mapping
+
+
+def _replace(p, user_pk, mapping):
+    key = index_key(user_pk)
+    p.delete(key)
+    p.zadd(key, mapping)
+    p.expire(key, settings.UPCOMING_INDEX_TTL)
+
+
+def _next_generation(p, user_pk):
+    """読み込み中の作り直しが古い内容を書き込まないよう、世代を進める"""
+    key = generation_key(user_pk)
+    p.incr(key)
+    p.expire(key, settings.UPCOMING_INDEX_TTL)
+
+
+def rebuild(user_pk):
+    """DBから索引を作り直す (スクレイピングで課題が変わったときに呼ぶ)"""
+    rows = list(_rows(user_pk))
+    mapping = _mapping(rows, _encode(rows))
+    try:
+        with get_client().pipeline(transaction=True) as p:
+            _next_generation(p, user_pk)
+            _replace(p, user_pk, mapping)
+            p.execute()
+    except redis.RedisError as e:
+        logger.warning(f"締切が近い課題の索引の更新に失敗しました (user_pk={user_pk}): {e}")
+
+
+def invalidate(user_pk):
+    """索引を削除し、次の読み込みでDBから作り直させる"""
+    try:
+        with get_client().pipeline(transaction=True) as p:
+            _next_generation(p, user_pk)
+            p.delete(index_key(user_pk))
+            p.execute()
+    except redis.RedisError as e:
+        logger.warning(f"締切が近い課題の索引の削除に失敗しました (user_pk={user_pk}): {e}")
+
+
+async def aget_upcoming(user_pk, limit):
+    """
+    締切が近い順に未提出の課題を最大 limit 件、JSON (バイト列) のリストで返す。
+    索引のメンバーはそのまま応答に使えるため、読み込み時にはデコードしない。
+    索引がない場合はDBから作り直し、Redisに接続できない場合はDBから直接返す。
+    """
+    key = index_key(user_pk)
+    now = timezone.now().timestamp()
+    try:
+        client = get_async_client()
+        async with client.pipeline(transaction=False) as p:
+            p.exists(key)
+            p.zrangebyscore(key, now, '+inf', start=0, num=limit)
+            # DBを読む前の世代 (書き込み時に変わっていれば、読んだ内容は古い可能性がある)
+            p.get(generation_key(user_pk))
+            exists, members, generation = await p.execute()
+        if exists:
+            return members
+    except redis.RedisError as e:
+        logger.warning(f"締切が近い課題の索引の取得に失敗しました (user_pk={user_pk}): {e}")
+        return _encode([row async for row in _rows(user_pk)[:limit]])
+
+    rows = [row async for row in _rows(user_pk)]
+    members = _encode(rows)
+    mapping = _mapping(rows, members)
+    try:
+        async with client.pipeline(transaction=True) as p:
+            await p.watch(generation_key(user_pk))
+            if await p.get(generation_key(user_pk)) == generation:
+                p.multi()
+                _replace(p, user_pk, mapping)
+                await p.execute()
+    except redis.WatchError:
+        # 読み込み中に課題が変更された。次の読み込みで作り直す
+        pass
+    except redis.RedisError as e:
+        logger.warning(f"締切が近い課題の索引の作成に失敗しました (user_pk={user_pk}): {e}")
+    return members[:limit]
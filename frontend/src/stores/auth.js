@@ -3,6 +3,9 @@ import { useScrapingStore } from '@/stores/scrapingStore.js'
 import apiClient from '@/api/axios'
 import router from '@/router' // ルーターインスタンスをインポート
 
+// 最後の取得からこの秒数以内のプラットフォームは、ログイン時に再取得しない
+const LOGIN_MAX_AGE_SECONDS = 10 * 60
+
 export const useAuthStore = defineStore('auth', {
   state: () => ({
     isAuthenticated: !!localStorage.getItem('isAuthenticated'),
@@ -11,7 +14,7 @@ export const useAuthStore = defineStore('auth', {
   actions: {
     async login(credentials) {
       try {
-        const response = await apiClient.post('/login/', credentials)
+        const response = await apiClient.post('/login/', { ...credentials, max_age: LOGIN_MAX_AGE_SECONDS })
         const data = response.data
         if (data.success) {
             const scrapingStore = useScrapingStore();
@@ -1,5 +1,19 @@
 import { defineStore } from 'pinia';
-import { ref, computed } from 'vue';
+import { ref, reactive, computed } from 'vue';
+
+// サーバーから届いた課題の差分を一覧に反映した新しい配列を返す
+export function applyAssignmentDelta(assignments, delta) {
+  const changed = new Map([...delta.created, ...delta.updated].map(a => [a.id, a]));
+  const removed = new Set(delta.removed);
+  const patched = assignments
+    .filter(a => !removed.has(a.id))
+    .map(a => changed.has(a.id) ? changed.get(a.id) : a);
+  const existingIds = new Set(patched.map(a => a.id));
+  for (const assignment of changed.values()) {
+    if (!existingIds.has(assignment.id)) patched.push(assignment);
+  }
+  return patched;
+}
 
 export const useScrapingStore = defineStore('scraping', () => {
   // --- State ---
@@ -7,6 +21,14 @@ export const useScrapingStore = defineStore('scraping', () => {
   const statusMessage = ref('');
   const completedMessages = ref([]);
   const totalTasks = 2; // MoodleとWebClassの2つ
+  // skipped は混雑時にデータが新しいため取得を省略したもの
+  const TERMINAL_STATES = ['success', 'failure', 'skipped'];
+  // プラットフォームごとの最新状態 (待機・開始・再試行・完了)
+  const platformStatuses = reactive({});
+  // スクレイピング後に届いた課題の差分 (各画面が手元の一覧に反映する)
+  const assignmentDeltas = ref([]);
+  // 締切が近い課題のリマインダー
+  const reminders = ref([]);
 
   let socket = null;
 
@@ -19,7 +41,57 @@ export const useScrapingStore = defineStore('scraping', () => {
     return '取得完了';
   });
 
+  // 完了通知 (summary) の全体の結果ごとのメッセージ
+  const SUMMARY_MESSAGES = {
+    partial: '一部の課題情報を取得できませんでした。',
+    failure: '課題情報の取得に失敗しました。',
+  };
+
   // --- Actions ---
+  function queueMessage(status) {
+    if (status.state !== 'queued' || status.position == null) return null;
+    const minutes = Math.max(1, Math.ceil((status.eta_seconds || 0) / 60));
+    return `順番待ち: ${status.position + 1}番目 (約${minutes}分)`;
+  }
+
+  function notifyReminders(items) {
+    reminders.value.push(...items);
+    // 通知が許可されている場合はブラウザの通知も表示する
+    if (typeof Notification === 'undefined' || Notification.permission !== 'granted') return;
+    items.forEach(reminder => {
+      const due = new Date(reminder.due_date).toLocaleString('ja-JP', {
+        month: 'numeric', day: 'numeric', hour: '2-digit', minute: '2-digit',
+      });
+      new Notification('提出期限が近い課題があります', {
+        body: `${reminder.title} (${due}まで)`,
+        tag: `reminder-${reminder.assignment_id}-${reminder.offset_minutes}`,
+      });
+    });
+  }
+
+  function updateProgress() {
+    const statuses = Object.values(platformStatuses);
+    const finished = statuses.filter(s => TERMINAL_STATES.includes(s.state));
+    completedMessages.value = finished.map(s => s.message);
+
+    // 全てのタスクが完了したかチェック
+    if (completedMessages.value.length >= totalTasks) {
+      statusMessage.value = '全ての課題取得が完了しました。';
+
+      // 3秒後にローディング表示を消す
+      setTimeout(() => {
+        isScraping.value = false;
+        statusMessage.value = '';
+      }, 3000);
+    } else {
+      isScraping.value = true;
+      const pending = statuses.find(s => !TERMINAL_STATES.includes(s.state));
+      statusMessage.value = pending && completedMessages.value.length === 0
+        ? (queueMessage(pending) || pending.message)
+        : `${completedMessages.value.length}/${totalTasks}件の処理が完了しました。`;
+    }
+  }
+
   function connectWebSocket() {
     if (socket && socket.readyState === WebSocket.OPEN) {
       console.log("WebSocket is already connected.");
@@ -34,27 +106,57 @@ export const useScrapingStore = defineStore('scraping', () => {
       isScraping.value = true;
       statusMessage.value = '課題情報の取得を開始しました...';
       completedMessages.value = [];
+      assignmentDeltas.value = [];
+      Object.keys(platformStatuses).forEach(key => delete platformStatuses[key]);
     };
 
     socket.onmessage = (event) => {
       const data = JSON.parse(event.data);
-      console.log("Message from server:", data.message);
+      console.log("Message from server:", data);
 
-      // 完了メッセージを配列に追加
-      completedMessages.value.push(data.message);
+      if (data.type === 'assignments.delta') {
+        assignmentDeltas.value.push(data);
+        return;
+      }
+
+      if (data.type === 'assignments.reminder') {
+        notifyReminders(data.reminders || []);
+        return;
+      }
 
-      // 全てのタスクが完了したかチェック
-      if (completedMessages.value.length >= totalTasks) {
-        statusMessage.value = '全ての課題取得が完了しました。';
+      if (data.type === 'summary') {
+        // 全プラットフォームの完了後に1回だけ届く。強制終了で状態が届かなかったプラットフォームも完了扱いにする
+        Object.entries(data.platforms || {}).forEach(([platform, result]) => {
+          const current = platformStatuses[platform];
+          if (!current || !TERMINAL_STATES.includes(current.state)) {
+            platformStatuses[platform] = {
+              platform,
+              state: result === 'success' ? 'success' : 'failure',
+              message: '課題情報の取得を終了しました。',
+            };
+          }
+        });
+        updateProgress();
+        if (data.outcome !== 'success') {
+          statusMessage.value = SUMMARY_MESSAGES[data.outcome] || statusMessage.value;
+        }
+        return;
+      }
 
-        // 3秒後にローディング表示を消す
-        setTimeout(() => {
-          isScraping.value = false;
-          statusMessage.value = '';
-        }, 3000);
+      if (data.type === 'queue') {
+        // 待機中の順番と完了までの目安時間を更新する
+        const current = platformStatuses[data.platform];
+        if (!current || current.state !== 'queued') return;
+        platformStatuses[data.platform] = { ...current, position: data.position, eta_seconds: data.eta_seconds };
+      } else if (data.type === 'snapshot') {
+        // 接続前に送信済みの最新状態を反映する
+        Object.assign(platformStatuses, data.statuses || {});
+      } else if (data.platform) {
+        platformStatuses[data.platform] = data;
       } else {
-        statusMessage.value = `${completedMessages.value.length}/${totalTasks}件の処理が完了しました。`;
+        return;
       }
+      updateProgress();
     };
 
     socket.onclose = () => {
@@ -82,6 +184,9 @@ export const useScrapingStore = defineStore('scraping', () => {
     statusMessage,
     headerMessage,
     completedMessages,
+    platformStatuses,
+    assignmentDeltas,
+    reminders,
     totalTasks,
     connectWebSocket,
     disconnectWebSocket